@@ -1,1324 +1,2628 @@
-from slicer.ScriptedLoadableModule import *
-import ctk
-import qt
-import slicer
-import os 
-import pandas as pd
-import time
-import math
-
-class CardiacAnnotator(ScriptedLoadableModule):
-    def __init__(self, parent):
-        ScriptedLoadableModule.__init__(self, parent)
-        self.parent.title = "CardiacAnnotator"
-        self.parent.categories = ["Cardiac"]
-        self.parent.dependencies = []
-        self.parent.contributors = ["JD"]
-        iconPath = os.path.join(os.path.dirname(__file__), "CardiacAnnotator.png")
-        self.parent.icon = qt.QIcon(iconPath)
-
-class CardiacAnnotatorWidget(ScriptedLoadableModuleWidget):   
-    def setup(self):
-        ScriptedLoadableModuleWidget.setup(self)
-        self.logic = CardiacAnnotatorLogic()
-
-        # =============================================================================
-        # CASE NAVIGATOR SECTION
-        # =============================================================================  
-        self.caseNavigatorCollapsible = ctk.ctkCollapsibleButton()
-        self.caseNavigatorCollapsible.text = "Case Navigator"
-        self.layout.addWidget(self.caseNavigatorCollapsible)
-        navigatorLayout = qt.QVBoxLayout(self.caseNavigatorCollapsible)
-        
-        # Load Cases Subsection
-        self.loadCasesButton = qt.QPushButton("Load cases folder")
-        navigatorLayout.addWidget(self.loadCasesButton)
-
-        # Active Case Subsection
-        self.activeCaseLabel = qt.QLabel("Active case:")
-        self.activeCaseLabel.hide()  
-        navigatorLayout.addWidget(self.activeCaseLabel)
-        
-        self.activeCaseWidget = qt.QLabel()
-        self.activeCaseWidget.hide()
-        self.activeCaseWidget.setAlignment(qt.Qt.AlignCenter)
-        self.activeCaseWidget.setMaximumHeight(20)
-        self.activeCaseWidget.setStyleSheet("border: 1px solid gray;font-weight: bold;")
-        navigatorLayout.addWidget(self.activeCaseWidget) 
-
-        # Case List Collapsible Subsection
-        self.caseListCollapsible = ctk.ctkCollapsibleButton()
-        self.caseListCollapsible.text = "Case list"
-        self.caseListCollapsible.collapsed = False
-        self.caseListCollapsible.hide()
-        navigatorLayout.addWidget(self.caseListCollapsible)
-        
-        # Case list layout (inside collapsible subsection)
-        caseListLayout = qt.QVBoxLayout(self.caseListCollapsible)
-        
-        # Horizontal layout for list and button
-        caseLayout = qt.QHBoxLayout()
-        
-        # Case list widget
-        self.caseListWidget = qt.QListWidget()
-        self.caseListWidget.setMaximumHeight(100)
-        self.caseListWidget.setVerticalScrollBarPolicy(qt.Qt.ScrollBarAsNeeded)
-        caseLayout.addWidget(self.caseListWidget)
-        
-        # Select case button
-        self.selectCaseButton = qt.QPushButton("Select Case")
-        self.selectCaseButton.setMaximumWidth(100)
-        caseLayout.addWidget(self.selectCaseButton)
-        
-        # Add horizontal layout to case list layout
-        caseListLayout.addLayout(caseLayout)
-        
-        # Connect signals
-        self.selectCaseButton.connect('clicked()', self.onSelectCase)
-        self.loadCasesButton.connect('clicked()', self.onLoadCasesClicked)
-        self.caseListWidget.itemActivated.connect(self.onCaseListItemActivated)
-        
-        # =============================================================================
-        # LANDMARKS MARKING SECTION
-        # =============================================================================
-        self.landmarksCollapsibleButton = ctk.ctkCollapsibleButton()
-        self.landmarksCollapsibleButton.text = "Landmarks Marking"
-        self.landmarksCollapsibleButton.collapsed = True
-        self.layout.addWidget(self.landmarksCollapsibleButton)
-        landmarksLayout = qt.QVBoxLayout(self.landmarksCollapsibleButton)
-
-        # Status label
-        self.landmarkStatusLabel = qt.QLabel("No case loaded")
-        self.landmarkStatusLabel.setStyleSheet("color: gray; font-style: italic;")
-        landmarksLayout.addWidget(self.landmarkStatusLabel)
-
-        # Landmark selection
-        landmarkSelectionLayout = qt.QHBoxLayout()
-
-        # Lock/Unlock button
-        self.lockUnlockButton = qt.QPushButton("")
-        self.lockUnlockButton.setEnabled(False)
-        landmarkSelectionLayout.addWidget(self.lockUnlockButton)
-
-        landmarksLayout.addLayout(landmarkSelectionLayout)
-
-        # Progress tracking
-        progressFrame = qt.QFrame()
-        progressFrame.setStyleSheet("QFrame { border: 1px solid #e0e0e0; border-radius: 3px; padding: 3px; }")
-        landmarksLayout.addWidget(progressFrame)
-        progressLayout = qt.QVBoxLayout(progressFrame)
-
-        progressLabel = qt.QLabel("Landmark Progress:")
-        progressLabel.setStyleSheet("font-weight: bold; font-size: 10pt;")
-        progressLayout.addWidget(progressLabel)
-
-        # Progress list
-        self.landmarkProgressList = qt.QListWidget()
-        self.landmarkProgressList.setMaximumHeight(130)
-        self.landmarkProgressList.setAlternatingRowColors(True)
-        self.landmarkProgressList.itemClicked.connect(self.onLandmarkItemClicked)
-        progressLayout.addWidget(self.landmarkProgressList)
-
-        # Auto-select next landmark checkbox
-        self.autoSelectCheckbox = qt.QCheckBox("Automatically select next landmark upon placement")
-        self.autoSelectCheckbox.setChecked(True)  # Par défaut activé
-        self.autoSelectCheckbox.setStyleSheet("QCheckBox { font-size: 10pt; margin: 5px; }")
-        progressLayout.addWidget(self.autoSelectCheckbox)
-
-        # Action buttons
-        actionButtonsLayout = qt.QHBoxLayout()
-
-        self.resetLandmarkButton = qt.QPushButton("Reset Current")
-        self.resetLandmarkButton.setStyleSheet("QPushButton { background-color: #dd2f29; color: white; font-weight: bold;}")
-        self.resetLandmarkButton.setEnabled(False)
-        actionButtonsLayout.addWidget(self.resetLandmarkButton)
-
-        self.resetAllButton = qt.QPushButton("Reset All")
-        self.resetAllButton.setStyleSheet("QPushButton { background-color: #ec0909; color: white; font-weight: bold;}")
-        self.resetAllButton.setEnabled(False)
-        actionButtonsLayout.addWidget(self.resetAllButton)
-
-        landmarksLayout.addLayout(actionButtonsLayout)
-
-        # Connect landmark signals
-        self.lockUnlockButton.connect('clicked()', self.onLockUnlockClicked)        
-        self.resetLandmarkButton.connect('clicked()', self.onResetLandmark)
-        self.resetAllButton.connect('clicked()', self.onResetAll)
-
-        # Timer for updating display
-        self.timer = qt.QTimer()
-        self.timer.timeout.connect(self.updateTimerDisplay)
-        self.current_landmark_active = False
-
-
-        # =============================================================================
-        # SAVE AND COMPLETE BUTTONS (SIDE BY SIDE)
-        # =============================================================================
-
-        # Create horizontal layout for the buttons
-        saveCompleteLayout = qt.QHBoxLayout()
-
-        self.saveCaseButton = qt.QPushButton("Save Case (actually the Landmarsk)")
-        self.saveCaseButton.setStyleSheet("QPushButton {  color: white; font-weight: bold; padding: 8px; }")
-        self.saveCaseButton.hide()  # Hidden until case is loaded
-        saveCompleteLayout.addWidget(self.saveCaseButton)
-
-        self.markCaseCompleteButton = qt.QPushButton("Mark Case Complete")
-        self.markCaseCompleteButton.setStyleSheet("QPushButton {  color: white; font-weight: bold; padding: 8px; }")
-        self.markCaseCompleteButton.hide()  # Hidden until case is loaded
-        saveCompleteLayout.addWidget(self.markCaseCompleteButton)
-
-        # Add the horizontal layout to the main layout
-        self.layout.addLayout(saveCompleteLayout)
-
-        # Connect buttons
-        self.saveCaseButton.connect('clicked()', self.onSaveCaseClicked)
-        self.markCaseCompleteButton.connect('clicked()', self.onMarkCaseCompleteClicked)
-
-        # For putting it at the top
-        self.layout.addStretch(1)
-        self.layout.setAlignment(qt.Qt.AlignTop)
-
-    def updateCaseList(self, next_cases):
-        # self.caseLabel.show()
-        self.caseListWidget.clear()
-        
-        for case in next_cases:
-            # Check if case is in progress
-            case_row = self.logic.progress_df[self.logic.progress_df['Case_ID'] == case]
-            if not case_row.empty and case_row.iloc[0]['Status'] == 'in_progress':
-                display_text = f"{case} (in progress)"
-            else:
-                display_text = case
-                
-            self.caseListWidget.addItem(display_text)
-        
-        self.activeCaseLabel.show() 
-        self.caseListCollapsible.show()
-
-    def onSelectCase(self):
-        selected_item = self.caseListWidget.currentItem()
-        if selected_item:
-            display_text = selected_item.text()
-            # Remove "(in progress)" if present
-            case_name = display_text.replace(" (in progress)", "")
-            print(f"Starting work on: {case_name}")
-            self.logic.widget_reference = self
-            self.logic.loadCase(case_name)
-            self.activeCaseWidget.setText(case_name)
-            self.activeCaseWidget.show()
-            self.activeCaseLabel.show()   
-            self.enableLandmarkSection(case_name)     
-        
-    def onLoadCasesClicked(self):
-        # Always use last saved directory as default
-        settings = qt.QSettings()
-        default_dir = settings.value("CardiacAnnotator/lastDirectory", "")
-        
-        selected_dir = qt.QFileDialog.getExistingDirectory(None, "Select TAVI Dataset Directory", default_dir)
-        
-        if selected_dir:
-            # self.loadCasesButton.setText(selected_dir) # commented to keep "Load cases" text
-            # Always save the selected directory
-            settings.setValue("CardiacAnnotator/lastDirectory", selected_dir)
-            next_case = self.logic.initializeProgressTracking(selected_dir)  
-            next_cases = self.logic.getNextCases()  # You'll need this method in Logic
-            self.updateCaseList(next_cases)            
-            
-    def _logActivity(self, activity_type, name, action):
-        """Shared logging method"""
-        if hasattr(self.logic, 'current_log_manager') and self.logic.current_log_manager:
-            self.logic.current_log_manager.write_entry(f"{action} {activity_type}: {name}")
-
-    def onMarkComplete(self):
-        if hasattr(self, 'selected_landmark'):
-            landmark_name = self.selected_landmark
-            self.logic.completeLandmark(landmark_name, "")
-            
-            # Lock the landmark
-            self.logic.lockUnlockLandmark(landmark_name, lock=True)
-            
-            # Update UI
-            self.updateActionButtons(landmark_name)
-            self.updateLandmarkProgressList()
-
-    def onResetLandmark(self):
-        if hasattr(self, 'selected_landmark'):
-            landmark_name = self.selected_landmark
-            
-            # Show confirmation dialog
-            reply = qt.QMessageBox.question(None, "Confirm Reset", 
-                                        f"Are you sure you want to reset the landmark '{landmark_name}'?\n\nThis will permanently delete the placed landmark.",
-                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
-            
-            if reply != qt.QMessageBox.Yes:
-                return  # User cancelled, don't reset
-            
-            # Proceed with reset
-            if landmark_name == "Annulus Contour (Spline)":
-                self.logic.resetSpline()
-            else:
-                self.logic.resetCurrentLandmark(landmark_name)  # Pass landmark name
-            
-            # Update UI
-            self.updateActionButtons(landmark_name)
-            self.updateLandmarkProgressList()
-                       
-    def updateTimerDisplay(self):
-        if self.current_landmark_active and hasattr(self.logic, 'landmark_start_time'):
-            elapsed = time.time() - self.logic.landmark_start_time
-            minutes = int(elapsed // 60)
-            seconds = int(elapsed % 60)
-            self.timerLabel.setText(f"Time: {minutes:02d}:{seconds:02d}")
-
-    def updateLandmarkProgressList(self):
-        self.landmarkProgressList.clear()
-        if hasattr(self.logic, 'current_log_manager') and self.logic.current_log_manager:
-            progress = self.logic.getLandmarkProgress()
-            for landmark, status in progress.items():
-                item_text = f"{landmark}: {status}"
-                item = qt.QListWidgetItem(item_text)
-                font = item.font()
-                font.setPointSize(12)
-                
-                # Highlight if this is the currently selected landmark
-                if hasattr(self, 'selected_landmark') and self.selected_landmark == landmark:
-                    item.setBackground(qt.QColor(255, 235, 59, 100))  # Light yellow background
-                    font.setBold(True)
-                
-                item.setFont(font)
-                self.landmarkProgressList.addItem(item)
-        
-        self.landmarkProgressList.setStyleSheet("QListWidget { font-size: 12pt; }")
-
-    def enableLandmarkSection(self, case_name):
-        """Enable landmark section when a case is loaded"""
-        self.landmarkStatusLabel.setText(f"Ready for annotation: {case_name}")
-        self.landmarkStatusLabel.setStyleSheet("color: green; font-style: normal; font-weight: bold; font-size: 10pt;")
-        self.lockUnlockButton.setEnabled(False)
-        self.updateLandmarkProgressList()
-        
-        # Check if all landmarks are placed and locked
-        progress = self.logic.getLandmarkProgress()
-        all_completed = all(status == "✓" or status.startswith("✓") for status in progress.values())
-        
-        if all_completed:
-            # Check if all landmarks are also locked
-            landmark_types = [
-                "Left Coronary Cusp Nadir", "Right Coronary Cusp Nadir", "Non Coronary Cusp Nadir",
-                "Right-Left Commissure", "Right-Non Commissure", "Left-Non Commissure",
-                "Left Coronary Ostium Base", "Right Coronary Ostium Base", "Annulus Contour (Spline)"
-            ]
-            
-            all_locked = True
-            for landmark in landmark_types:
-                if self.logic.landmarkExists(landmark) and not self.logic.isLandmarkLocked(landmark):
-                    all_locked = False
-                    break
-            
-            if all_locked:
-                # All landmarks placed and locked - collapse the section
-                self.landmarksCollapsibleButton.collapsed = True
-            else:
-                # Some landmarks not locked - keep section open
-                self.landmarksCollapsibleButton.collapsed = False
-        else:
-            # Not all landmarks placed - keep section open
-            self.landmarksCollapsibleButton.collapsed = False
-
-    def onLandmarkSelectionChanged(self):
-        if self.current_landmark_active:
-            # Auto-stop current landmark
-            self.onStartStopLandmark()  # This will stop the current one
-            self._logActivity("landmark", self.logic.current_landmark, "Auto-stopped (selection changed)")
-
-    def enableLandmarkPlacement(self, landmark_name):
-        
-        if landmark_name == "Annulus Contour (Spline)":
-            # Create or get spline markups node
-            spline_node_name = "Annulus Contour (Spline)"  # Change from just "Annulus"
-            self.logic.spline_node = slicer.mrmlScene.GetFirstNodeByName(spline_node_name)
-            
-            if not self.logic.spline_node:
-                # Create new spline node
-                self.logic.spline_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsClosedCurveNode")
-                self.logic.spline_node.SetName(spline_node_name)  # Use the full name
-                # Set spline properties
-                self.logic.spline_node.SetCurveTypeToCardinalSpline()
-                self.logic.spline_node.GetDisplayNode().SetSelectedColor(1, 1, 0)  # Yellow
-                self.logic.spline_node.GetDisplayNode().SetLineWidth(3)
-            
-            # Enable placement mode for spline
-            placeWidget = slicer.qSlicerMarkupsPlaceWidget()
-            placeWidget.setMRMLScene(slicer.mrmlScene)
-            placeWidget.setCurrentNode(self.logic.spline_node)
-            placeWidget.setPlaceModeEnabled(True)
-            
-            # Setup observer for spline
-            self.logic.setupSplineObserver()
-
-                
-        else:
-            # Original code for point landmarks
-            if not hasattr(self.logic, 'markups_node') or not self.logic.markups_node:
-                self.logic.markups_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
-                self.logic.markups_node.SetName(f"Landmarks_{self.logic.current_case_name}")
-                slicer.app.processEvents()
-            
-            # Check if landmark already exists
-            landmark_exists = False
-            if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
-                num_points = self.logic.markups_node.GetNumberOfControlPoints()
-                for i in range(num_points):
-                    point_label = self.logic.markups_node.GetNthControlPointLabel(i)
-                    if landmark_name in point_label:
-                        landmark_exists = True
-                        break
-            
-            if not landmark_exists:
-                # Enable placement mode for new landmark
-                placeWidget = slicer.qSlicerMarkupsPlaceWidget()
-                placeWidget.setMRMLScene(slicer.mrmlScene)
-                originalName = self.logic.markups_node.GetName()
-                self.logic.markups_node.SetName(f"{landmark_name} ")
-                placeWidget.setCurrentNode(self.logic.markups_node)
-                placeWidget.setPlaceModeEnabled(True)
-
-                # Restore name after short delay (after placement will start)
-                # qt.QTimer.singleShot(500, lambda: self.logic.markups_node.SetName(originalName))
-
-                self.logic.setupActivityObserver("landmark")
-
-    def onSaveCaseClicked(self):
-        """Handle save case button click"""
-        if hasattr(self.logic, 'current_case_name'):
-            case_name = self.logic.current_case_name
-            save_path = os.path.join(self.logic.main_folder, case_name, 'Platipy', f'landmarks_{case_name}.mrk.json')
-            
-            if os.path.exists(save_path):
-                reply = qt.QMessageBox.question(None, "Overwrite Existing", 
-                                            f"Landmarks file already exists for {case_name}. Overwrite?",
-                                            qt.QMessageBox.Yes | qt.QMessageBox.No)
-                if reply != qt.QMessageBox.Yes:
-                    return
-            
-            self.logic.saveLandmarks()
-            qt.QMessageBox.information(None, "Saved", f"Case {case_name} saved successfully!")
-
-    def onLandmarkItemClicked(self, item):
-        """Handle clicking on a landmark in the progress list"""
-        item_text = item.text()
-        landmark_name = item_text.split(":")[0].strip()
-        
-        # Auto-lock previous landmark if it was unlocked
-        if hasattr(self, 'selected_landmark') and self.selected_landmark != landmark_name:
-            if self.logic.landmarkExists(self.selected_landmark) and not self.logic.isLandmarkLocked(self.selected_landmark):
-                self.logic.lockUnlockLandmark(self.selected_landmark, lock=True)
-                self._logActivity("landmark", self.selected_landmark, "Auto-locked")
-        # Clear previous current_landmark
-        self.logic.current_landmark = None
-        
-        # Store selected landmark
-        self.selected_landmark = landmark_name
-        
-        # Visual feedback for selection
-        self.landmarkProgressList.setCurrentItem(item)
-        
-        # Enable placement mode if landmark exists and is unlocked, or doesn't exist yet
-        exists = self.logic.landmarkExists(landmark_name)
-        if not exists or (exists and not self.logic.isLandmarkLocked(landmark_name)):
-            # Set current landmark in logic for proper labeling
-            self.logic.current_landmark = landmark_name
-            self.enableLandmarkPlacement(landmark_name)
-            action_text = "editing" if exists else "placing"
-            self._logActivity("landmark", landmark_name, f"Started {action_text}")
-        
-        # Update action buttons
-        self.updateActionButtons(landmark_name)
-        self.updateLandmarkProgressList()  # Refresh to show auto-lock changes
-        
-        print(f"Selected landmark: {landmark_name}")
-
-    def updateActionButtons(self, landmark_name):
-        """Update button states based on selected landmark"""
-        if not landmark_name:
-            self.lockUnlockButton.setEnabled(False)
-            self.lockUnlockButton.setText("Click in one of the views to place")
-            self.resetLandmarkButton.setEnabled(False)
-            self.resetAllButton.setEnabled(False)
-            return
-        
-        # Check if landmark exists
-        exists = self.logic.landmarkExists(landmark_name)
-        print(f"DEBUG: landmark_name={landmark_name}, exists={exists}")
-        
-        if exists:
-            is_locked = self.logic.isLandmarkLocked(landmark_name)
-            if is_locked:
-                self.lockUnlockButton.setText("Click to Unlock Landmark")
-                self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #f44336; color: white; font-weight: bold; }")  # Red for locked
-            else:
-                self.lockUnlockButton.setText("Click to Lock Landmark")
-                self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #3bc824; color: white; font-weight: bold; }")  # Green for unlocked
-            self.lockUnlockButton.setEnabled(True)
-            self.resetLandmarkButton.setEnabled(True)  # Always enable if landmark exists, regardless of lock state
-        else:
-            self.lockUnlockButton.setText("Click in one of the views to place landmark")
-            self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #9E9E9E; color: white; font-weight: bold; }")  # Gray for disabled
-            self.lockUnlockButton.setEnabled(False)
-            self.resetLandmarkButton.setEnabled(False)
-        
-        # Enable "Reset All" if any landmarks exist
-        any_landmarks_exist = False
-        
-        # Check point landmarks
-        if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
-            if self.logic.markups_node.GetNumberOfControlPoints() > 0:
-                any_landmarks_exist = True
-        
-        # Check spline
-        if hasattr(self.logic, 'spline_node') and self.logic.spline_node:
-            if self.logic.spline_node.GetNumberOfControlPoints() > 0:
-                any_landmarks_exist = True
-        
-        self.resetAllButton.setEnabled(any_landmarks_exist)
-
-    def onCaseListItemActivated(self, item):
-        """Handles double-click or Enter key on case list item"""
-        self.onSelectCase()
-
-    def onLockUnlockClicked(self):
-        """Toggle lock state of selected landmark"""
-        if not hasattr(self, 'selected_landmark'):
-            return
-        
-        landmark_name = self.selected_landmark
-        is_locked = self.logic.isLandmarkLocked(landmark_name)
-        
-        # Toggle lock state
-        self.logic.lockUnlockLandmark(landmark_name, lock=not is_locked)
-        
-        # Update UI
-        self.updateActionButtons(landmark_name)
-        self.updateLandmarkProgressList()
-        
-        # Log activity
-        action = "Locked" if not is_locked else "Unlocked"
-        self._logActivity("landmark", landmark_name, action)
-        
-        # Auto-select next landmark if checkbox is checked and landmark was just locked
-        if self.autoSelectCheckbox.isChecked() and not is_locked:  # landmark was just locked
-            self.selectNextLandmark(landmark_name)
-
-    def selectNextLandmark(self, current_landmark):
-        """Automatically select the next incomplete landmark and enable placement"""
-        landmark_order = [
-            "Left Coronary Cusp Nadir",
-            "Right Coronary Cusp Nadir", 
-            "Non Coronary Cusp Nadir",
-            "Right-Left Commissure",
-            "Right-Non Commissure",
-            "Left-Non Commissure",
-            "Left Coronary Ostium Base",
-            "Right Coronary Ostium Base",
-            "Annulus Contour (Spline)"
-        ]
-        
-        # Find current landmark index
-        try:
-            current_index = landmark_order.index(current_landmark)
-        except ValueError:
-            return  # Current landmark not in list
-        
-        # Get progress status
-        progress = self.logic.getLandmarkProgress()
-        
-        # Look for next incomplete landmark starting from current position
-        for i in range(current_index + 1, len(landmark_order)):
-            landmark = landmark_order[i]
-            if progress.get(landmark, "✗") == "✗":  # Not completed
-                self._selectAndActivateLandmark(landmark)
-                return
-        
-        # If no incomplete landmark found after current, check from beginning
-        for i in range(current_index):
-            landmark = landmark_order[i]
-            if progress.get(landmark, "✗") == "✗":  # Not completed
-                self._selectAndActivateLandmark(landmark)
-                return
-
-    def _selectAndActivateLandmark(self, landmark_name):
-        """Helper method to find, select and activate a landmark with cursor - DELAYED VERSION"""
-        print(f"DEBUG: _selectAndActivateLandmark called with: {landmark_name}")
-        
-        try:
-            # Find and select in the list first
-            list_widget = self.landmarkProgressList
-            
-            for row in range(9):
-                try:
-                    item = list_widget.item(row)
-                    if item and item.text().startswith(landmark_name + ":"):
-                        print(f"DEBUG: Found matching item at row {row}")
-                        
-                        # Select in the list
-                        list_widget.setCurrentItem(item)
-                        
-                        # Store selected landmark
-                        self.selected_landmark = landmark_name
-                        self.logic.current_landmark = landmark_name
-                        
-                        # Update UI first
-                        self.updateActionButtons(landmark_name)
-                        self.updateLandmarkProgressList()
-                        
-                        # Use a timer to activate placement mode after a short delay
-                        print(f"DEBUG: Setting up delayed activation for: {landmark_name}")
-                        qt.QTimer.singleShot(100, lambda: self._delayedActivatePlacement(landmark_name))
-                        
-                        return
-                        
-                except Exception as e:
-                    print(f"DEBUG: Error at row {row}: {e}")
-                    break
-                    
-        except Exception as e:
-            print(f"DEBUG: Error in _selectAndActivateLandmark: {e}")
-
-    def _delayedActivatePlacement(self, landmark_name):
-        """Activate placement mode with a delay - DIRECT VERSION"""
-        print(f"DEBUG: _delayedActivatePlacement for: {landmark_name}")
-        
-        try:
-            # Simply call the existing enableLandmarkPlacement method
-            self.enableLandmarkPlacement(landmark_name)
-            
-            # Force interaction mode after a brief delay
-            qt.QTimer.singleShot(50, lambda: self._forceInteractionMode(landmark_name))
-            
-        except Exception as e:
-            print(f"DEBUG: Error in _delayedActivatePlacement: {e}")
-
-    def _forceInteractionMode(self, landmark_name):
-        """Force the interaction mode to Place"""
-        try:
-            interactionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLInteractionNodeSingleton")
-            if interactionNode:
-                interactionNode.SetCurrentInteractionMode(interactionNode.Place)
-                print(f"DEBUG: Forced interaction mode to Place for {landmark_name}")
-                
-                # Also ensure the correct node is selected
-                selectionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLSelectionNodeSingleton")
-                if selectionNode:
-                    if landmark_name == "Annulus Contour (Spline)" and hasattr(self.logic, 'spline_node'):
-                        selectionNode.SetActivePointListID(self.logic.spline_node.GetID())
-                    elif hasattr(self.logic, 'markups_node'):
-                        selectionNode.SetActivePointListID(self.logic.markups_node.GetID())
-                    print(f"DEBUG: Set active markup node for {landmark_name}")
-            
-        except Exception as e:
-            print(f"DEBUG: Error in _forceInteractionMode: {e}")
-
-    def onResetAll(self):
-        """Reset all landmarks with confirmation"""
-        # Show confirmation dialog
-        reply = qt.QMessageBox.question(None, "Confirm Reset All", 
-                                    "Are you sure you want to reset ALL landmarks?\n\nThis will permanently delete all placed landmarks and splines.",
-                                    qt.QMessageBox.Yes | qt.QMessageBox.No)
-        
-        if reply != qt.QMessageBox.Yes:
-            return  # User cancelled, don't reset
-        
-        # Reset all point landmarks
-        if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
-            self.logic.markups_node.RemoveAllControlPoints()
-            print("DEBUG: Reset all point landmarks")
-        
-        # Reset spline
-        if hasattr(self.logic, 'spline_node') and self.logic.spline_node:
-            self.logic.spline_node.RemoveAllControlPoints()
-            print("DEBUG: Reset spline")
-        
-        # Clear selected landmark
-        if hasattr(self, 'selected_landmark'):
-            delattr(self, 'selected_landmark')
-        
-        # Update UI
-        self.updateActionButtons("")
-        self.updateLandmarkProgressList()
-        
-        # Log the reset
-        self._logActivity("system", "all landmarks", "Reset all landmarks")
-        
-        print("All landmarks have been reset")
-
-    def onMarkCaseCompleteClicked(self):
-        """Handle mark case complete button click"""
-        if hasattr(self.logic, 'current_case_name'):
-            case_name = self.logic.current_case_name
-            reply = qt.QMessageBox.question(None, "Mark Complete", 
-                                        f"Mark case {case_name} as complete?",
-                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
-            if reply == qt.QMessageBox.Yes:
-                self.logic.markCaseComplete()
-                qt.QMessageBox.information(None, "Complete", f"Case {case_name} marked as complete!")
-
-class CardiacAnnotatorLogic(ScriptedLoadableModuleLogic):
-
-    def initializeProgressTracking(self, main_folder):
-        self.main_folder = main_folder
-        self.csv_path = os.path.join(main_folder, "progress_tracking.csv")
-        
-        # Load or create CSV
-        if os.path.exists(self.csv_path):
-            self.progress_df = pd.read_csv(self.csv_path, sep=";")
-        else:
-            # Create new CSV inline
-            case_list = self.findAllTAVICases(main_folder)     
-            print("###\n",case_list)   
-            self.progress_df = pd.DataFrame({
-                'Case_ID': case_list,
-                'Status': ['not_started'] * len(case_list),
-                'Date_Started': [''] * len(case_list),
-                'Date_Completed': [''] * len(case_list),
-                'Annotator': [''] * len(case_list),
-                'Verified': ['No'] * len(case_list),
-                'Landmarks': [0] * len(case_list),
-                'Blood_pool': [0] * len(case_list),
-                'Left_coronary_ostium': [0] * len(case_list),
-                'Right_coronary_ostium': [0] * len(case_list),                                
-                'Left_coronary_leaflet': [0] * len(case_list),
-                'Right_coronary_leaflet': [0] * len(case_list),
-                'Non_coronary_leaflet': [0] * len(case_list),     
-                'Calcifications': [0] * len(case_list),
-                'Total_Time_minutes': [0] * len(case_list)
-            })
-            self.progress_df.to_csv(self.csv_path, index=False, sep=";")
-        
-        # Find next case to work on
-        next_case = self.findNextCase()
-        return next_case if next_case else None
-    
-    def loadOrCreateProgressCSV(self, main_folder):
-        # Load existing CSV or create new one
-        pass
-
-    def findNextCase(self):
-        # Find first in_progress or not_started case
-        pass
-
-    def updateCaseStatus(self, case_id, status):
-        # Update case status in CSV
-        pass
-    
-    def findAllTAVICases(self, main_folder):
-        case_list = []      
-        for item in os.listdir(main_folder):
-            if not (item.startswith('TAVI') and os.path.isdir(os.path.join(main_folder, item))):
-                continue
-                
-            platipy_dir = os.path.join(main_folder, item, 'Platipy')
-            if not os.path.exists(platipy_dir):
-                continue
-                
-            # Check for 40pc.nii.gz files
-            files = [f for f in os.listdir(platipy_dir) if f.endswith('40pc.nii.gz')]
-            if files:
-                case_list.append(item)
-        
-        return sorted(case_list)
-
-    def startActivityTimer(self, activity_type, activity_name):
-        setattr(self, f'current_{activity_type}', activity_name)
-        setattr(self, f'{activity_type}_start_time', time.time())
-
-    def stopActivityTimer(self, activity_type):
-        if hasattr(self, f'{activity_type}_start_time'):
-            elapsed = time.time() - getattr(self, f'{activity_type}_start_time')
-            delattr(self, f'{activity_type}_start_time')
-
-    def getNextCases(self):
-        if not hasattr(self, 'progress_df'):
-            return []
-        
-        # Get in_progress cases first, then not_started
-        in_progress = self.progress_df[self.progress_df['Status'] == 'in_progress']['Case_ID'].tolist()
-        not_started = self.progress_df[self.progress_df['Status'] == 'not_started']['Case_ID'].tolist()
-        
-        # Combine: in_progress first, then not_started
-        pending_cases = in_progress + not_started
-                
-        return pending_cases
-
-    def loadCase(self, case_name):
-
-        # Check if current work needs saving before switching
-        if (hasattr(self, 'current_case_name') and 
-            hasattr(self, 'has_unsaved_changes') and 
-            self.has_unsaved_changes):
-            
-            # There are unsaved changes - prompt user
-            reply = qt.QMessageBox.question(None, "Unsaved Changes", 
-                                        f"You have unsaved changes for {self.current_case_name}. Save before switching?",
-                                        qt.QMessageBox.Yes | qt.QMessageBox.No | qt.QMessageBox.Cancel)
-            if reply == qt.QMessageBox.Yes:
-                self.saveLandmarks()
-            elif reply == qt.QMessageBox.Cancel:
-                return  # Don't switch cases
-            # If No, continue without saving
-        
-        # Clear the scene when switching cases
-        slicer.mrmlScene.Clear(0)
-
-        # Clear selected landmark when switching cases
-        if hasattr(self, 'widget_reference'):
-            if hasattr(self.widget_reference, 'selected_landmark'):
-                delattr(self.widget_reference, 'selected_landmark')
-
-        # Close previous log if exists
-        if hasattr(self, 'current_log_manager') and self.current_log_manager:
-            self.current_log_manager.close_case("switched")
-        
-        # Create new LogManager for this case
-        case_folder = os.path.join(self.main_folder, case_name, 'Platipy')
-        self.current_log_manager = self.LogManager(case_folder, case_name)
-        self.current_log_manager.open_case(case_name)
-        
-        case_path = os.path.join(self.main_folder, case_name, 'Platipy', f'{case_name} 40pc.nii.gz')        
-        slicer.util.loadVolume(case_path)        
-        self.updateCaseStatus(case_name, "in_progress")        
-
-
-        # view setup and window/level
-        slicer.app.layoutManager().setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutFourUpView)       
-        volumeNode = slicer.util.loadVolume(case_path)            
-        slicer.app.layoutManager().setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutFourUpView)
-        displayNode = volumeNode.GetDisplayNode()
-        displayNode.SetAutoWindowLevel(False)  # Turn off auto mode first
-        displayNode.SetWindow(2000)
-        displayNode.SetLevel(500)
-
-        # Create markups node for this case if it doesn't exist
-        node_name = f"Landmarks_{case_name}"
-        landmarks_path = os.path.join(self.main_folder, case_name, 'Platipy', f'landmarks_{case_name}.mrk.json')
-    
-        if os.path.exists(landmarks_path):
-            self.markups_node = slicer.util.loadMarkups(landmarks_path)
-            self.markups_node.SetName(node_name)
-            print(f"Loaded existing point landmarks from: {landmarks_path}")
-        else:
-            self.markups_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
-            self.markups_node.SetName(node_name)
-            print(f"Created new landmarks node: {node_name}")
-        
-        # Load existing spline - find any spline node and rename it
-        spline_node = slicer.mrmlScene.GetFirstNodeByClass("vtkMRMLMarkupsClosedCurveNode")
-        if spline_node:
-            spline_node.SetName("Annulus")
-            self.spline_node = spline_node
-            spline_points = spline_node.GetNumberOfControlPoints()
-            print(f"Found and renamed spline with {spline_points} points")
-        else:
-            self.spline_node = None
-            print("No existing spline found")
-
-        self.current_case_name = case_name
-        self.has_unsaved_changes = False # changed to True when a change is made
-        self.checkForIncompleteWork() # in case of a previous abrupt exit
-
-        # Reset button states
-        if hasattr(self, 'widget_reference'):
-            self.widget_reference.lockUnlockButton.setEnabled(False)
-            self.widget_reference.resetLandmarkButton.setEnabled(False) 
-            self.widget_reference.resetAllButton.setEnabled(False)       
-        
-        self.widget_reference.saveCaseButton.show() # to show save case button
-        self.widget_reference.markCaseCompleteButton.show() 
-
-        # Collapse the case navigator section
-        self.widget_reference.caseNavigatorCollapsible.collapsed = True
-
-    def updateCaseStatus(self, case_id, status):
-        # Find the row for this case
-        case_row_index = self.progress_df[self.progress_df['Case_ID'] == case_id].index
-        
-        if not case_row_index.empty:
-            current_status = self.progress_df.loc[case_row_index[0], 'Status']
-            
-            # Only update if moving from not_started to in_progress
-            if current_status == 'not_started' and status == 'in_progress':
-                self.progress_df.loc[case_row_index[0], 'Status'] = status
-                self.progress_df.loc[case_row_index[0], 'Date_Started'] = time.strftime("%Y-%m-%d %H:%M:%S")
-                # Add annotator info if you want
-                
-                # Save CSV
-                self.progress_df.to_csv(self.csv_path, index=False, sep=";")
-        self.has_unsaved_changes = False
-
-    def completeLandmark(self, landmark_name, notes):
-        # Add completion logic here
-        if hasattr(self, 'current_log_manager') and self.current_log_manager:
-            self.current_log_manager.write_entry(f"Complete landmark: {landmark_name} - Notes: {notes}")
-
-    def resetCurrentLandmark(self, landmark_name):
-        """Reset/delete a specific landmark"""
-        print(f"DEBUG: Attempting to reset landmark: {landmark_name}")
-        
-        if hasattr(self, 'markups_node') and self.markups_node:
-            print(f"DEBUG: Markups node exists with {self.markups_node.GetNumberOfControlPoints()} points")
-            
-            # Find and remove points with this landmark name
-            points_to_remove = []
-            num_points = self.markups_node.GetNumberOfControlPoints()
-            
-            for i in range(num_points):
-                point_label = self.markups_node.GetNthControlPointLabel(i)
-                print(f"DEBUG: Point {i} label: '{point_label}'")
-                if landmark_name in point_label:
-                    print(f"DEBUG: Found matching point at index {i}")
-                    # Unlock the point before removing it
-                    self.markups_node.SetNthControlPointLocked(i, False)
-                    points_to_remove.append(i)
-            self.has_unsaved_changes = True
-            
-            print(f"DEBUG: Points to remove: {points_to_remove}")
-            
-            # Remove points in reverse order to avoid index shifting
-            for i in reversed(points_to_remove):
-                print(f"DEBUG: Removing point at index {i}")
-                self.markups_node.RemoveNthControlPoint(i)
-                
-            print(f"DEBUG: After removal, {self.markups_node.GetNumberOfControlPoints()} points remain")
-        else:
-            print("DEBUG: No markups node found")        
-        
-        # Log the reset
-        if hasattr(self, 'current_log_manager') and self.current_log_manager:
-            self.current_log_manager.write_entry(f"Reset landmark: {landmark_name}")
-
-    def getLandmarkProgress(self):
-        """Return progress dictionary with compact status for each landmark type"""
-        landmark_types = [
-            "Left Coronary Cusp Nadir",
-            "Right Coronary Cusp Nadir", 
-            "Non Coronary Cusp Nadir",
-            "Right-Left Commissure",
-            "Right-Non Commissure",
-            "Left-Non Commissure",
-            "Left Coronary Ostium Base",
-            "Right Coronary Ostium Base",
-            "Annulus Contour (Spline)"
-        ]
-        
-        progress = {}
-        
-        # Check point landmarks
-        if hasattr(self, 'markups_node') and self.markups_node:
-            placed_landmarks = []
-            num_points = self.markups_node.GetNumberOfControlPoints()
-            for i in range(num_points):
-                point_label = self.markups_node.GetNthControlPointLabel(i)
-                placed_landmarks.append(point_label)
-            
-            # Set status for point landmarks
-            for landmark in landmark_types[:-1]:  # All except spline
-                if landmark in placed_landmarks:
-                    progress[landmark] = "✓"
-                else:
-                    progress[landmark] = "✗"
-        else:
-            # No markups node - all point landmarks not placed
-            for landmark in landmark_types[:-1]:
-                progress[landmark] = "✗"
-        
-        # Check spline landmark separately
-        if hasattr(self, 'spline_node') and self.spline_node:
-            spline_points = self.spline_node.GetNumberOfControlPoints()
-            if spline_points >= 3:  # Minimum for a meaningful contour
-                progress["Annulus Contour (Spline)"] = f"✓ ({spline_points} pts)"
-            elif spline_points > 0:
-                progress["Annulus Contour (Spline)"] = f"⚠ ({spline_points} pts)"
-            else:
-                progress["Annulus Contour (Spline)"] = "✗"
-        else:
-            progress["Annulus Contour (Spline)"] = "✗"
-        
-        return progress
-
-    def setupActivityObserver(self, activity_type):
-        """Set up observer to detect when activities (landmarks/segments) are placed"""
-        if hasattr(self, 'markups_node') and self.markups_node:
-            # Remove existing observer if any
-            if hasattr(self, 'observer_tag'):
-                self.markups_node.RemoveObserver(self.observer_tag)
-            
-            # Add observer for point position defined (not just added)
-            self.observer_tag = self.markups_node.AddObserver(
-                self.markups_node.PointPositionDefinedEvent, 
-                lambda caller, event: self.onActivityPlaced(caller, event, activity_type)
-            )
-
-    def onActivityPlaced(self, caller, event, activity_type):
-        """Called when an activity (landmark/segment) is placed"""
-        num_points = self.markups_node.GetNumberOfControlPoints()
-        if num_points > 0:
-            self.has_unsaved_changes = True # to trigger save prompt
-            # Get the last placed point
-            point_index = num_points - 1
-            pos = [0, 0, 0]
-            self.markups_node.GetNthControlPointPosition(point_index, pos)
-            
-            # Set the point label to match the landmark name            
-            if activity_type == "landmark":
-                activity_name = getattr(self, 'current_landmark', 'Unknown')
-                self.markups_node.SetNthControlPointLabel(point_index, activity_name)
-            
-            # Log the placement
-            if hasattr(self, 'current_log_manager') and self.current_log_manager:
-                activity_name = getattr(self, 'current_landmark', 'Unknown')
-                self.current_log_manager.write_entry(
-                    f"Placed {activity_type}: {activity_name}"
-                )     
-                            
-            # Update UI after placement
-            if hasattr(self, 'widget_reference'):
-                self.widget_reference.updateActionButtons(activity_name)
-                self.widget_reference.updateLandmarkProgressList()
-                
-                # Auto-select next landmark if checkbox is checked
-                if (hasattr(self.widget_reference, 'autoSelectCheckbox') and 
-                    self.widget_reference.autoSelectCheckbox.isChecked()):
-                    self.widget_reference.selectNextLandmark(activity_name)
-
-    def lockUnlockLandmark(self, landmark_name, lock=True):
-        """Lock or unlock points of the current landmark type"""
-        if landmark_name == "Annulus Contour (Spline)":
-            self.lockUnlockSpline(lock)
-        else:
-            # Original code for point landmarks
-            if hasattr(self, 'markups_node') and self.markups_node:
-                num_points = self.markups_node.GetNumberOfControlPoints()
-                for i in range(num_points):
-                    point_label = self.markups_node.GetNthControlPointLabel(i)
-                    if landmark_name in point_label:
-                        self.markups_node.SetNthControlPointLocked(i, lock)
-        self.has_unsaved_changes = True
-
-    def checkForIncompleteWork(self):
-        """Check if there was incomplete work and warn user"""
-        incomplete_items = []
-        
-        # Check point landmarks
-        if hasattr(self, 'markups_node') and self.markups_node:
-            num_points = self.markups_node.GetNumberOfControlPoints()
-            for i in range(num_points):
-                if not self.markups_node.GetNthControlPointLocked(i):
-                    point_label = self.markups_node.GetNthControlPointLabel(i)
-                    incomplete_items.append(f"Point: {point_label}")
-        
-        # Check spline
-        if hasattr(self, 'spline_node') and self.spline_node:
-            spline_points = self.spline_node.GetNumberOfControlPoints()
-            spline_locked = True
-            
-            for i in range(spline_points):
-                if not self.spline_node.GetNthControlPointLocked(i):
-                    spline_locked = False
-                    break
-            
-            if not spline_locked and spline_points > 0:
-                incomplete_items.append(f"Spline: Annulus Contour ({spline_points} points)")
-        
-        if incomplete_items:
-            items_text = "\n".join(incomplete_items)
-            qt.QMessageBox.warning(None, "Incomplete Work Detected", 
-                                f"Warning: Found unlocked landmarks from previous session:\n{items_text}\n\nPlease review and complete or reset these landmarks.")
-            
-            # Log the warning
-            if hasattr(self, 'current_log_manager') and self.current_log_manager:
-                self.current_log_manager.write_entry(f"Warning: Incomplete work detected: {', '.join(incomplete_items)}")
-
-    def saveLandmarks(self):
-        """Save current landmarks and spline to same JSON file"""
-        if hasattr(self, 'current_case_name'):
-            save_path = os.path.join(self.main_folder, self.current_case_name, 'Platipy', f'landmarks_{self.current_case_name}.mrk.json')
-            
-            # First save the landmarks
-            if hasattr(self, 'markups_node') and self.markups_node:
-                slicer.util.saveNode(self.markups_node, save_path)
-            
-            # Then manually add spline data to the JSON file
-            if hasattr(self, 'spline_node') and self.spline_node and os.path.exists(save_path):
-                import json
-                
-                # Read existing JSON
-                with open(save_path, 'r') as f:
-                    data = json.load(f)
-                
-                # Save spline to temp file to get its JSON structure
-                temp_path = save_path.replace('.mrk.json', '_temp.mrk.json')
-                slicer.util.saveNode(self.spline_node, temp_path)
-                
-                # Read spline JSON
-                with open(temp_path, 'r') as f:
-                    spline_data = json.load(f)
-                
-                # Add spline markups to main file
-                if 'markups' in spline_data:
-                    data['markups'].extend(spline_data['markups'])
-                
-                # Write combined data
-                with open(save_path, 'w') as f:
-                    json.dump(data, f, indent=2)
-                
-                # Clean up temp file
-                os.remove(temp_path)
-            
-
-            self.has_unsaved_changes = False  # Reset flag after successful sav
-            print(f"All landmarks saved to: {save_path}")
-
-    def setupSplineObserver(self):
-        """Set up observer specifically for spline landmark"""
-        if hasattr(self, 'spline_node') and self.spline_node:
-            # Remove existing observer if any
-            if hasattr(self, 'spline_observer_tag'):
-                self.spline_node.RemoveObserver(self.spline_observer_tag)
-            
-            # Add observer for point additions to spline
-            self.spline_observer_tag = self.spline_node.AddObserver(
-                self.spline_node.PointPositionDefinedEvent, 
-                self.onSplinePointPlaced
-            )
-
-    def onSplinePointPlaced(self, caller, event):
-        """Called when a point is added to the spline"""
-        num_points = self.spline_node.GetNumberOfControlPoints()
-        if num_points > 0:
-            self.has_unsaved_changes = True
-            # Get the last placed point
-            point_index = num_points - 1
-            pos = [0, 0, 0]
-            self.spline_node.GetNthControlPointPosition(point_index, pos)
-            
-            # Log the spline point placement
-            if hasattr(self, 'current_log_manager') and self.current_log_manager:
-                self.current_log_manager.write_entry(
-                    f"Added spline point {point_index + 1} at position ({pos[0]:.2f}, {pos[1]:.2f}, {pos[2]:.2f})"
-                )
-            
-            # Update UI after spline point placement
-            if hasattr(self, 'widget_reference'):
-                # Force button update since spline point was just placed
-                if (hasattr(self.widget_reference, 'selected_landmark') and 
-                    self.widget_reference.selected_landmark == "Annulus Contour (Spline)"):
-                    
-                    # Directly set button state for spline with points
-                    self.widget_reference.lockUnlockButton.setText("Click to Lock Landmark")
-                    self.widget_reference.lockUnlockButton.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; font-weight: bold; }")
-                    self.widget_reference.lockUnlockButton.setEnabled(True)
-                    self.widget_reference.resetLandmarkButton.setEnabled(True)
-                
-                # Update progress list
-                self.widget_reference.updateLandmarkProgressList()
-                
-                # Auto-select next landmark if checkbox is checked (won't do anything since spline is last)
-                if (hasattr(self.widget_reference, 'autoSelectCheckbox') and 
-                    self.widget_reference.autoSelectCheckbox.isChecked()):
-                    self.widget_reference.selectNextLandmark("Annulus Contour (Spline)")
-
-    def lockUnlockSpline(self, lock=True):
-        """Lock or unlock the spline node"""
-        if hasattr(self, 'spline_node') and self.spline_node:
-            num_points = self.spline_node.GetNumberOfControlPoints()
-            for i in range(num_points):
-                self.spline_node.SetNthControlPointLocked(i, lock)
-        self.has_unsaved_changes = True
-
-    def resetSpline(self):
-        """Reset/clear the current spline"""
-        if hasattr(self, 'spline_node') and self.spline_node:
-            # Clear all control points
-            self.spline_node.RemoveAllControlPoints()
-            self.has_unsaved_changes = True 
-            
-            # Log the reset
-            if hasattr(self, 'current_log_manager') and self.current_log_manager:
-                self.current_log_manager.write_entry("Reset Annulus Contour (Spline)")
-
-    def landmarkExists(self, landmark_name):
-        """Check if a landmark has been placed"""
-        if landmark_name == "Annulus Contour (Spline)":
-            return hasattr(self, 'spline_node') and self.spline_node and self.spline_node.GetNumberOfControlPoints() > 0
-        else:
-            if hasattr(self, 'markups_node') and self.markups_node:
-                num_points = self.markups_node.GetNumberOfControlPoints()
-                for i in range(num_points):
-                    point_label = self.markups_node.GetNthControlPointLabel(i)
-                    # Check if landmark name matches AND the point is in a defined state
-                    if (landmark_name in point_label and 
-                        self.markups_node.GetNthControlPointPositionStatus(i) == self.markups_node.PositionDefined):
-                        return True
-            return False
-
-    def isLandmarkLocked(self, landmark_name):
-        """Check if a landmark is locked"""
-        if landmark_name == "Annulus Contour (Spline)":
-            if hasattr(self, 'spline_node') and self.spline_node:
-                num_points = self.spline_node.GetNumberOfControlPoints()
-                if num_points > 0:
-                    return self.spline_node.GetNthControlPointLocked(0)  # Check first point
-            return False
-        else:
-            if hasattr(self, 'markups_node') and self.markups_node:
-                num_points = self.markups_node.GetNumberOfControlPoints()
-                for i in range(num_points):
-                    point_label = self.markups_node.GetNthControlPointLabel(i)
-                    if landmark_name in point_label:
-                        return self.markups_node.GetNthControlPointLocked(i)
-            return False
-
-
-    class LogManager:
-
-        def __init__(self, case_folder_path, case_name):
-            self.log_path = os.path.join(case_folder_path, f"annotation log {case_name}.txt")
-            self.current_task = None
-            self.task_start_time = None
-        
-        def write_entry(self, message):
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            log_line = f"{timestamp} - {message}\n"
-            
-            # Create file if it doesn't exist, append if it does
-            with open(self.log_path, 'a') as f:
-                f.write(log_line)
-        
-        def open_case(self, case_name):
-            if not os.path.exists(self.log_path):
-                # New log file
-                self.write_entry(f"=== {case_name} Annotation Log ===")
-                self.write_entry("Case opened/loaded in Slicer")
-            else:
-                # Existing log - check if previous session ended cleanly
-                with open(self.log_path, 'r') as f:
-                    lines = f.readlines()
-                
-                if lines:
-                    last_line = lines[-1].strip()
-                    if not ("case closed" in last_line.lower() or "session ended" in last_line.lower() or "completed and closed" in last_line.lower()):
-                        # Previous session ended abruptly
-                        self.write_entry("Case reopened (previous session ended unexpectedly)")
-                    else:
-                        # Previous session ended cleanly
-                        self.write_entry("Case reopened")
-                else:
-                    # Empty file
-                    self.write_entry(f"=== {case_name} Annotation Log ===")
-                    self.write_entry("Case opened/loaded in Slicer")
-        
-        def close_case(self, reason="switched"):
-            if reason == "switched":
-                self.write_entry(f"Case closed (switched to another case)")
-            elif reason == "completed":
-                self.write_entry("Case completed and closed")
-            elif reason == "session_ended":
-                self.write_entry("Case closed (session ended)")
-            else:
-                self.write_entry(f"Case closed ({reason})")
-                
-                def start_task(self, task_name):
-                    # Start timer, write "started X" entry
-                    0
-                
-                def complete_task(self):
-                    # Calculate duration, write "completed X" entry
-                    0
-
-    def calculateLandmarkTimeFromLog(self, log_path):
-        """Calculate total time spent on landmarks from log entries"""
-        with open(log_path, 'r') as f:
-            lines = f.readlines()
-        
-        landmark_times = {}
-        landmark_start_times = {}
-        
-        for line in lines:
-            if " - " not in line:
-                continue
-                
-            timestamp_str = line.split(" - ")[0]
-            content = line.split(" - ", 1)[1].strip()
-            
-            try:
-                timestamp = time.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-            except:
-                continue
-                
-            # Check for landmark start
-            if "started placing landmark:" in content.lower() or "started editing landmark:" in content.lower():
-                landmark_name = content.split(": ", 1)[1]
-                landmark_start_times[landmark_name] = timestamp
-                
-            # Check for landmark placed
-            elif "placed landmark:" in content.lower():
-                landmark_name = content.split(": ", 1)[1]
-                if landmark_name in landmark_start_times:
-                    start_time = landmark_start_times[landmark_name]
-                    duration = time.mktime(timestamp) - time.mktime(start_time)
-                    
-                    if landmark_name in landmark_times:
-                        landmark_times[landmark_name] += duration
-                    else:
-                        landmark_times[landmark_name] = duration
-                        
-                    print(f"{landmark_name}: {duration} seconds")
-        
-        total_seconds = sum(landmark_times.values())
-        total_minutes = total_seconds / 60
-        print(f"Total landmark time: {total_seconds} seconds = {total_minutes} minutes")
-        return math.ceil(total_minutes)
-
-    def markCaseComplete(self):
-        """Mark current case as complete and update total time from log"""
-        if not hasattr(self, 'current_case_name'):
-            return
-            
-        case_name = self.current_case_name
-        case_folder = os.path.join(self.main_folder, case_name, 'Platipy')
-        log_path = os.path.join(case_folder, f"annotation log {case_name}.txt")
-        
-        # Calculate total time from log
-        landmark_time = self.calculateLandmarkTimeFromLog(log_path) if os.path.exists(log_path) else 0
-        
-        # Update CSV
-        case_row_index = self.progress_df[self.progress_df['Case_ID'] == case_name].index
-        if not case_row_index.empty:
-            row_idx = case_row_index[0]
-            
-            # Update landmarks time
-            self.progress_df.loc[row_idx, 'Landmarks'] = landmark_time
-            
-            # Calculate total from all activity columns
-            activity_columns = ['Landmarks', 'Blood_pool', 'Left_coronary_ostium', 'Right_coronary_ostium',
-                            'Left_coronary_leaflet', 'Right_coronary_leaflet', 'Non_coronary_leaflet', 'Calcifications']
-            
-            total_time = sum(self.progress_df.loc[row_idx, col] for col in activity_columns)
-            
-            self.progress_df.loc[row_idx, 'Status'] = 'completed'
-            self.progress_df.loc[row_idx, 'Total_Time_minutes'] = total_time
-            self.progress_df.loc[row_idx, 'Date_Completed'] = time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Save CSV
-            self.progress_df.to_csv(self.csv_path, index=False, sep=";")
-        
-        # Close log
-        if hasattr(self, 'current_log_manager') and self.current_log_manager:
-            self.current_log_manager.close_case("completed")
-
-
-
-class CardiacAnnotatorTest(ScriptedLoadableModuleTest):
-
-    def runTest(self):
-        pass
\ No newline at end of file
+from slicer.ScriptedLoadableModule import *
+import ctk
+import qt
+import vtk
+import slicer
+import os 
+import numpy as np
+import pandas as pd
+import time
+import json
+import math
+import re
+import shutil
+import tempfile
+import concurrent.futures
+import multiprocessing
+import subprocess
+import sys
+from collections import OrderedDict
+
+from CardiacAnnotatorLib import (
+    LANDMARK_TYPES, AnnotationDataset, CaseLeaseManager, CasePrefetcher, LandmarkIndex, LandmarkJournal,
+    LandmarkTimingEngine, LogManager, MarkupsSerializer, compute_annotation_time_analytics, export_landmarks,
+    measure_case, update_dataset_measurements,
+)
+from CardiacAnnotatorLib.crops import CropCache, crop_array, landmark_roi
+from CardiacAnnotatorLib.nifti import read_nifti
+from CardiacAnnotatorLib.phases import BASE_PHASE, PhaseCache, case_phases, phase_path
+from CardiacAnnotatorLib.pyramid import PyramidCache
+from CardiacAnnotatorLib.stats import case_list_fields, stats_jobs, store_stats, volume_stats, window_level
+from CardiacAnnotatorLib.volumes import VolumeCache, default_cache_dir, transcode_dataset
+
+
+class CardiacAnnotator(ScriptedLoadableModule):
+    def __init__(self, parent):
+        ScriptedLoadableModule.__init__(self, parent)
+        self.parent.title = "CardiacAnnotator"
+        self.parent.categories = ["Cardiac"]
+        self.parent.dependencies = []
+        self.parent.contributors = ["JD"]
+        iconPath = os.path.join(os.path.dirname(__file__), "CardiacAnnotator.png")
+        self.parent.icon = qt.QIcon(iconPath)
+
+class CardiacAnnotatorWidget(ScriptedLoadableModuleWidget):   
+    def setup(self):
+        ScriptedLoadableModuleWidget.setup(self)
+        self.logic = CardiacAnnotatorLogic()
+
+        # =============================================================================
+        # CASE NAVIGATOR SECTION
+        # =============================================================================  
+        self.caseNavigatorCollapsible = ctk.ctkCollapsibleButton()
+        self.caseNavigatorCollapsible.text = "Case Navigator"
+        self.layout.addWidget(self.caseNavigatorCollapsible)
+        navigatorLayout = qt.QVBoxLayout(self.caseNavigatorCollapsible)
+        
+        # Load Cases Subsection
+        self.loadCasesButton = qt.QPushButton("Load cases folder")
+        navigatorLayout.addWidget(self.loadCasesButton)
+
+        # Active Case Subsection
+        self.activeCaseLabel = qt.QLabel("Active case:")
+        self.activeCaseLabel.hide()  
+        navigatorLayout.addWidget(self.activeCaseLabel)
+        
+        self.activeCaseWidget = qt.QLabel()
+        self.activeCaseWidget.hide()
+        self.activeCaseWidget.setAlignment(qt.Qt.AlignCenter)
+        self.activeCaseWidget.setMaximumHeight(20)
+        self.activeCaseWidget.setStyleSheet("border: 1px solid gray;font-weight: bold;")
+        navigatorLayout.addWidget(self.activeCaseWidget) 
+
+        # Prefetch counters
+        self.prefetchStatusLabel = qt.QLabel("")
+        self.prefetchStatusLabel.setStyleSheet("color: gray; font-size: 9pt;")
+        navigatorLayout.addWidget(self.prefetchStatusLabel)
+
+        self.memoryStatusLabel = qt.QLabel("")
+        self.memoryStatusLabel.setStyleSheet("color: gray; font-size: 9pt;")
+        navigatorLayout.addWidget(self.memoryStatusLabel)
+
+        # Open the aortic root crop of a case instead of the full CT once its landmarks exist
+        self.cropVolumesCheckbox = qt.QCheckBox("Open cropped aortic root when available")
+        self.cropVolumesCheckbox.setChecked(qt.QSettings().value("CardiacAnnotator/cropVolumes", "false") in (True, "true"))
+        self.cropVolumesCheckbox.setStyleSheet("QCheckBox { font-size: 9pt; }")
+        navigatorLayout.addWidget(self.cropVolumesCheckbox)
+
+        # Other cardiac phases next to the 40pc one, decoded when first shown
+        self.loadAllPhasesCheckbox = qt.QCheckBox("Load all cardiac phases (decoded on demand)")
+        self.loadAllPhasesCheckbox.setChecked(qt.QSettings().value("CardiacAnnotator/loadAllPhases", "false") in (True, "true"))
+        self.loadAllPhasesCheckbox.setStyleSheet("QCheckBox { font-size: 9pt; }")
+        navigatorLayout.addWidget(self.loadAllPhasesCheckbox)
+
+        # Case List Collapsible Subsection
+        self.caseListCollapsible = ctk.ctkCollapsibleButton()
+        self.caseListCollapsible.text = "Case list"
+        self.caseListCollapsible.collapsed = False
+        self.caseListCollapsible.hide()
+        navigatorLayout.addWidget(self.caseListCollapsible)
+        
+        # Case list layout (inside collapsible subsection)
+        caseListLayout = qt.QVBoxLayout(self.caseListCollapsible)
+        
+        # Filter row
+        caseFilterLayout = qt.QHBoxLayout()
+        self.caseStatusFilterCombo = qt.QComboBox()
+        for text, value in [("Pending", "pending"), ("All", "all"), ("In progress", "in_progress"),
+                            ("Not started", "not_started"), ("Completed", "completed")]:
+            self.caseStatusFilterCombo.addItem(text, value)
+        caseFilterLayout.addWidget(self.caseStatusFilterCombo)
+        self.caseSearchEdit = qt.QLineEdit()
+        self.caseSearchEdit.setPlaceholderText("Filter by case, annotator, date or e.g. spacing<0.8 slices>400")
+        caseFilterLayout.addWidget(self.caseSearchEdit)
+        caseListLayout.addLayout(caseFilterLayout)
+
+        # Horizontal layout for list and button
+        caseLayout = qt.QHBoxLayout()
+        
+        # Case table (model/view, rows are only materialized when shown)
+        self.caseListModel = CaseListModel()
+        self.caseTableView = qt.QTableView()
+        self.caseTableView.setModel(self.caseListModel)
+        self.caseTableView.setSelectionBehavior(qt.QAbstractItemView.SelectRows)
+        self.caseTableView.setSelectionMode(qt.QAbstractItemView.SingleSelection)
+        self.caseTableView.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+        self.caseTableView.horizontalHeader().setSortIndicator(-1, qt.Qt.AscendingOrder)
+        self.caseTableView.setSortingEnabled(True)
+        self.caseTableView.horizontalHeader().setStretchLastSection(True)
+        self.caseTableView.verticalHeader().hide()
+        self.caseTableView.verticalHeader().setDefaultSectionSize(20)
+        self.caseTableView.setMinimumHeight(150)
+        self.caseTableView.setVerticalScrollBarPolicy(qt.Qt.ScrollBarAsNeeded)
+        caseLayout.addWidget(self.caseTableView)
+        
+        # Select case button
+        self.selectCaseButton = qt.QPushButton("Select Case")
+        self.selectCaseButton.setMaximumWidth(100)
+        caseLayout.addWidget(self.selectCaseButton)
+        
+        # Add horizontal layout to case list layout
+        caseListLayout.addLayout(caseLayout)
+        
+        # Connect signals
+        self.selectCaseButton.connect('clicked()', self.onSelectCase)
+        self.loadCasesButton.connect('clicked()', self.onLoadCasesClicked)
+        self.caseTableView.connect('activated(QModelIndex)', self.onCaseListItemActivated)
+        self.caseStatusFilterCombo.connect('currentIndexChanged(int)', self.onCaseFilterChanged)
+        self.caseSearchEdit.connect('textChanged(QString)', self.onCaseFilterChanged)
+        self.cropVolumesCheckbox.connect('toggled(bool)', self.onCropVolumesToggled)
+        self.loadAllPhasesCheckbox.connect('toggled(bool)', self.onLoadAllPhasesToggled)
+        
+        # =============================================================================
+        # LANDMARKS MARKING SECTION
+        # =============================================================================
+        self.landmarksCollapsibleButton = ctk.ctkCollapsibleButton()
+        self.landmarksCollapsibleButton.text = "Landmarks Marking"
+        self.landmarksCollapsibleButton.collapsed = True
+        self.layout.addWidget(self.landmarksCollapsibleButton)
+        landmarksLayout = qt.QVBoxLayout(self.landmarksCollapsibleButton)
+
+        # Status label
+        self.landmarkStatusLabel = qt.QLabel("No case loaded")
+        self.landmarkStatusLabel.setStyleSheet("color: gray; font-style: italic;")
+        landmarksLayout.addWidget(self.landmarkStatusLabel)
+
+        # One click switch between the aortic root crop and the full volume
+        self.switchVolumeButton = qt.QPushButton("")
+        self.switchVolumeButton.hide()
+        landmarksLayout.addWidget(self.switchVolumeButton)
+
+        # Cardiac phase slider, shown when the case has several phases
+        self.phaseWidget = qt.QWidget()
+        phaseLayout = qt.QHBoxLayout(self.phaseWidget)
+        phaseLayout.setContentsMargins(0, 0, 0, 0)
+        self.phaseLabel = qt.QLabel("")
+        self.phaseLabel.setMinimumWidth(120)
+        phaseLayout.addWidget(self.phaseLabel)
+        self.phaseSlider = qt.QSlider(qt.Qt.Horizontal)
+        self.phaseSlider.setPageStep(1)
+        phaseLayout.addWidget(self.phaseSlider)
+        self.phaseWidget.hide()
+        landmarksLayout.addWidget(self.phaseWidget)
+
+        # Landmark selection
+        landmarkSelectionLayout = qt.QHBoxLayout()
+
+        # Lock/Unlock button
+        self.lockUnlockButton = qt.QPushButton("")
+        self.lockUnlockButton.setEnabled(False)
+        landmarkSelectionLayout.addWidget(self.lockUnlockButton)
+
+        landmarksLayout.addLayout(landmarkSelectionLayout)
+
+        # Progress tracking
+        progressFrame = qt.QFrame()
+        progressFrame.setStyleSheet("QFrame { border: 1px solid #e0e0e0; border-radius: 3px; padding: 3px; }")
+        landmarksLayout.addWidget(progressFrame)
+        progressLayout = qt.QVBoxLayout(progressFrame)
+
+        progressLabel = qt.QLabel("Landmark Progress:")
+        progressLabel.setStyleSheet("font-weight: bold; font-size: 10pt;")
+        progressLayout.addWidget(progressLabel)
+
+        # Progress list
+        self.landmarkProgressList = qt.QListWidget()
+        self.landmarkProgressList.setMaximumHeight(130)
+        self.landmarkProgressList.setAlternatingRowColors(True)
+        self.landmarkProgressList.itemClicked.connect(self.onLandmarkItemClicked)
+        self.landmarkProgressList.setStyleSheet("QListWidget { font-size: 12pt; }")
+        progressLayout.addWidget(self.landmarkProgressList)
+
+        # Refresh scheduler state: requests within one event loop tick share one update
+        self.landmark_rows = {}
+        self.refresh_scheduled = False
+        self.refresh_list_pending = False
+        self.refresh_buttons_pending = False
+        self.refresh_buttons_landmark = ""
+        self.refresh_requested = 0
+        self.refresh_performed = 0
+        self.refreshStatusLabel = qt.QLabel("")
+        self.refreshStatusLabel.setStyleSheet("color: gray; font-size: 9pt;")
+        progressLayout.addWidget(self.refreshStatusLabel)
+
+        # Auto-select next landmark checkbox
+        self.autoSelectCheckbox = qt.QCheckBox("Automatically select next landmark upon placement")
+        self.autoSelectCheckbox.setChecked(True)  # Par défaut activé
+        self.autoSelectCheckbox.setStyleSheet("QCheckBox { font-size: 10pt; margin: 5px; }")
+        progressLayout.addWidget(self.autoSelectCheckbox)
+
+        # Annulus measurements, filled in when the spline is locked
+        self.measurementLabel = qt.QLabel("")
+        self.measurementLabel.setStyleSheet("font-size: 9pt;")
+        self.measurementLabel.setWordWrap(True)
+        progressLayout.addWidget(self.measurementLabel)
+
+        # Action buttons
+        actionButtonsLayout = qt.QHBoxLayout()
+
+        self.resetLandmarkButton = qt.QPushButton("Reset Current")
+        self.resetLandmarkButton.setStyleSheet("QPushButton { background-color: #dd2f29; color: white; font-weight: bold;}")
+        self.resetLandmarkButton.setEnabled(False)
+        actionButtonsLayout.addWidget(self.resetLandmarkButton)
+
+        self.resetAllButton = qt.QPushButton("Reset All")
+        self.resetAllButton.setStyleSheet("QPushButton { background-color: #ec0909; color: white; font-weight: bold;}")
+        self.resetAllButton.setEnabled(False)
+        actionButtonsLayout.addWidget(self.resetAllButton)
+
+        landmarksLayout.addLayout(actionButtonsLayout)
+
+        # Connect landmark signals
+        self.lockUnlockButton.connect('clicked()', self.onLockUnlockClicked)        
+        self.resetLandmarkButton.connect('clicked()', self.onResetLandmark)
+        self.resetAllButton.connect('clicked()', self.onResetAll)
+        self.switchVolumeButton.connect('clicked()', self.onSwitchVolumeClicked)
+        self.phaseSlider.connect('valueChanged(int)', self.onPhaseSliderChanged)
+
+        # Timer for updating display
+        self.timer = qt.QTimer()
+        self.timer.timeout.connect(self.updateTimerDisplay)
+        self.current_landmark_active = False
+
+
+        # =============================================================================
+        # SAVE AND COMPLETE BUTTONS (SIDE BY SIDE)
+        # =============================================================================
+
+        # Create horizontal layout for the buttons
+        saveCompleteLayout = qt.QHBoxLayout()
+
+        self.saveCaseButton = qt.QPushButton("Save Case (actually the Landmarsk)")
+        self.saveCaseButton.setStyleSheet("QPushButton {  color: white; font-weight: bold; padding: 8px; }")
+        self.saveCaseButton.hide()  # Hidden until case is loaded
+        saveCompleteLayout.addWidget(self.saveCaseButton)
+
+        self.markCaseCompleteButton = qt.QPushButton("Mark Case Complete")
+        self.markCaseCompleteButton.setStyleSheet("QPushButton {  color: white; font-weight: bold; padding: 8px; }")
+        self.markCaseCompleteButton.hide()  # Hidden until case is loaded
+        saveCompleteLayout.addWidget(self.markCaseCompleteButton)
+
+        # Add the horizontal layout to the main layout
+        self.layout.addLayout(saveCompleteLayout)
+
+        # Background save indicator
+        self.saveStatusLabel = qt.QLabel("")
+        self.saveStatusLabel.setStyleSheet("color: gray; font-size: 9pt;")
+        self.layout.addWidget(self.saveStatusLabel)
+
+        # Connect buttons
+        self.saveCaseButton.connect('clicked()', self.onSaveCaseClicked)
+        self.markCaseCompleteButton.connect('clicked()', self.onMarkCaseCompleteClicked)
+
+        # For putting it at the top
+        self.layout.addStretch(1)
+        self.layout.setAlignment(qt.Qt.AlignTop)
+
+    def cleanup(self):
+        """Stop background workers when the module is closed"""
+        # Queued saves must reach the disk before anything else shuts down
+        self.logic.waitForSaves()
+        if getattr(self.logic, 'landmark_journal', None):
+            self.logic.landmark_journal.close()
+        if getattr(self.logic, 'current_log_manager', None):
+            self.logic.current_log_manager.close_case("session_ended")
+        if getattr(self.logic, 'prefetcher', None):
+            self.logic.prefetcher.shutdown()
+        if getattr(self.logic, 'scene_cache', None):
+            self.logic.scene_cache.clear()
+        if getattr(self.logic, 'lease_poll_timer', None):
+            self.logic.lease_poll_timer.stop()
+        if getattr(self.logic, 'dataset', None):
+            self.logic.dataset.close()
+        if getattr(self.logic, 'volume_cache', None):
+            self.logic.volume_cache.save()
+        if getattr(self.logic, 'pyramid_cache', None):
+            self.logic.pyramid_cache.shutdown()
+        if getattr(self.logic, 'phase_cache', None):
+            self.logic.phase_cache.shutdown()
+        if getattr(self.logic, 'stats_pool', None):
+            # Queued cases are dropped, stats already stored stay in the case index
+            self.logic.stats_poll_timer.stop()
+            self.logic.pollVolumeStats()
+            self.logic.stats_pool.shutdown(wait=False, cancel_futures=True)
+        if getattr(self.logic, 'volume_executor', None):
+            self.logic.volume_poll_timer.stop()
+            self.logic.volume_executor.shutdown(wait=False, cancel_futures=True)
+
+    def updateCaseList(self, next_cases):
+        # self.caseLabel.show()
+        # One progress query for the whole dataset plus the volume stats, the model does the rest
+        progress_df = self.logic.progress_store.to_dataframe()
+        stats_df = pd.DataFrame.from_dict(self.logic.getCaseListFields(), orient='index', columns=CaseListModel.NUMERIC_COLUMNS)
+        progress_df = progress_df.merge(stats_df, how='left', left_on='Case_ID', right_index=True)
+        self.caseListModel.setProgress(progress_df, next_cases)
+        
+        self.activeCaseLabel.show() 
+        self.caseListCollapsible.show()
+
+    def onCropVolumesToggled(self, checked):
+        qt.QSettings().setValue("CardiacAnnotator/cropVolumes", "true" if checked else "false")
+        self.logic.crop_volumes = checked
+
+    def onSwitchVolumeClicked(self):
+        cropped = not getattr(self.logic, 'volume_is_cropped', False)
+        if not self.logic.switchCaseVolume(cropped):
+            qt.QMessageBox.information(None, "No Cropped Volume",
+                                       "This case has no aortic root crop yet. It is made when the landmarks are saved.")
+            return
+        self.logic.last_memory_report = self.logic.getSceneMemoryUsage()
+        self.memoryStatusLabel.setText(self.logic.formatMemoryReport(self.logic.last_memory_report, detailed=False))
+        self.updateSwitchVolumeButton()
+        self.updatePhaseSlider()
+
+    def onLoadAllPhasesToggled(self, checked):
+        qt.QSettings().setValue("CardiacAnnotator/loadAllPhases", "true" if checked else "false")
+        self.logic.load_all_phases = checked
+
+    def updatePhaseSlider(self):
+        phases = getattr(self.logic, 'case_phases', None)
+        if not phases:
+            self.phaseWidget.hide()
+            return
+        self.phaseSlider.blockSignals(True)
+        self.phaseSlider.setRange(0, len(phases) - 1)
+        self.phaseSlider.setValue(phases.index(self.logic.current_phase))
+        self.phaseSlider.blockSignals(False)
+        enabled = self.logic.canBrowsePhases()
+        self.phaseSlider.setEnabled(enabled)
+        self.phaseSlider.setToolTip("" if enabled else "Phases are shown on the full resolution volume only")
+        self.phaseLabel.setText(f"Phase: {self.logic.current_phase}%")
+        self.phaseWidget.show()
+
+    def onPhaseSliderChanged(self, position):
+        phase = self.logic.case_phases[position]
+        if not self.logic.showPhase(phase):
+            self.phaseLabel.setText(f"Phase: {phase}% (loading...)")
+
+    def onPhaseShown(self, phase):
+        self.phaseLabel.setText(f"Phase: {phase}%")
+        self.phaseLabel.setToolTip(self.logic.phase_cache.counters_text())
+        if self.logic.case_phases[self.phaseSlider.value] != phase:
+            # Decoding failed, put the slider back on the phase on display
+            self.updatePhaseSlider()
+
+    def onCaseLeaseLost(self, case_name, holder):
+        """Another workstation took over the open case, its edits can no longer be saved"""
+        by = f" by {holder.get('annotator', 'another annotator')}" if holder else ""
+        self.saveStatusLabel.setText(f"Lease lost - {case_name} is read-only")
+        qt.QMessageBox.warning(None, "Case Taken Over",
+                               f"{case_name} was taken over{by} after this workstation stopped renewing its lease.\n\n"
+                               "Saving is disabled for this case; reload it to annotate again.")
+
+    def onFullResolutionLoaded(self):
+        self.logic.last_memory_report = self.logic.getSceneMemoryUsage()
+        self.memoryStatusLabel.setText(self.logic.formatMemoryReport(self.logic.last_memory_report, detailed=False))
+        self.updatePhaseSlider()
+
+    def updateSwitchVolumeButton(self):
+        if getattr(self.logic, 'volume_is_cropped', False):
+            self.switchVolumeButton.setText("Show Full Volume")
+            self.switchVolumeButton.show()
+        elif getattr(self.logic, 'crop_volumes', False):
+            self.switchVolumeButton.setText("Show Cropped Aortic Root")
+            self.switchVolumeButton.show()
+        else:
+            self.switchVolumeButton.hide()
+
+    def onCaseFilterChanged(self, *args):
+        self.caseListModel.setFilter(status_filter=self.caseStatusFilterCombo.currentData,
+                                     text_filter=self.caseSearchEdit.text)
+
+    def onSelectCase(self):
+        index = self.caseTableView.currentIndex()
+        if index.isValid():
+            case_name = self.caseListModel.caseIdAt(index.row())
+            print(f"Starting work on: {case_name}")
+            self.logic.widget_reference = self
+
+            # Check if current work needs saving before switching
+            discard_current = False
+            if hasattr(self.logic, 'current_case_name') and self.logic.has_unsaved_changes:
+                reply = qt.QMessageBox.question(None, "Unsaved Changes", 
+                                            f"You have unsaved changes for {self.logic.current_case_name}. Save before switching?",
+                                            qt.QMessageBox.Yes | qt.QMessageBox.No | qt.QMessageBox.Cancel)
+                if reply == qt.QMessageBox.Cancel:
+                    return  # Don't switch cases
+                # If No, continue without saving
+                discard_current = reply == qt.QMessageBox.No
+
+            if not self.logic.loadCase(case_name, discard_current=discard_current):
+                holder = self.logic.lease_manager.holder(case_name) or {}
+                qt.QMessageBox.warning(None, "Case In Use",
+                                       f"{case_name} is currently being annotated by {holder.get('annotator', 'another workstation')}.")
+                return
+            self.onCaseLoaded(case_name)
+
+    def onCaseLoaded(self, case_name):
+        """Bring the panel in line with the case the logic just loaded"""
+        # Clear selected landmark when switching cases
+        if hasattr(self, 'selected_landmark'):
+            delattr(self, 'selected_landmark')
+
+        # Reset button states
+        self.lockUnlockButton.setEnabled(False)
+        self.resetLandmarkButton.setEnabled(False) 
+        self.resetAllButton.setEnabled(False)       
+        self.saveCaseButton.show() # to show save case button
+        self.markCaseCompleteButton.show() 
+
+        # Collapse the case navigator section
+        self.caseNavigatorCollapsible.collapsed = True
+
+        if getattr(self.logic, 'prefetcher', None):
+            self.prefetchStatusLabel.setText(self.logic.prefetcher.counters_text())
+        self.memoryStatusLabel.setText(self.logic.formatMemoryReport(self.logic.last_memory_report, detailed=False))
+        self.updateSwitchVolumeButton()
+        self.updatePhaseSlider()
+
+        self.caseListModel.updateCase(case_name, self.logic.progress_store.get(case_name))
+        self.activeCaseWidget.setText(case_name)
+        self.activeCaseWidget.show()
+        self.activeCaseLabel.show()   
+        self.enableLandmarkSection(case_name)     
+
+        # in case of a previous abrupt exit
+        if self.logic.incomplete_items:
+            items_text = "\n".join(self.logic.incomplete_items)
+            qt.QMessageBox.warning(None, "Incomplete Work Detected", 
+                                f"Warning: Found unlocked landmarks from previous session:\n{items_text}\n\nPlease review and complete or reset these landmarks.")
+        
+    def onLoadCasesClicked(self):
+        # Always use last saved directory as default
+        settings = qt.QSettings()
+        default_dir = settings.value("CardiacAnnotator/lastDirectory", "")
+        
+        selected_dir = qt.QFileDialog.getExistingDirectory(None, "Select TAVI Dataset Directory", default_dir)
+        
+        if selected_dir:
+            # self.loadCasesButton.setText(selected_dir) # commented to keep "Load cases" text
+            # Always save the selected directory
+            settings.setValue("CardiacAnnotator/lastDirectory", selected_dir)
+            self.logic.widget_reference = self
+            next_case = self.logic.initializeProgressTracking(selected_dir)  
+            next_cases = self.logic.getNextCases()  # You'll need this method in Logic
+            self.updateCaseList(next_cases)            
+            self.prefetchStatusLabel.setText(self.logic.prefetcher.counters_text())
+            
+    def _logActivity(self, activity_type, name, action, event_type="note", **fields):
+        """Shared logging method (text line plus structured event)"""
+        if hasattr(self.logic, 'current_log_manager') and self.logic.current_log_manager:
+            self.logic.current_log_manager.write_event(event_type, f"{action} {activity_type}: {name}", **fields)
+
+    def onMarkComplete(self):
+        if hasattr(self, 'selected_landmark'):
+            landmark_name = self.selected_landmark
+            self.logic.completeLandmark(landmark_name, "")
+            
+            # Lock the landmark
+            self.logic.lockUnlockLandmark(landmark_name, lock=True)
+            
+            # Update UI
+            self.scheduleLandmarkRefresh(landmark_name)
+
+    def onResetLandmark(self):
+        if hasattr(self, 'selected_landmark'):
+            landmark_name = self.selected_landmark
+            
+            # Show confirmation dialog
+            reply = qt.QMessageBox.question(None, "Confirm Reset", 
+                                        f"Are you sure you want to reset the landmark '{landmark_name}'?\n\nThis will permanently delete the placed landmark.",
+                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
+            
+            if reply != qt.QMessageBox.Yes:
+                return  # User cancelled, don't reset
+            
+            # Proceed with reset
+            if landmark_name == "Annulus Contour (Spline)":
+                self.logic.resetSpline()
+            else:
+                self.logic.resetCurrentLandmark(landmark_name)  # Pass landmark name
+            
+            # Update UI
+            self.scheduleLandmarkRefresh(landmark_name)
+                       
+    def updateTimerDisplay(self):
+        if self.current_landmark_active and hasattr(self.logic, 'landmark_start_time'):
+            elapsed = time.time() - self.logic.landmark_start_time
+            minutes = int(elapsed // 60)
+            seconds = int(elapsed % 60)
+            self.timerLabel.setText(f"Time: {minutes:02d}:{seconds:02d}")
+
+    def scheduleLandmarkRefresh(self, landmark_name=None):
+        """Request a landmark panel refresh, coalesced with other requests in the same event loop tick
+
+        landmark_name=None only refreshes the progress list; a name (or "") also updates the action buttons.
+        """
+        self.refresh_requested += 1
+        self.refresh_list_pending = True
+        if landmark_name is not None:
+            self.refresh_buttons_pending = True
+            self.refresh_buttons_landmark = landmark_name  # latest request wins
+        if not self.refresh_scheduled:
+            self.refresh_scheduled = True
+            qt.QTimer.singleShot(0, self.performLandmarkRefresh)
+
+    def performLandmarkRefresh(self):
+        """Run the pending landmark panel refresh once"""
+        self.refresh_scheduled = False
+        if self.refresh_buttons_pending:
+            self.refresh_buttons_pending = False
+            self.updateActionButtons(self.refresh_buttons_landmark)
+        if self.refresh_list_pending:
+            self.refresh_list_pending = False
+            self.updateLandmarkProgressList()
+            self.updateMeasurementReadout()
+        self.refresh_performed += 1
+        self.refreshStatusLabel.setText(f"Refreshes: {self.refresh_performed} performed / {self.refresh_requested} requested")
+
+    def updateMeasurementReadout(self):
+        measurements = getattr(self.logic, 'last_measurements', None)
+        if not measurements:
+            self.measurementLabel.setText("")
+            return
+        self.measurementLabel.setText(
+            f"Annulus: perimeter {measurements['Annulus_perimeter_mm']:.1f} mm, area {measurements['Annulus_area_mm2']:.0f} mm²\n"
+            f"Diameters: min {measurements['Annulus_min_diameter_mm']:.1f} / max {measurements['Annulus_max_diameter_mm']:.1f} / "
+            f"perimeter-derived {measurements['Annulus_perimeter_diameter_mm']:.1f} mm\n"
+            f"Coronary heights: LCA {measurements['LCA_height_mm']:.1f} mm, RCA {measurements['RCA_height_mm']:.1f} mm")
+
+    def updateLandmarkProgressList(self):
+        """Update the progress list, only touching rows whose status or highlight changed"""
+        if not (hasattr(self.logic, 'current_log_manager') and self.logic.current_log_manager):
+            self.landmarkProgressList.clear()
+            self.landmark_rows = {}
+            return
+        
+        progress = self.logic.getLandmarkProgress()
+        if self.landmarkProgressList.count != len(progress) or list(self.landmark_rows) != list(progress):
+            # Row set changed (first case load), build the items once
+            self.landmarkProgressList.clear()
+            self.landmark_rows = {}
+            for landmark in progress:
+                self.landmarkProgressList.addItem(qt.QListWidgetItem(f"{landmark}:"))
+                self.landmark_rows[landmark] = None
+        
+        selected = getattr(self, 'selected_landmark', None)
+        for row, (landmark, status) in enumerate(progress.items()):
+            row_state = (status, selected == landmark)
+            if self.landmark_rows[landmark] == row_state:
+                continue
+            self.landmark_rows[landmark] = row_state
+            item = self.landmarkProgressList.item(row)
+            item.setText(f"{landmark}: {status}")
+            font = item.font()
+            font.setPointSize(12)
+            
+            # Highlight if this is the currently selected landmark
+            font.setBold(row_state[1])
+            if row_state[1]:
+                item.setBackground(qt.QColor(255, 235, 59, 100))  # Light yellow background
+            else:
+                item.setBackground(qt.QBrush())
+            item.setFont(font)
+
+    def enableLandmarkSection(self, case_name):
+        """Enable landmark section when a case is loaded"""
+        self.landmarkStatusLabel.setText(f"Ready for annotation: {case_name}")
+        self.landmarkStatusLabel.setStyleSheet("color: green; font-style: normal; font-weight: bold; font-size: 10pt;")
+        self.lockUnlockButton.setEnabled(False)
+        self.scheduleLandmarkRefresh()
+        
+        # Check if all landmarks are placed and locked
+        progress = self.logic.getLandmarkProgress()
+        all_completed = all(status == "✓" or status.startswith("✓") for status in progress.values())
+        
+        if all_completed:
+            # Check if all landmarks are also locked
+            landmark_types = self.logic.LANDMARK_TYPES
+            
+            all_locked = True
+            for landmark in landmark_types:
+                if self.logic.landmarkExists(landmark) and not self.logic.isLandmarkLocked(landmark):
+                    all_locked = False
+                    break
+            
+            if all_locked:
+                # All landmarks placed and locked - collapse the section
+                self.landmarksCollapsibleButton.collapsed = True
+            else:
+                # Some landmarks not locked - keep section open
+                self.landmarksCollapsibleButton.collapsed = False
+        else:
+            # Not all landmarks placed - keep section open
+            self.landmarksCollapsibleButton.collapsed = False
+
+    def onLandmarkSelectionChanged(self):
+        if self.current_landmark_active:
+            # Auto-stop current landmark
+            self.onStartStopLandmark()  # This will stop the current one
+            self._logActivity("landmark", self.logic.current_landmark, "Auto-stopped (selection changed)",
+                              "landmark_stopped", landmark=self.logic.current_landmark)
+
+    def enableLandmarkPlacement(self, landmark_name):
+        
+        if landmark_name == "Annulus Contour (Spline)":
+            # Only reuse this case's spline, hidden cases keep theirs in the scene
+            if not getattr(self.logic, 'spline_node', None):
+                self.logic.spline_node = self.logic.createSplineNode()
+            
+            # Enable placement mode for spline
+            placeWidget = slicer.qSlicerMarkupsPlaceWidget()
+            placeWidget.setMRMLScene(slicer.mrmlScene)
+            placeWidget.setCurrentNode(self.logic.spline_node)
+            placeWidget.setPlaceModeEnabled(True)
+            
+            # Setup observer for spline
+            self.logic.setupSplineObserver()
+
+                
+        else:
+            # Original code for point landmarks
+            if not hasattr(self.logic, 'markups_node') or not self.logic.markups_node:
+                self.logic.markups_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+                self.logic.markups_node.SetName(f"Landmarks_{self.logic.current_case_name}")
+                slicer.app.processEvents()
+            
+            # Check if landmark already exists
+            landmark_exists = False
+            if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
+                landmark_exists = bool(self.logic.getLandmarkIndex().get(landmark_name)['indices'])
+            
+            if not landmark_exists:
+                # Enable placement mode for new landmark
+                placeWidget = slicer.qSlicerMarkupsPlaceWidget()
+                placeWidget.setMRMLScene(slicer.mrmlScene)
+                originalName = self.logic.markups_node.GetName()
+                self.logic.markups_node.SetName(f"{landmark_name} ")
+                placeWidget.setCurrentNode(self.logic.markups_node)
+                placeWidget.setPlaceModeEnabled(True)
+
+                # Restore name after short delay (after placement will start)
+                # qt.QTimer.singleShot(500, lambda: self.logic.markups_node.SetName(originalName))
+
+                self.logic.setupActivityObserver("landmark")
+
+    def onSaveCaseClicked(self):
+        """Handle save case button click"""
+        if hasattr(self.logic, 'current_case_name'):
+            case_name = self.logic.current_case_name
+            save_path = self.logic.getLandmarksPath(case_name)
+            
+            if os.path.exists(save_path):
+                reply = qt.QMessageBox.question(None, "Overwrite Existing", 
+                                            f"Landmarks file already exists for {case_name}. Overwrite?",
+                                            qt.QMessageBox.Yes | qt.QMessageBox.No)
+                if reply != qt.QMessageBox.Yes:
+                    return
+            
+            self.logic.saveLandmarks(on_done=lambda ok, error: self.onSaveFinished(case_name, ok, error))
+
+    def onSaveFinished(self, case_name, ok, error):
+        """Completion callback of a background save started from the save button"""
+        if ok:
+            qt.QMessageBox.information(None, "Saved", f"Case {case_name} saved successfully!")
+        else:
+            qt.QMessageBox.critical(None, "Save Failed", f"Could not save {case_name}:\n{error}")
+
+    def onLandmarkItemClicked(self, item):
+        """Handle clicking on a landmark in the progress list"""
+        item_text = item.text()
+        landmark_name = item_text.split(":")[0].strip()
+        
+        # Auto-lock previous landmark if it was unlocked
+        if hasattr(self, 'selected_landmark') and self.selected_landmark != landmark_name:
+            if self.logic.landmarkExists(self.selected_landmark) and not self.logic.isLandmarkLocked(self.selected_landmark):
+                self.logic.lockUnlockLandmark(self.selected_landmark, lock=True)
+                self._logActivity("landmark", self.selected_landmark, "Auto-locked",
+                                  "landmark_locked", landmark=self.selected_landmark, auto=True)
+        # Clear previous current_landmark
+        self.logic.current_landmark = None
+        
+        # Store selected landmark
+        self.selected_landmark = landmark_name
+        
+        # Visual feedback for selection
+        self.landmarkProgressList.setCurrentItem(item)
+        
+        # Enable placement mode if landmark exists and is unlocked, or doesn't exist yet
+        exists = self.logic.landmarkExists(landmark_name)
+        if not exists or (exists and not self.logic.isLandmarkLocked(landmark_name)):
+            # Set current landmark in logic for proper labeling
+            self.logic.current_landmark = landmark_name
+            self.enableLandmarkPlacement(landmark_name)
+            action_text = "editing" if exists else "placing"
+            self._logActivity("landmark", landmark_name, f"Started {action_text}",
+                              "landmark_started", landmark=landmark_name, mode=action_text)
+        
+        # Update action buttons
+        self.scheduleLandmarkRefresh(landmark_name)  # Refresh to show auto-lock changes
+        
+        print(f"Selected landmark: {landmark_name}")
+
+    def updateActionButtons(self, landmark_name):
+        """Update button states based on selected landmark"""
+        if not landmark_name:
+            self.lockUnlockButton.setEnabled(False)
+            self.lockUnlockButton.setText("Click in one of the views to place")
+            self.resetLandmarkButton.setEnabled(False)
+            self.resetAllButton.setEnabled(False)
+            return
+        
+        # Check if landmark exists
+        exists = self.logic.landmarkExists(landmark_name)
+        print(f"DEBUG: landmark_name={landmark_name}, exists={exists}")
+        
+        if exists:
+            is_locked = self.logic.isLandmarkLocked(landmark_name)
+            if is_locked:
+                self.lockUnlockButton.setText("Click to Unlock Landmark")
+                self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #f44336; color: white; font-weight: bold; }")  # Red for locked
+            else:
+                self.lockUnlockButton.setText("Click to Lock Landmark")
+                self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #3bc824; color: white; font-weight: bold; }")  # Green for unlocked
+            self.lockUnlockButton.setEnabled(True)
+            self.resetLandmarkButton.setEnabled(True)  # Always enable if landmark exists, regardless of lock state
+        else:
+            self.lockUnlockButton.setText("Click in one of the views to place landmark")
+            self.lockUnlockButton.setStyleSheet("QPushButton { background-color: #9E9E9E; color: white; font-weight: bold; }")  # Gray for disabled
+            self.lockUnlockButton.setEnabled(False)
+            self.resetLandmarkButton.setEnabled(False)
+        
+        # Enable "Reset All" if any landmarks exist
+        any_landmarks_exist = False
+        
+        # Check point landmarks
+        if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
+            if self.logic.markups_node.GetNumberOfControlPoints() > 0:
+                any_landmarks_exist = True
+        
+        # Check spline
+        if hasattr(self.logic, 'spline_node') and self.logic.spline_node:
+            if self.logic.spline_node.GetNumberOfControlPoints() > 0:
+                any_landmarks_exist = True
+        
+        self.resetAllButton.setEnabled(any_landmarks_exist)
+
+    def onCaseListItemActivated(self, index):
+        """Handles double-click or Enter key on case list row"""
+        self.onSelectCase()
+
+    def onLockUnlockClicked(self):
+        """Toggle lock state of selected landmark"""
+        if not hasattr(self, 'selected_landmark'):
+            return
+        
+        landmark_name = self.selected_landmark
+        is_locked = self.logic.isLandmarkLocked(landmark_name)
+        
+        # Toggle lock state
+        self.logic.lockUnlockLandmark(landmark_name, lock=not is_locked)
+        
+        # Update UI
+        self.scheduleLandmarkRefresh(landmark_name)
+        
+        # Log activity
+        action = "Locked" if not is_locked else "Unlocked"
+        self._logActivity("landmark", landmark_name, action,
+                          "landmark_locked" if not is_locked else "landmark_unlocked", landmark=landmark_name)
+        
+        # Auto-select next landmark if checkbox is checked and landmark was just locked
+        if self.autoSelectCheckbox.isChecked() and not is_locked:  # landmark was just locked
+            self.selectNextLandmark(landmark_name)
+
+    def selectNextLandmark(self, current_landmark):
+        """Automatically select the next incomplete landmark and enable placement"""
+        landmark_order = self.logic.LANDMARK_TYPES
+        
+        # Find current landmark index
+        try:
+            current_index = landmark_order.index(current_landmark)
+        except ValueError:
+            return  # Current landmark not in list
+        
+        # Get progress status
+        progress = self.logic.getLandmarkProgress()
+        
+        # Look for next incomplete landmark starting from current position
+        for i in range(current_index + 1, len(landmark_order)):
+            landmark = landmark_order[i]
+            if progress.get(landmark, "✗") == "✗":  # Not completed
+                self._selectAndActivateLandmark(landmark)
+                return
+        
+        # If no incomplete landmark found after current, check from beginning
+        for i in range(current_index):
+            landmark = landmark_order[i]
+            if progress.get(landmark, "✗") == "✗":  # Not completed
+                self._selectAndActivateLandmark(landmark)
+                return
+
+    def _selectAndActivateLandmark(self, landmark_name):
+        """Helper method to find, select and activate a landmark with cursor - DELAYED VERSION"""
+        print(f"DEBUG: _selectAndActivateLandmark called with: {landmark_name}")
+        
+        try:
+            # Find and select in the list first
+            list_widget = self.landmarkProgressList
+            
+            for row in range(9):
+                try:
+                    item = list_widget.item(row)
+                    if item and item.text().startswith(landmark_name + ":"):
+                        print(f"DEBUG: Found matching item at row {row}")
+                        
+                        # Select in the list
+                        list_widget.setCurrentItem(item)
+                        
+                        # Store selected landmark
+                        self.selected_landmark = landmark_name
+                        self.logic.current_landmark = landmark_name
+                        
+                        # Update UI first
+                        self.scheduleLandmarkRefresh(landmark_name)
+                        
+                        # Use a timer to activate placement mode after a short delay
+                        print(f"DEBUG: Setting up delayed activation for: {landmark_name}")
+                        qt.QTimer.singleShot(100, lambda: self._delayedActivatePlacement(landmark_name))
+                        
+                        return
+                        
+                except Exception as e:
+                    print(f"DEBUG: Error at row {row}: {e}")
+                    break
+                    
+        except Exception as e:
+            print(f"DEBUG: Error in _selectAndActivateLandmark: {e}")
+
+    def _delayedActivatePlacement(self, landmark_name):
+        """Activate placement mode with a delay - DIRECT VERSION"""
+        print(f"DEBUG: _delayedActivatePlacement for: {landmark_name}")
+        
+        try:
+            # Simply call the existing enableLandmarkPlacement method
+            self.enableLandmarkPlacement(landmark_name)
+            
+            # Force interaction mode after a brief delay
+            qt.QTimer.singleShot(50, lambda: self._forceInteractionMode(landmark_name))
+            
+        except Exception as e:
+            print(f"DEBUG: Error in _delayedActivatePlacement: {e}")
+
+    def _forceInteractionMode(self, landmark_name):
+        """Force the interaction mode to Place"""
+        try:
+            interactionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLInteractionNodeSingleton")
+            if interactionNode:
+                interactionNode.SetCurrentInteractionMode(interactionNode.Place)
+                print(f"DEBUG: Forced interaction mode to Place for {landmark_name}")
+                
+                # Also ensure the correct node is selected
+                selectionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLSelectionNodeSingleton")
+                if selectionNode:
+                    if landmark_name == "Annulus Contour (Spline)" and hasattr(self.logic, 'spline_node'):
+                        selectionNode.SetActivePointListID(self.logic.spline_node.GetID())
+                    elif hasattr(self.logic, 'markups_node'):
+                        selectionNode.SetActivePointListID(self.logic.markups_node.GetID())
+                    print(f"DEBUG: Set active markup node for {landmark_name}")
+            
+        except Exception as e:
+            print(f"DEBUG: Error in _forceInteractionMode: {e}")
+
+    def onResetAll(self):
+        """Reset all landmarks with confirmation"""
+        # Show confirmation dialog
+        reply = qt.QMessageBox.question(None, "Confirm Reset All", 
+                                    "Are you sure you want to reset ALL landmarks?\n\nThis will permanently delete all placed landmarks and splines.",
+                                    qt.QMessageBox.Yes | qt.QMessageBox.No)
+        
+        if reply != qt.QMessageBox.Yes:
+            return  # User cancelled, don't reset
+        
+        # Reset all point landmarks
+        if hasattr(self.logic, 'markups_node') and self.logic.markups_node:
+            self.logic.markups_node.RemoveAllControlPoints()
+            print("DEBUG: Reset all point landmarks")
+        
+        # Reset spline
+        if hasattr(self.logic, 'spline_node') and self.logic.spline_node:
+            self.logic.spline_node.RemoveAllControlPoints()
+            print("DEBUG: Reset spline")
+        self.logic.has_unsaved_changes = True
+        self.logic.journalEdit("reset_all")
+        
+        # Clear selected landmark
+        if hasattr(self, 'selected_landmark'):
+            delattr(self, 'selected_landmark')
+        
+        # Update UI
+        self.scheduleLandmarkRefresh("")
+        
+        # Log the reset
+        self._logActivity("system", "all landmarks", "Reset all landmarks", "all_reset")
+        
+        print("All landmarks have been reset")
+
+    def onMarkCaseCompleteClicked(self):
+        """Handle mark case complete button click"""
+        if hasattr(self.logic, 'current_case_name'):
+            case_name = self.logic.current_case_name
+            reply = qt.QMessageBox.question(None, "Mark Complete", 
+                                        f"Mark case {case_name} as complete?",
+                                        qt.QMessageBox.Yes | qt.QMessageBox.No)
+            if reply == qt.QMessageBox.Yes:
+                if not self.logic.markCaseComplete():
+                    qt.QMessageBox.critical(None, "Not Completed", f"The lease on {case_name} was lost to another workstation.")
+                    return
+                self.caseListModel.updateCase(case_name, self.logic.progress_store.get(case_name))
+                qt.QMessageBox.information(None, "Complete", f"Case {case_name} marked as complete!")
+
+class CaseListModel(qt.QAbstractTableModel):
+    """Case navigator model over one progress snapshot.
+
+    Filtering and sorting are vectorized over the whole dataset, cells are only formatted
+    when the view asks for them and rows are exposed to the view in batches (fetchMore).
+    """
+
+    TEXT_COLUMNS = ['Case_ID', 'Status', 'Annotator', 'Date_Started', 'Date_Completed']
+    # Volume stats, sorted by value and filtered with e.g. "spacing<0.8" in the search box
+    NUMERIC_COLUMNS = ['Slices', 'Spacing_mm', 'Contrast_HU', 'Size_MB']
+    COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+    FETCH_BATCH = 500
+    NUMERIC_FILTER = re.compile(r'([a-z_]+)\s*(<=|>=|<|>|=)\s*(-?\d+(?:\.\d+)?)')
+    COMPARISONS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal, '=': np.isclose}
+
+    def __init__(self, parent=None):
+        qt.QAbstractTableModel.__init__(self, parent)
+        self.values = np.empty((0, len(self.COLUMNS)), dtype=object)
+        self.numeric = np.empty((0, len(self.NUMERIC_COLUMNS)), dtype=float)
+        self.search_text = pd.Series([], dtype=str)
+        self.pending_rank = np.empty(0, dtype=np.int64)
+        self.not_pending_rank = 0
+        self.position_by_case = {}
+        self.order = np.empty(0, dtype=np.int64)
+        self.loaded_rows = 0
+        self.status_filter = "pending"
+        self.text_filter = ""
+        self.numeric_filters = []  # (numeric column, comparison, value)
+        self.sort_column = None
+        self.sort_order = qt.Qt.AscendingOrder
+
+    def setProgress(self, progress_df, pending_cases):
+        """Replace the snapshot; pending_cases gives the default work order (see getNextCases)"""
+        self.beginResetModel()
+        self.values = progress_df.reindex(columns=self.COLUMNS).fillna('').astype(str).to_numpy(dtype=object)
+        self.numeric = progress_df.reindex(columns=self.NUMERIC_COLUMNS).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        first_numeric = len(self.TEXT_COLUMNS)
+        for column in range(len(self.NUMERIC_COLUMNS)):
+            self.values[:, first_numeric + column] = ['' if np.isnan(value) else f"{value:g}" for value in self.numeric[:, column]]
+        self.position_by_case = {case: position for position, case in enumerate(self.values[:, 0])}
+        # Cases that are not pending go after the pending ones, in their progress order
+        self.not_pending_rank = len(pending_cases)
+        self.pending_rank = np.full(len(self.values), self.not_pending_rank, dtype=np.int64)
+        for rank, case in enumerate(pending_cases):
+            position = self.position_by_case.get(case)
+            if position is not None:
+                self.pending_rank[position] = rank
+        self.search_text = pd.Series(["  ".join(row[:len(self.TEXT_COLUMNS)]).lower() for row in self.values], dtype=str)
+        self._applyOrder()
+        self.endResetModel()
+
+    def setFilter(self, status_filter=None, text_filter=None):
+        if status_filter is not None:
+            self.status_filter = status_filter
+        if text_filter is not None:
+            self.text_filter, self.numeric_filters = self._parseFilter(text_filter.strip().lower())
+        self.beginResetModel()
+        self._applyOrder()
+        self.endResetModel()
+
+    def _parseFilter(self, text):
+        """Split "thin spacing<0.8" into the free text part and numeric column conditions"""
+        numeric_filters = []
+        for field, comparison, value in self.NUMERIC_FILTER.findall(text):
+            columns = [column for column, name in enumerate(self.NUMERIC_COLUMNS) if name.lower().startswith(field)]
+            if columns:
+                numeric_filters.append((columns[0], self.COMPARISONS[comparison], float(value)))
+        return self.NUMERIC_FILTER.sub('', text).strip(), numeric_filters
+
+    def sort(self, column, order=qt.Qt.AscendingOrder):
+        # column -1 (no sort indicator) restores the work order
+        self.sort_column = column if column >= 0 else None
+        self.sort_order = order
+        self.beginResetModel()
+        self._applyOrder()
+        self.endResetModel()
+
+    def _applyOrder(self):
+        self.order = self._sortPositions(np.flatnonzero(self._filterMask()))
+        self.loaded_rows = min(self.FETCH_BATCH, len(self.order))
+
+    def _filterMask(self):
+        """Cases matching the status, text and numeric filters"""
+        count = len(self.values)
+        mask = np.ones(count, dtype=bool)
+        if self.status_filter == "pending":
+            mask &= self.pending_rank < self.not_pending_rank
+        elif self.status_filter != "all":
+            mask &= self.values[:, 1] == self.status_filter
+        if self.text_filter:
+            mask &= self.search_text.str.contains(self.text_filter, regex=False).to_numpy()
+        for column, comparison, value in self.numeric_filters:
+            # Cases without stats (NaN) never match a condition
+            with np.errstate(invalid='ignore'):
+                mask &= comparison(self.numeric[:, column], value)
+        return mask
+
+    def _sortPositions(self, positions):
+        if self.sort_column is None:
+            keys = self.pending_rank[positions]
+        elif self.sort_column >= len(self.TEXT_COLUMNS):
+            keys = self.numeric[positions, self.sort_column - len(self.TEXT_COLUMNS)]
+            # Negated rather than reversed, so cases without stats stay at the bottom
+            if self.sort_order == qt.Qt.DescendingOrder:
+                keys = -keys
+        else:
+            keys = self.values[positions, self.sort_column]
+        sorted_positions = positions[np.argsort(keys, kind='stable')]
+        if (self.sort_column is not None and self.sort_column < len(self.TEXT_COLUMNS)
+                and self.sort_order == qt.Qt.DescendingOrder):
+            sorted_positions = sorted_positions[::-1]
+        return sorted_positions
+
+    def rowCount(self, parent=qt.QModelIndex()):
+        return 0 if parent.isValid() else self.loaded_rows
+
+    def columnCount(self, parent=qt.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=qt.QModelIndex()):
+        return not parent.isValid() and self.loaded_rows < len(self.order)
+
+    def fetchMore(self, parent=qt.QModelIndex()):
+        count = min(self.FETCH_BATCH, len(self.order) - self.loaded_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(qt.QModelIndex(), self.loaded_rows, self.loaded_rows + count - 1)
+        self.loaded_rows += count
+        self.endInsertRows()
+
+    def data(self, index, role=qt.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded_rows:
+            return None
+        row = self.values[self.order[index.row()]]
+        if role == qt.Qt.DisplayRole:
+            value = row[index.column()]
+            return value.replace('_', ' ') if index.column() == 1 else value
+        if role == qt.Qt.BackgroundRole and row[1] == 'in_progress':
+            return qt.QColor(255, 235, 59, 60)  # Light yellow for cases in progress
+        return None
+
+    def headerData(self, section, orientation, role=qt.Qt.DisplayRole):
+        if role == qt.Qt.DisplayRole and orientation == qt.Qt.Horizontal:
+            return self.COLUMNS[section].replace('_', ' ')
+        return None
+
+    def caseIdAt(self, row):
+        return self.values[self.order[row], 0]
+
+    def updateCase(self, case_id, progress_row):
+        """Refresh one case in place: repaint its row, or take it out of / put it into the filtered list"""
+        position = self.position_by_case.get(case_id)
+        if position is None or not progress_row:
+            return
+        for column, name in enumerate(self.TEXT_COLUMNS):
+            value = progress_row.get(name)
+            self.values[position, column] = '' if value is None else str(value)
+        self.search_text.iat[position] = "  ".join(self.values[position, :len(self.TEXT_COLUMNS)]).lower()
+        pending = self.values[position, 1] in ('in_progress', 'not_started')
+        if not pending:
+            self.pending_rank[position] = self.not_pending_rank
+        elif self.pending_rank[position] >= self.not_pending_rank:
+            # Reopened case: top of the work order, like the case being worked on
+            self.pending_rank[position] = min(int(self.pending_rank.min()), 0) - 1
+
+        rows = np.flatnonzero(self.order == position)
+        matches = bool(self._filterMask()[position])
+        if len(rows) and matches:
+            if rows[0] < self.loaded_rows:
+                self.dataChanged(self.index(int(rows[0]), 0), self.index(int(rows[0]), len(self.COLUMNS) - 1))
+        elif len(rows):
+            row = int(rows[0])
+            if row < self.loaded_rows:
+                self.beginRemoveRows(qt.QModelIndex(), row, row)
+                self.order = np.delete(self.order, row)
+                self.loaded_rows -= 1
+                self.endRemoveRows()
+            else:
+                self.order = np.delete(self.order, row)
+        elif matches:
+            # Where a full re-sort would put it; the rows on display keep their places
+            row = int(np.flatnonzero(self._sortPositions(np.sort(np.append(self.order, position))) == position)[0])
+            order = np.insert(self.order, row, position)
+            if row < self.loaded_rows:
+                self.beginInsertRows(qt.QModelIndex(), row, row)
+                self.order = order
+                self.loaded_rows += 1
+                self.endInsertRows()
+            else:
+                self.order = order
+
+class CardiacAnnotatorLogic(ScriptedLoadableModuleLogic):
+
+    # Edits bump change_generation; a finished save only marks the generation it snapshotted as saved
+    change_generation = 0
+    saved_generation = 0
+
+    # Data-side work lives in CardiacAnnotatorLib (no Slicer/Qt); this class adapts it to the scene
+    LANDMARK_TYPES = LANDMARK_TYPES
+
+    def initializeProgressTracking(self, main_folder):
+        # Hidden cases belong to the previous dataset
+        if getattr(self, 'scene_cache', None) and getattr(self, 'main_folder', None) != main_folder:
+            self.scene_cache.clear()
+        self.main_folder = main_folder
+        
+        # Progress store, leases and case index of the dataset folder
+        if getattr(self, 'dataset', None):
+            self.dataset.close()
+        settings = qt.QSettings()
+        # Rollback journal unless this station explicitly keeps the dataset on a local disk
+        local_wal = str(settings.value("CardiacAnnotator/localDatasetWAL", "false")).lower() == "true"
+        lease_ttl = int(settings.value("CardiacAnnotator/leaseTimeoutSeconds", 120))
+        self.dataset = AnnotationDataset(main_folder, local_wal=local_wal, lease_ttl=lease_ttl)
+        self.csv_path = self.dataset.csv_path
+        self.progress_store = self.dataset.progress_store
+        self.lease_manager = self.dataset.lease_manager
+        self.case_index = self.dataset.case_index
+        # Heartbeats run on a thread, a lost lease is picked up here on the main thread
+        if not getattr(self, 'lease_poll_timer', None):
+            self.lease_poll_timer = qt.QTimer()
+            self.lease_poll_timer.setInterval(5000)
+            self.lease_poll_timer.timeout.connect(self.pollLeases)
+        self.lease_poll_timer.start()
+
+        # Pick up cases added to the dataset since the last run
+        self.dataset.refresh()
+        
+        # Start decoding the upcoming cases in the background
+        self.setupVolumeCache()
+        self.setupPrefetcher()
+        self.setupPhaseCache()
+        self.schedulePrefetch()
+        # Scan metadata and intensity percentiles of the cases that have none yet
+        self.startVolumeStats()
+
+        # Find next case to work on
+        next_case = self.findNextCase()
+        return next_case if next_case else None
+
+    def holdsCaseLease(self, case_name):
+        """False once another workstation took the case over (no dataset, no leases: always True)"""
+        lease_manager = getattr(self, 'lease_manager', None)
+        return lease_manager is None or lease_manager.holds(case_name)
+
+    def pollLeases(self):
+        """Tell the widget when the lease on the open case was lost, saving is blocked from then on"""
+        lost = self.lease_manager.take_lost()
+        case_name = getattr(self, 'current_case_name', None)
+        if case_name in lost and hasattr(self, 'widget_reference'):
+            self.widget_reference.onCaseLeaseLost(case_name, self.lease_manager.holder(case_name))
+
+    @property
+    def progress_df(self):
+        """Snapshot of the progress store as a DataFrame (read-only view)"""
+        if not getattr(self, 'progress_store', None):
+            raise AttributeError('progress_df')
+        return self.progress_store.to_dataframe()
+
+    def setupPrefetcher(self):
+        """(Re)create the background prefetcher using the count/budget stored in settings"""
+        if getattr(self, 'prefetcher', None):
+            self.prefetcher.shutdown()
+        settings = qt.QSettings()
+        max_cases = int(settings.value("CardiacAnnotator/prefetchCount", 2))
+        memory_budget_mb = int(settings.value("CardiacAnnotator/prefetchMemoryBudgetMB", 2048))
+        cache_dir = os.path.join(tempfile.gettempdir(), "CardiacAnnotatorPrefetch")
+        self.prefetcher = CasePrefetcher(cache_dir, max_cases=max_cases, memory_budget_mb=memory_budget_mb)
+
+    def setupPhaseCache(self):
+        """LRU of decoded cardiac phases, used when all phases are loaded (settings)"""
+        if getattr(self, 'phase_cache', None):
+            self.phase_cache.shutdown()
+        settings = qt.QSettings()
+        self.load_all_phases = settings.value("CardiacAnnotator/loadAllPhases", "false") in (True, "true")
+        memory_budget_mb = int(settings.value("CardiacAnnotator/phaseCacheBudgetMB", 3072))
+        self.phase_cache = PhaseCache(memory_budget_mb=memory_budget_mb)
+
+    def setupVolumeCache(self):
+        """Uncompressed volume cache (directory/budget from settings), filled by transcodeVolumes"""
+        if getattr(self, 'volume_cache', None):
+            self.volume_cache.save()
+        settings = qt.QSettings()
+        cache_dir = settings.value("CardiacAnnotator/volumeCacheDir", "") or default_cache_dir()
+        budget_gb = float(settings.value("CardiacAnnotator/volumeCacheBudgetGB", 20))
+        self.volume_cache = VolumeCache(cache_dir, budget_gb=budget_gb)
+        # Aortic root crops live next to the full volumes, outside their byte budget (a few MB each)
+        self.crop_cache = CropCache(os.path.join(cache_dir, "crops"))
+        self.crop_volumes = settings.value("CardiacAnnotator/cropVolumes", "false") in (True, "true")
+        self.crop_padding_mm = float(settings.value("CardiacAnnotator/cropPaddingMM", 40))
+        # Downsampled levels to show while the full volume loads, built on a worker thread
+        if getattr(self, 'pyramid_cache', None):
+            self.pyramid_cache.shutdown()
+        pyramid_budget_gb = float(settings.value("CardiacAnnotator/pyramidCacheBudgetGB", 2))
+        self.pyramid_cache = PyramidCache(os.path.join(cache_dir, "pyramids"), budget_gb=pyramid_budget_gb)
+        self.pyramid_preview = settings.value("CardiacAnnotator/pyramidPreview", "true") in (True, "true")
+
+    def transcodeVolumes(self, workers=None, verify=False):
+        """Write uncompressed copies of the dataset volumes into the volume cache (process pool)"""
+        with self.createProcessPool(workers) as executor:
+            return transcode_dataset(self.dataset, self.volume_cache, verify=verify, executor=executor)
+
+    def schedulePrefetch(self):
+        """Point the prefetcher at the pending cases after the current one"""
+        if not getattr(self, 'prefetcher', None):
+            return
+        current_case = getattr(self, 'current_case_name', None)
+        scene_cache = getattr(self, 'scene_cache', None)
+        volume_cache = getattr(self, 'volume_cache', None)
+        # Cases already in the volume cache (or opened as crops) need no decompression
+        upcoming = [case for case in self.getNextCases()
+                    if case != current_case and not (scene_cache and case in scene_cache)
+                    and not (volume_cache and volume_cache.is_current(self.getCaseVolumePath(case)))
+                    and not (getattr(self, 'crop_volumes', False) and self.getCaseCropPath(case))]
+        self.prefetcher.set_queue([(case, self.getCaseVolumePath(case)) for case in upcoming])
+        self.schedulePyramids()
+
+    def createProcessPool(self, workers=None):
+        """Process pool that is safe to start from the GUI: spawned PythonSlicer interpreters, not forks of Slicer"""
+        context = multiprocessing.get_context("spawn")
+        python_slicer = shutil.which("PythonSlicer")
+        if python_slicer:
+            context.set_executable(python_slicer)
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def startVolumeStats(self):
+        """Queue one stats job per case missing them on the stats process pool, pollVolumeStats stores them"""
+        if not getattr(self, 'stats_pool', None):
+            workers = int(qt.QSettings().value("CardiacAnnotator/statsWorkers", 2))
+            self.stats_pool = self.createProcessPool(workers)
+            self.stats_futures = {}  # future -> (case_index, case)
+            self.stats_poll_timer = qt.QTimer()
+            self.stats_poll_timer.setInterval(1000)
+            self.stats_poll_timer.timeout.connect(self.pollVolumeStats)
+        # Re-opening a dataset must not queue cases that are still in flight
+        queued = {(case_index.index_path, case) for case_index, case in self.stats_futures.values()}
+        jobs = [job for job in stats_jobs(self.dataset, getattr(self, 'volume_cache', None))
+                if (self.case_index.index_path, job[0]) not in queued]
+        if not jobs:
+            return
+        print(f"Computing volume stats of {len(jobs)} cases in the background")
+        for job in jobs:
+            # Results go to the index they were computed for, even if another dataset was opened since
+            self.stats_futures[self.stats_pool.submit(volume_stats, job)] = (self.case_index, job[0])
+        self.stats_poll_timer.start()
+
+    def pollVolumeStats(self):
+        """Store the stats of the cases finished since the last poll"""
+        results = {}  # index path -> (case_index, [results])
+        for future in [future for future in self.stats_futures if future.done()]:
+            case_index, case = self.stats_futures.pop(future)
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Volume stats of {case} failed: {e}")
+                continue
+            if result:
+                results.setdefault(case_index.index_path, (case_index, []))[1].append(result)
+        for case_index, case_results in results.values():
+            store_stats(case_index, case_results)
+        if not self.stats_futures:
+            self.stats_poll_timer.stop()
+        # The case list follows once the current dataset has no stats left in flight
+        current_pending = any(case_index is self.case_index for case_index, _ in self.stats_futures.values())
+        if any(case_index is self.case_index for case_index, _ in results.values()) and not current_pending:
+            print("Volume stats of the dataset are up to date")
+            if hasattr(self, 'widget_reference'):
+                self.widget_reference.updateCaseList(self.getNextCases())
+
+    def getCaseWindowLevel(self, case_name):
+        """(window, level) from the case intensity percentiles, the fixed preset until they are known"""
+        entry = self.case_index.cases.get(case_name, {}) if getattr(self, 'case_index', None) else {}
+        return window_level(entry.get('stats'))
+
+    def getCaseListFields(self):
+        return case_list_fields(self.case_index)
+
+    def schedulePyramids(self):
+        """Build the missing pyramids of the current and next pending cases in the background"""
+        if not getattr(self, 'pyramid_cache', None) or not getattr(self, 'pyramid_preview', False):
+            return
+        current_case = getattr(self, 'current_case_name', None)
+        cases = ([current_case] if current_case else []) + [case for case in self.getNextCases()[:5] if case != current_case]
+        jobs = []
+        for case in cases:
+            source_path = self.getCaseVolumePath(case)
+            if not os.path.exists(source_path):
+                continue
+            read_path = self.volume_cache.lookup(source_path) if getattr(self, 'volume_cache', None) else None
+            jobs.append((case, source_path, read_path or source_path))
+        self.pyramid_cache.submit(jobs)
+
+    def getCaseVolumePath(self, case_name):
+        return self.dataset.volume_path(case_name)
+    
+    def loadOrCreateProgressCSV(self, main_folder):
+        # Load existing CSV or create new one
+        pass
+
+    def findNextCase(self):
+        # Find first in_progress or not_started case
+        pass
+
+    def updateCaseStatus(self, case_id, status):
+        # Update case status in CSV
+        pass
+    
+    def findAllTAVICases(self, main_folder):
+        """Return the sorted TAVI cases with a 40pc volume, using the persistent case index"""
+        if getattr(self, 'dataset', None) is None or self.main_folder != main_folder:
+            self.initializeProgressTracking(main_folder)
+        return self.case_index.refresh()
+
+    def startActivityTimer(self, activity_type, activity_name):
+        setattr(self, f'current_{activity_type}', activity_name)
+        setattr(self, f'{activity_type}_start_time', time.time())
+
+    def stopActivityTimer(self, activity_type):
+        if hasattr(self, f'{activity_type}_start_time'):
+            elapsed = time.time() - getattr(self, f'{activity_type}_start_time')
+            delattr(self, f'{activity_type}_start_time')
+
+    def getNextCases(self):
+        if not getattr(self, 'dataset', None):
+            return []
+        return self.dataset.next_cases()
+
+    def loadCase(self, case_name, discard_current=False):
+        """Switch to case_name. Unsaved edits of the current case are saved unless discard_current.
+
+        Returns False if another workstation holds the case (nothing is changed then).
+        """
+        # Reserve the case so no other workstation annotates it at the same time
+        if getattr(self, 'lease_manager', None) and not self.lease_manager.acquire(case_name):
+            return False
+
+        # The edited nodes must not come back from the cache when discarded
+        if hasattr(self, 'current_case_name') and self.has_unsaved_changes and not discard_current:
+            self.saveLandmarks()
+        previous_case = getattr(self, 'current_case_name', None)
+        if previous_case and previous_case != case_name and getattr(self, 'lease_manager', None):
+            self.lease_manager.release(previous_case)
+
+        # The outgoing journal is compacted by its queued saves, let them finish first
+        self.waitForSaves()
+        if getattr(self, 'landmark_journal', None):
+            if discard_current:
+                self.landmark_journal.discard()
+            self.landmark_journal.close()
+        self.landmark_journal = LandmarkJournal(self.getLandmarksPath(case_name))
+
+        if not getattr(self, 'scene_cache', None):
+            self.setupSceneCache()
+            # First case of the session starts from an empty scene
+            slicer.mrmlScene.Clear(0)
+        else:
+            # Keep the outgoing case hidden in the scene instead of clearing it
+            self.stashCurrentCase(discard=discard_current)
+
+        # Close previous log if exists
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.close_case("switched")
+        
+        # Create new LogManager for this case
+        case_folder = os.path.dirname(self.dataset.log_path(case_name))
+        self.current_log_manager = LogManager(case_folder, case_name)
+        self.current_log_manager.open_case(case_name)
+
+        # view setup
+        slicer.app.layoutManager().setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutFourUpView)
+        cached = self.scene_cache.pop(case_name)
+        if cached and cached.get('landmarks_mtime') != self.getLandmarksMtime(case_name):
+            # Saved by another workstation since we hid it - the cached nodes are stale
+            print(f"Landmarks of {case_name} changed on disk, reloading")
+            self.scene_cache.release(cached)
+            cached = None
+        if cached:
+            # Recently viewed case - its nodes are still in the scene
+            print(f"Restored {case_name} from scene cache")
+            self.volume_node = cached['volume']
+            self.volume_is_cropped = cached.get('cropped', False)
+            self.current_phase = cached.get('phase', BASE_PHASE)
+            self.markups_node = cached['markups']
+            self.spline_node = cached['spline']
+            self.scene_cache.show(cached)
+        else:
+            self.loadCaseNodes(case_name)
+            self.current_phase = BASE_PHASE
+        self.updateCaseStatus(case_name, "in_progress")
+
+        self.current_case_name = case_name
+        # Other cardiac phases are only decoded when shown
+        self.case_phases = self.getCasePhases(case_name)
+        self.pending_phase = None
+        self.has_unsaved_changes = False # changed to True when a change is made
+        if self.landmark_journal.count:
+            # Edits recovered from the journal are not in the landmarks file yet
+            self.has_unsaved_changes = True
+        self.incomplete_items = self.checkForIncompleteWork() # in case of a previous abrupt exit
+        self.last_measurements = None
+
+        # Queue decoding of the following cases while this one is annotated
+        self.schedulePrefetch()
+
+        # Report what the scene holds now that the case is in
+        self.last_memory_report = self.getSceneMemoryUsage()
+        print(self.formatMemoryReport(self.last_memory_report))
+        return True
+
+    def loadCaseNodes(self, case_name):
+        """Load the case volume and its landmarks/spline from disk"""
+        case_path = self.getCaseVolumePath(case_name)
+        volume_name = os.path.basename(case_path)[:-len('.nii.gz')]
+        # Aortic root crop if enabled, else the uncompressed copy from the volume cache,
+        # else the one the prefetcher decoded, else the .nii.gz
+        crop_path = self.getCaseCropPath(case_name) if getattr(self, 'crop_volumes', False) else None
+        cached_path = None
+        if not crop_path and getattr(self, 'volume_cache', None):
+            cached_path = self.volume_cache.lookup(case_path)
+        prefetched_path = None
+        prefetch_in_flight = False
+        self.volume_is_cropped = bool(crop_path)
+        preview_path = None
+        if not crop_path and getattr(self, 'pyramid_preview', False) and getattr(self, 'pyramid_cache', None):
+            preview_path = self.pyramid_cache.lookup(case_name, case_path)
+        if crop_path:
+            print(f"Loading aortic root crop of {case_name}")
+            case_path = crop_path
+        elif cached_path:
+            print(f"Volume cache hit for {case_name}")
+            case_path = cached_path
+        elif getattr(self, 'prefetcher', None):
+            # With a preview to show, an unfinished decode is waited for by the full resolution read, not here
+            prefetched_path = self.prefetcher.take(case_name, wait=not preview_path)
+            prefetch_in_flight = not prefetched_path and bool(preview_path) and self.prefetcher.has_case(case_name)
+            if prefetched_path:
+                print(f"Prefetch hit for {case_name}")
+                case_path = prefetched_path
+
+        # single volume load and window/level (cache files are named by hash, keep the case name)
+        if preview_path:
+            # Coarse level now, the full volume is read on a worker thread and swapped in place
+            print(f"Showing pyramid preview of {case_name} while the full volume loads")
+            self.volume_node = self.loadCaseVolume(preview_path, volume_name, self.getCaseWindowLevel(case_name))
+            self.startFullResolutionLoad(case_name, case_path, prefetched=bool(prefetched_path) or prefetch_in_flight)
+        else:
+            self.volume_node = self.loadCaseVolume(case_path, volume_name, self.getCaseWindowLevel(case_name))
+
+        # The decoded copy is in the scene now, free its space for the next cases
+        if prefetched_path and not preview_path:
+            self.prefetcher.discard(case_name)
+
+        # Read landmarks and spline back from the combined file into their own nodes
+        # (a save of this case may still be queued)
+        self.waitForSaves()
+        node_name = f"Landmarks_{case_name}"
+        landmarks_path = self.getLandmarksPath(case_name)
+        document = MarkupsSerializer.read(landmarks_path) if os.path.exists(landmarks_path) else {}
+
+        self.markups_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        self.markups_node.SetName(node_name)
+        points_markup = MarkupsSerializer.find_markup(document, "Fiducial")
+        if points_markup:
+            MarkupsSerializer.apply(points_markup, self.markups_node)
+            print(f"Loaded existing point landmarks from: {landmarks_path}")
+        else:
+            print(f"Created new landmarks node: {node_name}")
+
+        spline_markup = MarkupsSerializer.find_markup(document, "ClosedCurve")
+        if spline_markup:
+            self.spline_node = self.createSplineNode()
+            MarkupsSerializer.apply(spline_markup, self.spline_node)
+            print(f"Loaded spline with {self.spline_node.GetNumberOfControlPoints()} points")
+        else:
+            self.spline_node = None
+            print("No existing spline found")
+
+        # Edits made after the last save (previous session ended abruptly)
+        if getattr(self, 'landmark_journal', None) and self.landmark_journal.count:
+            replayed, self.spline_node = self.landmark_journal.replay(self.markups_node, self.spline_node, self.createSplineNode)
+            print(f"Recovered {replayed} unsaved edits from {self.landmark_journal.path}")
+            if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                self.current_log_manager.write_event("journal_replayed", f"Recovered {replayed} unsaved edits", records=replayed)
+
+    def loadCaseVolume(self, path, volume_name, window_level=(2000, 500)):
+        """Load a volume file under the case volume name with the annotation window/level"""
+        volumeNode = slicer.util.loadVolume(path, properties={'name': volume_name})
+        displayNode = volumeNode.GetDisplayNode()
+        displayNode.SetAutoWindowLevel(False)  # Turn off auto mode first
+        displayNode.SetWindow(window_level[0])
+        displayNode.SetLevel(window_level[1])
+        return volumeNode
+
+    def startFullResolutionLoad(self, case_name, path, prefetched=False):
+        """Read the full volume of the case on the volume thread, pollFullResolution swaps it into the preview node"""
+        if not getattr(self, 'volume_executor', None):
+            self.volume_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="CardiacAnnotatorVolume")
+            self.full_resolution_jobs = []
+            self.volume_poll_timer = qt.QTimer()
+            self.volume_poll_timer.setInterval(100)
+            self.volume_poll_timer.timeout.connect(self.pollFullResolution)
+        future = self.volume_executor.submit(self.readFullResolution, case_name, path, prefetched)
+        self.full_resolution_jobs.append({'future': future, 'node': self.volume_node,
+                                          'case_name': case_name, 'path': path, 'prefetched': prefetched,
+                                          'started': time.time()})
+        self.volume_poll_timer.start()
+
+    def readFullResolution(self, case_name, path, prefetched):
+        """Volume thread: voxels of the case, from the prefetcher's copy once its decode is done if it has one"""
+        if prefetched:
+            path = self.prefetcher.take(case_name) or path
+        return read_nifti(path)
+
+    def isVolumePreview(self):
+        """True while the displayed volume is still a pyramid level"""
+        volume_node = getattr(self, 'volume_node', None)
+        return bool(volume_node) and any(job['node'] is volume_node for job in getattr(self, 'full_resolution_jobs', []))
+
+    def pollFullResolution(self):
+        """Main thread: put finished full resolution reads into their volume nodes"""
+        for job in [job for job in self.full_resolution_jobs if job['future'].done()]:
+            self.full_resolution_jobs.remove(job)
+            node = job['node']
+            if job['prefetched']:
+                self.prefetcher.discard(job['case_name'])
+            # Node removed meanwhile (case discarded, switched to the crop)
+            if not node.GetScene():
+                continue
+            try:
+                array, ijk_to_ras = job['future'].result()
+            except Exception as e:
+                print(f"Could not read {job['path']} ({e}), loading it with Slicer")
+                if node is getattr(self, 'volume_node', None):
+                    self.replaceCaseVolume(job['path'])
+                continue
+            # Same node, new voxels and geometry: markups, display and views are untouched
+            slicer.util.updateVolumeFromArray(node, array)
+            node.SetIJKToRASMatrix(slicer.util.vtkMatrixFromArray(ijk_to_ras))
+            print(f"Full resolution volume of {job['case_name']} in place after {time.time() - job['started']:.1f} s")
+            # Stashed while on its preview: the scene cache counted the preview size
+            cached = self.scene_cache.entries.get(job['case_name']) if getattr(self, 'scene_cache', None) else None
+            if cached and cached.get('volume') is node:
+                self.scene_cache.remeasure(job['case_name'])
+            if node is getattr(self, 'volume_node', None):
+                if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                    self.current_log_manager.write_event("full_resolution_loaded", "Full resolution volume loaded",
+                                                         seconds=round(time.time() - job['started'], 2))
+                if hasattr(self, 'widget_reference'):
+                    self.widget_reference.onFullResolutionLoaded()
+        if not self.full_resolution_jobs:
+            self.volume_poll_timer.stop()
+
+    def replaceCaseVolume(self, path, cropped=False):
+        """Load path as the volume of the current case, replacing the node on display"""
+        case_path = self.getCaseVolumePath(self.current_case_name)
+        volume_name = os.path.basename(case_path)[:-len('.nii.gz')]
+        old_node = getattr(self, 'volume_node', None)
+        self.volume_node = self.loadCaseVolume(path, volume_name, self.getCaseWindowLevel(self.current_case_name))
+        self.volume_is_cropped = cropped
+        self.current_phase = BASE_PHASE
+        self.pending_phase = None
+        if old_node:
+            slicer.mrmlScene.RemoveNode(old_node)
+        slicer.util.setSliceViewerLayers(background=self.volume_node, fit=True)
+
+    def getCasePhases(self, case_name):
+        """Sorted phase percents of the case when all phases are loaded, [] for the 40pc volume alone"""
+        if not getattr(self, 'load_all_phases', False):
+            return []
+        phases = list(case_phases(case_name, self.case_index.cases.get(case_name, {}).get('volumes', [])))
+        return phases if len(phases) > 1 and BASE_PHASE in phases else []
+
+    def getPhasePath(self, case_name, phase):
+        if phase == BASE_PHASE:
+            source_path = self.getCaseVolumePath(case_name)
+            return (self.volume_cache.lookup(source_path) if getattr(self, 'volume_cache', None) else None) or source_path
+        return phase_path(self.main_folder, case_name, phase)
+
+    def canBrowsePhases(self):
+        """Phases replace the voxels of the full volume node, not of a crop or a pyramid level"""
+        return bool(getattr(self, 'case_phases', None)) and not getattr(self, 'volume_is_cropped', False) and not self.isVolumePreview()
+
+    def showPhase(self, phase):
+        """Show another cardiac phase of the current case in the same volume node
+
+        Returns True if it is on display now, False if it is being decoded (pollPhases shows it
+        once ready, unless another phase was asked for meanwhile).
+        """
+        if not self.canBrowsePhases() or phase not in self.case_phases:
+            return False
+        self.pending_phase = None
+        if phase == self.current_phase:
+            return True
+        case_name = self.current_case_name
+        # Keep the phase on display so coming back to it needs no decoding
+        if (case_name, self.current_phase) not in self.phase_cache:
+            ijk_to_ras = vtk.vtkMatrix4x4()
+            self.volume_node.GetIJKToRASMatrix(ijk_to_ras)
+            self.phase_cache.put((case_name, self.current_phase), slicer.util.arrayFromVolume(self.volume_node).copy(),
+                                 slicer.util.arrayFromVTKMatrix(ijk_to_ras))
+        entry = self.phase_cache.get((case_name, phase))
+        if entry is None:
+            self.phase_future = self.phase_cache.request((case_name, phase), self.getPhasePath(case_name, phase))
+            self.pending_phase = phase
+            if not getattr(self, 'phase_poll_timer', None):
+                self.phase_poll_timer = qt.QTimer()
+                self.phase_poll_timer.setInterval(100)
+                self.phase_poll_timer.timeout.connect(self.pollPhases)
+            self.phase_poll_timer.start()
+        else:
+            self.applyPhase(phase, entry)
+        self.requestNeighbourPhases(phase)
+        return self.pending_phase is None
+
+    def requestNeighbourPhases(self, phase):
+        """Decode the phases on either side ahead of time, scrubbing usually goes there next"""
+        position = self.case_phases.index(phase)
+        for neighbour in self.case_phases[max(position - 1, 0):position + 2]:
+            if neighbour != phase:
+                self.phase_cache.request((self.current_case_name, neighbour), self.getPhasePath(self.current_case_name, neighbour))
+
+    def pollPhases(self):
+        phase = getattr(self, 'pending_phase', None)
+        if phase is None or not self.canBrowsePhases():
+            self.phase_poll_timer.stop()
+            return
+        entry = self.phase_cache.get((self.current_case_name, phase))
+        if entry is not None:
+            self.phase_poll_timer.stop()
+            self.applyPhase(phase, entry)
+        elif self.phase_future is None or self.phase_future.done():
+            # Decoded and evicted right away, or failed
+            error = self.phase_future.exception() if self.phase_future and not self.phase_future.cancelled() else None
+            print(f"Could not load phase {phase}% of {self.current_case_name}: {error}")
+            self.phase_poll_timer.stop()
+            self.pending_phase = None
+            if hasattr(self, 'widget_reference'):
+                self.widget_reference.onPhaseShown(self.current_phase)
+
+    def applyPhase(self, phase, entry):
+        """Put a decoded phase into the case volume node; markups and display stay as they are"""
+        array, ijk_to_ras = entry
+        slicer.util.updateVolumeFromArray(self.volume_node, array)
+        self.volume_node.SetIJKToRASMatrix(slicer.util.vtkMatrixFromArray(ijk_to_ras))
+        self.current_phase = phase
+        self.pending_phase = None
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.write_event("phase_shown", f"Showing phase {phase}%", phase=phase)
+        if hasattr(self, 'widget_reference'):
+            self.widget_reference.onPhaseShown(phase)
+
+    def getCaseCropPath(self, case_name):
+        if not getattr(self, 'crop_cache', None):
+            return None
+        return self.crop_cache.lookup(case_name, self.getCaseVolumePath(case_name))
+
+    def getPlacedPoints(self):
+        """RAS positions of every landmark and spline control point in the scene"""
+        arrays = [slicer.util.arrayFromMarkupsControlPoints(node)
+                  for node in (getattr(self, 'markups_node', None), getattr(self, 'spline_node', None))
+                  if node and node.GetNumberOfControlPoints()]
+        return np.concatenate(arrays) if arrays else np.zeros((0, 3))
+
+    def updateCaseCrop(self):
+        """Cut the padded landmark region out of the full volume into the crop cache (written on the save thread)
+
+        Only runs on the full resolution volume, and only if the landmarks moved out of the existing crop.
+        """
+        volume_node = getattr(self, 'volume_node', None)
+        if not getattr(self, 'crop_cache', None) or not volume_node or getattr(self, 'volume_is_cropped', False):
+            return None
+        if self.isVolumePreview() or getattr(self, 'current_phase', BASE_PHASE) != BASE_PHASE:
+            # Only from the full annotated phase, a later save will do it
+            return None
+        case_name = self.current_case_name
+        source_path = self.getCaseVolumePath(case_name)
+        array = slicer.util.arrayFromVolume(volume_node)
+        ijk_to_ras = vtk.vtkMatrix4x4()
+        volume_node.GetIJKToRASMatrix(ijk_to_ras)
+        ras_to_ijk = vtk.vtkMatrix4x4()
+        volume_node.GetRASToIJKMatrix(ras_to_ijk)
+        bounds = landmark_roi(self.getPlacedPoints(), slicer.util.arrayFromVTKMatrix(ras_to_ijk), array.shape,
+                              padding_mm=self.crop_padding_mm)
+        if not bounds or self.crop_cache.covers(case_name, source_path, bounds):
+            return None
+        # Copy the sub-array now, the volume node may be gone by the time the save thread gets to it
+        cropped, crop_ijk_to_ras = crop_array(array, slicer.util.arrayFromVTKMatrix(ijk_to_ras), bounds)
+        print(f"Cropping {case_name} to {cropped.shape[::-1]} voxels ({cropped.nbytes / (1024 * 1024):.0f} MB)")
+        future = self.save_executor.submit(self.crop_cache.store, case_name, source_path, cropped, crop_ijk_to_ras, bounds)
+        future.add_done_callback(lambda f: f.exception() and print(f"Could not crop {case_name}: {f.exception()}"))
+        return future
+
+    def switchCaseVolume(self, cropped):
+        """Swap the displayed volume of the current case between its aortic root crop and the full volume
+
+        Markups are in RAS and the crop keeps the full volume geometry, so nothing else moves.
+        Returns False if the requested volume is not available.
+        """
+        if not hasattr(self, 'current_case_name') or cropped == getattr(self, 'volume_is_cropped', False):
+            return False
+        case_name = self.current_case_name
+        case_path = self.getCaseVolumePath(case_name)
+        if cropped:
+            path = self.getCaseCropPath(case_name)
+            if not path:
+                return False
+        else:
+            path = (self.volume_cache.lookup(case_path) if getattr(self, 'volume_cache', None) else None) or case_path
+        self.replaceCaseVolume(path, cropped=cropped)
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.write_event("volume_switched", f"Showing {'cropped' if cropped else 'full'} volume",
+                                                 cropped=cropped)
+        return True
+
+    def createSplineNode(self):
+        """New annulus closed curve node with the annotation display settings"""
+        spline_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsClosedCurveNode")
+        spline_node.SetName("Annulus Contour (Spline)")
+        spline_node.SetCurveTypeToCardinalSpline()
+        spline_node.GetDisplayNode().SetSelectedColor(1, 1, 0)  # Yellow
+        spline_node.GetDisplayNode().SetLineWidth(3)
+        return spline_node
+
+    def getLandmarksPath(self, case_name):
+        return self.dataset.landmarks_path(case_name)
+
+    def setupSceneCache(self):
+        settings = qt.QSettings()
+        max_cases = int(settings.value("CardiacAnnotator/sceneCacheCases", 3))
+        budget_mb = int(settings.value("CardiacAnnotator/sceneCacheBudgetMB", 4096))
+        self.scene_cache = self.CaseSceneCache(max_cases=max_cases, budget_mb=budget_mb)
+
+    def stashCurrentCase(self, discard=False):
+        """Hide the current case nodes in the scene cache (or remove them if discarded)"""
+        if not hasattr(self, 'current_case_name'):
+            return
+        self.removeLandmarkObservers()
+        entry = {
+            'volume': getattr(self, 'volume_node', None),
+            'markups': getattr(self, 'markups_node', None),
+            'spline': getattr(self, 'spline_node', None),
+            'cropped': getattr(self, 'volume_is_cropped', False),
+            'phase': getattr(self, 'current_phase', BASE_PHASE),
+            'landmarks_mtime': self.getLandmarksMtime(self.current_case_name),
+        }
+        if discard:
+            self.scene_cache.release(entry)
+        else:
+            self.scene_cache.put(self.current_case_name, entry)
+        self.volume_node = None
+        self.markups_node = None
+        self.spline_node = None
+
+    def getLandmarksMtime(self, case_name):
+        landmarks_path = self.getLandmarksPath(case_name)
+        return os.path.getmtime(landmarks_path) if os.path.exists(landmarks_path) else None
+
+    def removeLandmarkObservers(self):
+        if hasattr(self, 'observer_tag'):
+            if getattr(self, 'markups_node', None):
+                self.markups_node.RemoveObserver(self.observer_tag)
+            del self.observer_tag
+        if hasattr(self, 'spline_observer_tag'):
+            if getattr(self, 'spline_node', None):
+                self.spline_node.RemoveObserver(self.spline_observer_tag)
+            del self.spline_observer_tag
+
+    # Rough per control point cost (position, orientation, label, flags) for markups accounting
+    CONTROL_POINT_BYTES = 256
+
+    def getSceneMemoryUsage(self):
+        """Return bytes held per volume/markups node and the total scene footprint"""
+        nodes = []
+        for node in slicer.util.getNodesByClass("vtkMRMLVolumeNode"):
+            image_data = node.GetImageData()
+            nbytes = image_data.GetActualMemorySize() * 1024 if image_data else 0
+            nodes.append({'name': node.GetName(), 'class': node.GetClassName(), 'bytes': nbytes})
+        for node in slicer.util.getNodesByClass("vtkMRMLMarkupsNode"):
+            nbytes = node.GetNumberOfControlPoints() * self.CONTROL_POINT_BYTES
+            curve_points = node.GetCurvePointsWorld()
+            if curve_points:
+                nbytes += curve_points.GetActualMemorySize() * 1024
+            nodes.append({'name': node.GetName(), 'class': node.GetClassName(), 'bytes': nbytes})
+        return {'nodes': nodes, 'total_bytes': sum(entry['bytes'] for entry in nodes)}
+
+    def formatMemoryReport(self, report, detailed=True):
+        total_text = f"Scene memory: {report['total_bytes'] / (1024 * 1024):.1f} MB"
+        if not detailed:
+            return total_text
+        lines = [total_text]
+        for entry in report['nodes']:
+            lines.append(f"  {entry['name']} ({entry['class']}): {entry['bytes'] / (1024 * 1024):.2f} MB")
+        return "\n".join(lines)
+
+    def updateCaseStatus(self, case_id, status):
+        # Only update if moving from not_started to in_progress (checked in the same commit)
+        if status == 'in_progress':
+            self.dataset.start_case(case_id)
+        self.has_unsaved_changes = False
+
+    def completeLandmark(self, landmark_name, notes):
+        # Add completion logic here
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.write_event("landmark_completed", f"Complete landmark: {landmark_name} - Notes: {notes}",
+                                                 landmark=landmark_name, notes=notes)
+
+    def resetCurrentLandmark(self, landmark_name):
+        """Reset/delete a specific landmark"""
+        print(f"DEBUG: Attempting to reset landmark: {landmark_name}")
+        
+        if hasattr(self, 'markups_node') and self.markups_node:
+            print(f"DEBUG: Markups node exists with {self.markups_node.GetNumberOfControlPoints()} points")
+            
+            # Points with this landmark name, from the index
+            points_to_remove = list(self.getLandmarkIndex().get(landmark_name)['indices'])
+            self.has_unsaved_changes = True
+            self.journalEdit("reset", landmark=landmark_name)
+            
+            print(f"DEBUG: Points to remove: {points_to_remove}")
+            
+            # Unlock and remove in reverse order to avoid index shifting, as one batched modification
+            was_modifying = self.markups_node.StartModify()
+            for i in reversed(points_to_remove):
+                print(f"DEBUG: Removing point at index {i}")
+                self.markups_node.SetNthControlPointLocked(i, False)
+                self.markups_node.RemoveNthControlPoint(i)
+            self.markups_node.EndModify(was_modifying)
+                
+            print(f"DEBUG: After removal, {self.markups_node.GetNumberOfControlPoints()} points remain")
+        else:
+            print("DEBUG: No markups node found")        
+        
+        # Log the reset
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.write_event("landmark_reset", f"Reset landmark: {landmark_name}", landmark=landmark_name)
+
+    @property
+    def has_unsaved_changes(self):
+        return self.change_generation != self.saved_generation
+
+    @has_unsaved_changes.setter
+    def has_unsaved_changes(self, value):
+        if value:
+            self.change_generation += 1
+        else:
+            self.saved_generation = self.change_generation
+
+    def getLandmarkIndex(self):
+        """Landmark index following the current point markups node"""
+        if not getattr(self, 'landmark_index', None):
+            self.landmark_index = LandmarkIndex(self.LANDMARK_TYPES[:-1])
+        self.landmark_index.attach(getattr(self, 'markups_node', None))
+        return self.landmark_index
+
+    def getLandmarkProgress(self):
+        """Return progress dictionary with compact status for each landmark type"""
+        landmark_types = self.LANDMARK_TYPES
+        
+        progress = {}
+        
+        # Check point landmarks
+        if hasattr(self, 'markups_node') and self.markups_node:
+            landmark_index = self.getLandmarkIndex()
+            
+            # Set status for point landmarks
+            for landmark in landmark_types[:-1]:  # All except spline
+                if landmark_index.has_label(landmark):
+                    progress[landmark] = "✓"
+                else:
+                    progress[landmark] = "✗"
+        else:
+            # No markups node - all point landmarks not placed
+            for landmark in landmark_types[:-1]:
+                progress[landmark] = "✗"
+        
+        # Check spline landmark separately
+        if hasattr(self, 'spline_node') and self.spline_node:
+            spline_points = self.spline_node.GetNumberOfControlPoints()
+            if spline_points >= 3:  # Minimum for a meaningful contour
+                progress["Annulus Contour (Spline)"] = f"✓ ({spline_points} pts)"
+            elif spline_points > 0:
+                progress["Annulus Contour (Spline)"] = f"⚠ ({spline_points} pts)"
+            else:
+                progress["Annulus Contour (Spline)"] = "✗"
+        else:
+            progress["Annulus Contour (Spline)"] = "✗"
+        
+        return progress
+
+    def setupActivityObserver(self, activity_type):
+        """Set up observer to detect when activities (landmarks/segments) are placed"""
+        if hasattr(self, 'markups_node') and self.markups_node:
+            # Remove existing observer if any
+            if hasattr(self, 'observer_tag'):
+                self.markups_node.RemoveObserver(self.observer_tag)
+            
+            # Add observer for point position defined (not just added)
+            self.observer_tag = self.markups_node.AddObserver(
+                self.markups_node.PointPositionDefinedEvent, 
+                lambda caller, event: self.onActivityPlaced(caller, event, activity_type)
+            )
+
+    def onActivityPlaced(self, caller, event, activity_type):
+        """Called when an activity (landmark/segment) is placed"""
+        num_points = self.markups_node.GetNumberOfControlPoints()
+        if num_points > 0:
+            self.has_unsaved_changes = True # to trigger save prompt
+            # Get the last placed point
+            point_index = num_points - 1
+            pos = [0, 0, 0]
+            self.markups_node.GetNthControlPointPosition(point_index, pos)
+            
+            # Set the point label to match the landmark name            
+            if activity_type == "landmark":
+                activity_name = getattr(self, 'current_landmark', 'Unknown')
+                self.markups_node.SetNthControlPointLabel(point_index, activity_name)
+            self.journalEdit("place", label=self.markups_node.GetNthControlPointLabel(point_index), position=list(pos))
+            
+            # Log the placement
+            if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                activity_name = getattr(self, 'current_landmark', 'Unknown')
+                self.current_log_manager.write_event(
+                    f"{activity_type}_placed", f"Placed {activity_type}: {activity_name}",
+                    landmark=activity_name, position=list(pos)
+                )     
+                            
+            # Update UI after placement
+            if hasattr(self, 'widget_reference'):
+                self.widget_reference.scheduleLandmarkRefresh(activity_name)
+                
+                # Auto-select next landmark if checkbox is checked
+                if (hasattr(self.widget_reference, 'autoSelectCheckbox') and 
+                    self.widget_reference.autoSelectCheckbox.isChecked()):
+                    self.widget_reference.selectNextLandmark(activity_name)
+
+    def lockUnlockLandmark(self, landmark_name, lock=True):
+        """Lock or unlock points of the current landmark type"""
+        self.journalEdit("lock", landmark=landmark_name, locked=lock)
+        if landmark_name == "Annulus Contour (Spline)":
+            self.lockUnlockSpline(lock)
+        else:
+            # Point landmarks: lock the indexed points in one batched modification
+            if hasattr(self, 'markups_node') and self.markups_node:
+                was_modifying = self.markups_node.StartModify()
+                for i in self.getLandmarkIndex().get(landmark_name)['indices']:
+                    self.markups_node.SetNthControlPointLocked(i, lock)
+                self.markups_node.EndModify(was_modifying)
+        self.has_unsaved_changes = True
+
+    def checkForIncompleteWork(self):
+        """Return (and log) the unlocked landmarks left by a previous session"""
+        incomplete_items = []
+        
+        # Check point landmarks
+        if hasattr(self, 'markups_node') and self.markups_node:
+            num_points = self.markups_node.GetNumberOfControlPoints()
+            for i in range(num_points):
+                if not self.markups_node.GetNthControlPointLocked(i):
+                    point_label = self.markups_node.GetNthControlPointLabel(i)
+                    incomplete_items.append(f"Point: {point_label}")
+        
+        # Check spline
+        if hasattr(self, 'spline_node') and self.spline_node:
+            spline_points = self.spline_node.GetNumberOfControlPoints()
+            spline_locked = True
+            
+            for i in range(spline_points):
+                if not self.spline_node.GetNthControlPointLocked(i):
+                    spline_locked = False
+                    break
+            
+            if not spline_locked and spline_points > 0:
+                incomplete_items.append(f"Spline: Annulus Contour ({spline_points} points)")
+        
+        if incomplete_items:
+            # Log the warning (the widget shows it)
+            if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                self.current_log_manager.write_event("incomplete_work", f"Warning: Incomplete work detected: {', '.join(incomplete_items)}",
+                                                     items=incomplete_items)
+        return incomplete_items
+
+    def saveLandmarks(self, on_done=None):
+        """Save current landmarks and spline to same JSON file, in the background
+
+        The nodes are snapshotted here on the main thread; serialization and disk I/O run on a
+        single save thread, so queued saves reach the disk in the order they were requested.
+        on_done(ok, error) is called on the main thread once this snapshot is written.
+        """
+        if not hasattr(self, 'current_case_name'):
+            return None
+        case_name = self.current_case_name
+        save_path = self.getLandmarksPath(case_name)
+        if not self.holdsCaseLease(case_name):
+            # Another workstation owns the case now, its landmarks file is not ours to overwrite
+            print(f"Not saving {case_name}: the case lease was lost")
+            if on_done:
+                on_done(False, f"The lease on {case_name} was lost to another workstation")
+            return None
+        
+        # One snapshot of both nodes, one write, atomic rename - a crash never leaves a truncated file
+        document = MarkupsSerializer.snapshot(getattr(self, 'markups_node', None), getattr(self, 'spline_node', None))
+        generation = self.change_generation
+
+        if not getattr(self, 'save_executor', None):
+            self.save_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="CardiacAnnotatorSave")
+            self.pending_saves = []
+            self.save_poll_timer = qt.QTimer()
+            self.save_poll_timer.setInterval(100)
+            self.save_poll_timer.timeout.connect(self.pollSaves)
+        future = self.save_executor.submit(MarkupsSerializer.write, document, save_path)
+        journal = getattr(self, 'landmark_journal', None)
+        self.pending_saves.append({'future': future, 'case_name': case_name, 'generation': generation,
+                                   'save_path': save_path, 'on_done': on_done, 'journal': journal,
+                                   'journal_mark': journal.count if journal else 0})
+        self.save_poll_timer.start()
+        self.updateSaveStatus()
+        # Once the root is marked, later opens of this case can load just the crop
+        if getattr(self, 'crop_volumes', False):
+            self.updateCaseCrop()
+        return future
+
+    def pollSaves(self):
+        """Run completion callbacks of finished saves, oldest first"""
+        while self.pending_saves and self.pending_saves[0]['future'].done():
+            entry = self.pending_saves.pop(0)
+            case_name, save_path, on_done = entry['case_name'], entry['save_path'], entry['on_done']
+            error = entry['future'].exception()
+            if error:
+                self.last_save_text = f"Save of {case_name} failed"
+                print(f"Saving landmarks of {case_name} failed: {error}")
+            else:
+                self.last_save_text = f"Saved {case_name} at {time.strftime('%H:%M:%S')}"
+                print(f"All landmarks saved to: {save_path}")
+                # Edits made after the snapshot stay unsaved
+                if case_name == getattr(self, 'current_case_name', None):
+                    self.saved_generation = max(self.saved_generation, entry['generation'])
+                # Compact the journal: records up to the snapshot are in the file now
+                if entry['journal']:
+                    entry['journal'].compact(entry['journal_mark'])
+                    for later in self.pending_saves:
+                        if later['journal'] is entry['journal']:
+                            later['journal_mark'] -= entry['journal_mark']
+                # A hidden copy of the case is still current, the file changed under it because of us
+                cached = self.scene_cache.entries.get(case_name) if getattr(self, 'scene_cache', None) else None
+                if cached:
+                    cached['landmarks_mtime'] = self.getLandmarksMtime(case_name)
+            if on_done:
+                on_done(error is None, error)
+        if not self.pending_saves:
+            self.save_poll_timer.stop()
+        self.updateSaveStatus()
+
+    def waitForSaves(self):
+        """Block until all queued saves are on disk (closing, or reading landmarks back)"""
+        if not getattr(self, 'pending_saves', None):
+            return
+        concurrent.futures.wait([entry['future'] for entry in self.pending_saves])
+        self.pollSaves()
+
+    def updateSaveStatus(self):
+        if not hasattr(self, 'widget_reference'):
+            return
+        in_flight = len(getattr(self, 'pending_saves', []))
+        if in_flight:
+            self.widget_reference.saveStatusLabel.setText(f"Saving landmarks... ({in_flight} queued)")
+        else:
+            self.widget_reference.saveStatusLabel.setText(getattr(self, 'last_save_text', ""))
+
+    def setupSplineObserver(self):
+        """Set up observer specifically for spline landmark"""
+        if hasattr(self, 'spline_node') and self.spline_node:
+            # Remove existing observer if any
+            if hasattr(self, 'spline_observer_tag'):
+                self.spline_node.RemoveObserver(self.spline_observer_tag)
+            
+            # Add observer for point additions to spline
+            self.spline_observer_tag = self.spline_node.AddObserver(
+                self.spline_node.PointPositionDefinedEvent, 
+                self.onSplinePointPlaced
+            )
+
+    def onSplinePointPlaced(self, caller, event):
+        """Called when a point is added to the spline"""
+        num_points = self.spline_node.GetNumberOfControlPoints()
+        if num_points > 0:
+            self.has_unsaved_changes = True
+            # Get the last placed point
+            point_index = num_points - 1
+            pos = [0, 0, 0]
+            self.spline_node.GetNthControlPointPosition(point_index, pos)
+            self.journalEdit("spline_point", index=point_index, position=list(pos))
+            
+            # Log the spline point placement
+            if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                self.current_log_manager.write_event(
+                    "spline_point_added",
+                    f"Added spline point {point_index + 1} at position ({pos[0]:.2f}, {pos[1]:.2f}, {pos[2]:.2f})",
+                    landmark="Annulus Contour (Spline)", index=point_index, position=list(pos)
+                )
+            
+            # Update UI after spline point placement
+            if hasattr(self, 'widget_reference'):
+                # Force button update since spline point was just placed
+                if (hasattr(self.widget_reference, 'selected_landmark') and 
+                    self.widget_reference.selected_landmark == "Annulus Contour (Spline)"):
+                    
+                    # Directly set button state for spline with points
+                    self.widget_reference.lockUnlockButton.setText("Click to Lock Landmark")
+                    self.widget_reference.lockUnlockButton.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; font-weight: bold; }")
+                    self.widget_reference.lockUnlockButton.setEnabled(True)
+                    self.widget_reference.resetLandmarkButton.setEnabled(True)
+                
+                # Update progress list
+                self.widget_reference.scheduleLandmarkRefresh()
+                
+                # Auto-select next landmark if checkbox is checked (won't do anything since spline is last)
+                if (hasattr(self.widget_reference, 'autoSelectCheckbox') and 
+                    self.widget_reference.autoSelectCheckbox.isChecked()):
+                    self.widget_reference.selectNextLandmark("Annulus Contour (Spline)")
+
+    def journalEdit(self, op, **fields):
+        """Record one edit in the current case journal"""
+        if getattr(self, 'landmark_journal', None):
+            self.landmark_journal.append(op, **fields)
+
+    def lockUnlockSpline(self, lock=True):
+        """Lock or unlock the spline node"""
+        if hasattr(self, 'spline_node') and self.spline_node:
+            num_points = self.spline_node.GetNumberOfControlPoints()
+            for i in range(num_points):
+                self.spline_node.SetNthControlPointLocked(i, lock)
+        self.has_unsaved_changes = True
+        # A locked spline is final, measure the annulus right away
+        self.last_measurements = self.measureCurrentCase() if lock else None
+
+    def measureCurrentCase(self):
+        """Annulus and coronary height measurements from the nodes in the scene, stored in the progress store"""
+        if not getattr(self, 'spline_node', None) or self.spline_node.GetNumberOfControlPoints() < 3:
+            return None
+        points = np.full((len(self.LANDMARK_TYPES) - 1, 3), np.nan)
+        if getattr(self, 'markups_node', None):
+            landmark_index = self.getLandmarkIndex()
+            for row, landmark_name in enumerate(self.LANDMARK_TYPES[:-1]):
+                entry = landmark_index.get(landmark_name)
+                if entry['defined']:
+                    position = [0, 0, 0]
+                    self.markups_node.GetNthControlPointPosition(entry['indices'][0], position)
+                    points[row] = position
+        spline_points = slicer.util.arrayFromMarkupsControlPoints(self.spline_node)
+        measurements = measure_case(points, spline_points)
+
+        self.progress_store.update(self.current_case_name, **{
+            name: None if math.isnan(value) else round(value, 2) for name, value in measurements.items()})
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.write_event(
+                "measurements", f"Annulus perimeter {measurements['Annulus_perimeter_mm']:.1f} mm, area {measurements['Annulus_area_mm2']:.0f} mm2",
+                **{name: None if math.isnan(value) else value for name, value in measurements.items()})
+        return measurements
+
+    def resetSpline(self):
+        """Reset/clear the current spline"""
+        if hasattr(self, 'spline_node') and self.spline_node:
+            # Clear all control points
+            self.spline_node.RemoveAllControlPoints()
+            self.has_unsaved_changes = True 
+            self.last_measurements = None
+            self.journalEdit("reset", landmark="Annulus Contour (Spline)")
+            
+            # Log the reset
+            if hasattr(self, 'current_log_manager') and self.current_log_manager:
+                self.current_log_manager.write_event("landmark_reset", "Reset Annulus Contour (Spline)",
+                                                     landmark="Annulus Contour (Spline)")
+
+    def landmarkExists(self, landmark_name):
+        """Check if a landmark has been placed"""
+        if landmark_name == "Annulus Contour (Spline)":
+            return hasattr(self, 'spline_node') and self.spline_node and self.spline_node.GetNumberOfControlPoints() > 0
+        else:
+            if hasattr(self, 'markups_node') and self.markups_node:
+                # Landmark name matches AND the point is in a defined state
+                return self.getLandmarkIndex().get(landmark_name)['defined']
+            return False
+
+    def isLandmarkLocked(self, landmark_name):
+        """Check if a landmark is locked"""
+        if landmark_name == "Annulus Contour (Spline)":
+            if hasattr(self, 'spline_node') and self.spline_node:
+                num_points = self.spline_node.GetNumberOfControlPoints()
+                if num_points > 0:
+                    return self.spline_node.GetNthControlPointLocked(0)  # Check first point
+            return False
+        else:
+            if hasattr(self, 'markups_node') and self.markups_node:
+                return self.getLandmarkIndex().get(landmark_name)['locked']
+            return False
+
+
+    class CaseSceneCache:
+        """Keeps the nodes of recently viewed cases hidden in the scene, bounded by case count and bytes (LRU)"""
+
+        def __init__(self, max_cases=3, budget_mb=4096):
+            self.max_cases = max_cases
+            self.budget = int(budget_mb * 1024 * 1024)
+            self.entries = OrderedDict()  # case -> {'volume', 'markups', 'spline', 'bytes'}
+
+        def __contains__(self, case_name):
+            return case_name in self.entries
+
+        def used_bytes(self):
+            return sum(entry['bytes'] for entry in self.entries.values())
+
+        def put(self, case_name, entry):
+            """Hide the case nodes and keep them as most recently used"""
+            entry['bytes'] = self.volumeBytes(entry)
+            self.hide(entry)
+            self.entries.pop(case_name, None)
+            self.entries[case_name] = entry
+            self.evict()
+
+        def pop(self, case_name):
+            return self.entries.pop(case_name, None)
+
+        def volumeBytes(self, entry):
+            volume_node = entry.get('volume')
+            image_data = volume_node.GetImageData() if volume_node else None
+            return image_data.GetActualMemorySize() * 1024 if image_data else 0
+
+        def remeasure(self, case_name):
+            """Recount a hidden case whose volume changed size, evicting if it no longer fits"""
+            entry = self.entries.get(case_name)
+            if entry:
+                entry['bytes'] = self.volumeBytes(entry)
+                self.evict()
+
+        def evict(self):
+            """Release least recently used cases until count and byte budget are respected"""
+            while self.entries and (len(self.entries) > self.max_cases or self.used_bytes() > self.budget):
+                case_name, entry = self.entries.popitem(last=False)
+                print(f"Evicting {case_name} from scene cache ({entry['bytes'] / (1024 * 1024):.0f} MB)")
+                self.release(entry)
+
+        def clear(self):
+            while self.entries:
+                _, entry = self.entries.popitem(last=False)
+                self.release(entry)
+
+        def hide(self, entry):
+            for key in ('markups', 'spline'):
+                node = entry.get(key)
+                if node and node.GetDisplayNode():
+                    node.GetDisplayNode().SetVisibility(False)
+
+        def show(self, entry):
+            for key in ('markups', 'spline'):
+                node = entry.get(key)
+                if node and node.GetDisplayNode():
+                    node.GetDisplayNode().SetVisibility(True)
+            if entry.get('volume'):
+                slicer.util.setSliceViewerLayers(background=entry['volume'], fit=True)
+
+        def release(self, entry):
+            """Remove the nodes (and their display/storage nodes) from the scene right away"""
+            for key in ('volume', 'markups', 'spline'):
+                node = entry.get(key)
+                if not node or not node.GetScene():
+                    continue
+                helper_nodes = [node.GetNthDisplayNode(i) for i in range(node.GetNumberOfDisplayNodes())]
+                helper_nodes.append(node.GetStorageNode())
+                if key == 'volume':
+                    # Drop the voxel buffer even if something still references the node
+                    node.SetAndObserveImageData(None)
+                slicer.mrmlScene.RemoveNode(node)
+                for helper_node in helper_nodes:
+                    if helper_node and helper_node.GetScene():
+                        slicer.mrmlScene.RemoveNode(helper_node)
+            entry.clear()
+
+    def calculateLandmarkTimeFromLog(self, log_path):
+        """Calculate total time spent on landmarks from log entries (incremental, cached per log)"""
+        if not getattr(self, 'timing_engine', None):
+            self.timing_engine = LandmarkTimingEngine()
+        landmark_times = self.timing_engine.landmark_times(log_path)
+        for landmark_name, seconds in landmark_times.items():
+            print(f"{landmark_name}: {seconds} seconds")
+        
+        total_seconds = sum(landmark_times.values())
+        total_minutes = total_seconds / 60
+        print(f"Total landmark time: {total_seconds} seconds = {total_minutes} minutes")
+        return math.ceil(total_minutes)
+
+    def computeAnnotationTimeAnalytics(self, main_folder=None, workers=None, write_back=True):
+        """Dataset-wide landmark timing from every case log, computed on a process pool.
+
+        See CardiacAnnotatorLib.analytics (also runnable without Slicer:
+        python -m CardiacAnnotatorLib analytics <folder>). Returns (per case table, summary table).
+        """
+        main_folder = main_folder or self.main_folder
+        if getattr(self, 'main_folder', None) != main_folder or not getattr(self, 'dataset', None):
+            self.initializeProgressTracking(main_folder)
+        with self.createProcessPool(workers) as executor:
+            return compute_annotation_time_analytics(self.dataset, write_back=write_back, executor=executor)
+
+    def exportLandmarkArrays(self, statuses=('completed',), workers=None):
+        """Update the dataset-wide columnar landmark store (see CardiacAnnotatorLib.export)"""
+        self.waitForSaves()
+        with self.createProcessPool(workers) as executor:
+            return export_landmarks(self.dataset, statuses=statuses, executor=executor)
+
+    def updateDatasetMeasurements(self, statuses=('completed',), workers=None):
+        """Measure all cases of the dataset at once and store the columns (see CardiacAnnotatorLib.measurements)"""
+        self.waitForSaves()
+        with self.createProcessPool(workers) as executor:
+            return update_dataset_measurements(self.dataset, statuses=statuses, executor=executor)
+
+    def markCaseComplete(self):
+        """Mark current case as complete and update total time from log"""
+        if not hasattr(self, 'current_case_name'):
+            return
+            
+        case_name = self.current_case_name
+        if not self.holdsCaseLease(case_name):
+            print(f"Not completing {case_name}: the case lease was lost")
+            return False
+        log_path = self.dataset.log_path(case_name)
+        
+        # Calculate total time from log (queued entries first)
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            try:
+                self.current_log_manager.flush()
+            except OSError as e:
+                print(f"Annotation log of {case_name} not fully written ({e}), timing from what is on disk")
+        landmark_time = self.calculateLandmarkTimeFromLog(log_path) if os.path.exists(log_path) else 0
+        
+        # Close log
+        if hasattr(self, 'current_log_manager') and self.current_log_manager:
+            self.current_log_manager.close_case("completed")
+
+        # Progress store (the CSV view is written on close), then the case is no longer reserved
+        self.dataset.complete_case(case_name, landmark_time)
+        return True
+
+
+class CardiacAnnotatorTest(ScriptedLoadableModuleTest):
+
+    def setUp(self):
+        slicer.mrmlScene.Clear(0)
+
+    def runTest(self):
+        self.setUp()
+        self.test_LoadCaseSingleVolume()
+        self.test_LogWriterIdle()
+        self.test_LogFlushError()
+        self.test_LandmarkTimingClockStep()
+        self.test_LandmarkIndexIncremental()
+        self.test_AnnulusPerimeterMatchesClosedCurve()
+        self.test_CaseLeaseContention()
+
+    def createTestDataset(self, case_name="TAVI_test"):
+        """Write a small synthetic case in the <root>/<case>/Platipy layout"""
+        main_folder = tempfile.mkdtemp(prefix="CardiacAnnotatorTest")
+        platipy_dir = os.path.join(main_folder, case_name, 'Platipy')
+        os.makedirs(platipy_dir)
+
+        image_data = vtk.vtkImageData()
+        image_data.SetDimensions(16, 16, 8)
+        image_data.AllocateScalars(vtk.VTK_SHORT, 1)
+        volume_node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+        volume_node.SetAndObserveImageData(image_data)
+        slicer.util.saveNode(volume_node, os.path.join(platipy_dir, f'{case_name} 40pc.nii.gz'))
+        slicer.mrmlScene.Clear(0)
+        return main_folder
+
+    def test_LoadCaseSingleVolume(self):
+        """A case load must put exactly one volume node in the scene"""
+        self.delayDisplay("Starting single volume load test")
+        main_folder = self.createTestDataset()
+        logic = CardiacAnnotatorLogic()
+        try:
+            logic.initializeProgressTracking(main_folder)
+            logic.loadCase("TAVI_test")
+
+            volume_nodes = slicer.util.getNodesByClass("vtkMRMLScalarVolumeNode")
+            self.assertEqual(len(volume_nodes), 1)
+
+            report = logic.getSceneMemoryUsage()
+            volume_entries = [entry for entry in report['nodes'] if entry['class'] == "vtkMRMLScalarVolumeNode"]
+            self.assertEqual(len(volume_entries), 1)
+            self.assertGreater(report['total_bytes'], 0)
+        finally:
+            # Same teardown as the widget cleanup, nothing may outlive the temp dataset
+            logic.waitForSaves()
+            if getattr(logic, 'landmark_journal', None):
+                logic.landmark_journal.close()
+            if getattr(logic, 'current_log_manager', None):
+                logic.current_log_manager.close_case("session_ended")
+            logic.prefetcher.shutdown()
+            logic.pyramid_cache.shutdown()
+            logic.phase_cache.shutdown()
+            if getattr(logic, 'stats_pool', None):
+                logic.stats_poll_timer.stop()
+                logic.stats_pool.shutdown(cancel_futures=True)
+            if getattr(logic, 'volume_executor', None):
+                logic.volume_poll_timer.stop()
+                logic.volume_executor.shutdown(cancel_futures=True)
+            # Releases the lease (no lease file left behind), stops its heartbeat and closes SQLite
+            logic.lease_poll_timer.stop()
+            logic.dataset.close()
+            shutil.rmtree(main_folder, ignore_errors=True)
+        self.delayDisplay("Single volume load test passed")
+
+    def test_LogWriterIdle(self):
+        """An open case log with nothing to write must not keep a core busy"""
+        self.delayDisplay("Starting idle log writer test")
+        case_folder = tempfile.mkdtemp(prefix="CardiacAnnotatorTest")
+        log_manager = LogManager(case_folder, "TAVI_test", flush_interval=0.1)
+        try:
+            log_manager.open_case("TAVI_test")
+            log_manager.flush()
+            # Well past the flush deadline with an empty queue
+            time.sleep(0.5)
+            cpu_start = time.process_time()
+            time.sleep(1.0)
+            self.assertLess(time.process_time() - cpu_start, 0.2)
+
+            # Still writes promptly after the idle stretch
+            log_manager.write_event("note", "after idle")
+            log_manager.flush()
+            with open(log_manager.log_path, 'r') as f:
+                self.assertIn("after idle", f.read())
+        finally:
+            log_manager.close()
+            shutil.rmtree(case_folder, ignore_errors=True)
+        self.delayDisplay("Idle log writer test passed")
+
+    def test_LogFlushError(self):
+        """flush() must not report entries as written when the write failed, and they are retried"""
+        self.delayDisplay("Starting log flush error test")
+        main_folder = tempfile.mkdtemp(prefix="CardiacAnnotatorTest")
+        case_folder = os.path.join(main_folder, "missing")
+        log_manager = LogManager(case_folder, "TAVI_test", flush_interval=0.1)
+        try:
+            log_manager.write_event("note", "queued")
+            with self.assertRaises(OSError):
+                log_manager.flush()
+            os.makedirs(case_folder)
+            log_manager.flush()
+            with open(log_manager.log_path, 'r') as f:
+                self.assertIn("queued", f.read())
+        finally:
+            log_manager.close()
+            shutil.rmtree(main_folder, ignore_errors=True)
+        self.delayDisplay("Log flush error test passed")
+
+    def test_LandmarkTimingClockStep(self):
+        """Landmark durations come from the monotonic stamps, a wall clock step back does not change them"""
+        self.delayDisplay("Starting landmark timing clock step test")
+        case_folder = tempfile.mkdtemp(prefix="CardiacAnnotatorTest")
+        log_manager = LogManager(case_folder, "TAVI_test")
+        events = [
+            {'t': 1000.0, 'mono': 50.0, 'session': "a", 'type': "landmark_started", 'landmark': "Annulus"},
+            {'t': 400.0, 'mono': 80.0, 'session': "a", 'type': "landmark_placed", 'landmark': "Annulus"},
+        ]
+        try:
+            with open(log_manager.events_path, 'w') as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+            self.assertEqual(LandmarkTimingEngine().landmark_times(log_manager.log_path), {"Annulus": 30.0})
+        finally:
+            shutil.rmtree(case_folder, ignore_errors=True)
+        self.delayDisplay("Landmark timing clock step test passed")
+
+    def test_LandmarkIndexIncremental(self):
+        """Relabelling, locking or defining a point updates its index entry without a rebuild"""
+        self.delayDisplay("Starting landmark index test")
+        first, second = LANDMARK_TYPES[0], LANDMARK_TYPES[1]
+        node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode")
+        landmark_index = LandmarkIndex(LANDMARK_TYPES[:-1])
+        try:
+            node.AddControlPoint(vtk.vtkVector3d(0, 0, 0), first)
+            node.AddControlPoint(vtk.vtkVector3d(1, 0, 0), "F-2")
+            landmark_index.attach(node)
+            self.assertEqual(landmark_index.get(first)['indices'], [0])
+            rebuilds = landmark_index.rebuild_count
+
+            node.SetNthControlPointLabel(1, second)
+            node.SetNthControlPointLocked(1, True)
+            self.assertEqual(landmark_index.get(second), {'indices': [1], 'locked': True, 'defined': True})
+            self.assertFalse(landmark_index.has_label("F-2"))
+            node.SetNthControlPointLabel(0, second)
+            self.assertEqual(landmark_index.get(first)['indices'], [])
+            self.assertEqual(landmark_index.get(second)['indices'], [0, 1])
+            self.assertEqual(landmark_index.rebuild_count, rebuilds)
+        finally:
+            landmark_index.detach()
+            slicer.mrmlScene.RemoveNode(node)
+        self.delayDisplay("Landmark index test passed")
+
+    def test_AnnulusPerimeterMatchesClosedCurve(self):
+        """Exported perimeter equals the length of the annulus curve drawn in the scene"""
+        self.delayDisplay("Starting annulus perimeter test")
+        angles = np.linspace(0.0, 2.0 * np.pi, 9, endpoint=False)
+        radii = np.array([12.0, 10.5, 13.0, 9.0, 11.5, 12.5, 8.5, 10.0, 11.0])
+        spline_points = np.stack([radii * np.cos(angles), radii * np.sin(angles), 2.0 * np.sin(3 * angles)], axis=1)
+        spline_node = CardiacAnnotatorLogic().createSplineNode()
+        try:
+            slicer.util.updateMarkupsControlPointsFromArray(spline_node, spline_points)
+            measurements = measure_case(np.full((len(LANDMARK_TYPES) - 1, 3), np.nan), spline_points)
+            self.assertAlmostEqual(measurements['Annulus_perimeter_mm'], spline_node.GetCurveLengthWorld(), delta=0.05)
+        finally:
+            slicer.mrmlScene.RemoveNode(spline_node)
+        self.delayDisplay("Annulus perimeter test passed")
+
+    # One contending workstation: acquire, heartbeat through a few TTLs, report whether the case stayed ours
+    LEASE_CONTENDER = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from CardiacAnnotatorLib.progress import CaseLeaseManager
+leases = CaseLeaseManager(sys.argv[2], ttl=float(sys.argv[3]), annotator=sys.argv[4])
+acquired = leases.acquire("TAVI_test")
+held = acquired
+for _ in range(int(sys.argv[5])):
+    time.sleep(leases.ttl / 3)
+    held = held and leases.heartbeat("TAVI_test")
+print(acquired, held)
+leases.stop_event.set()
+"""
+
+    def runLeaseContenders(self, main_folder, ttl, annotators, beats):
+        python = shutil.which("PythonSlicer") or sys.executable
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        processes = [subprocess.Popen([python, "-c", self.LEASE_CONTENDER, module_dir, main_folder, str(ttl), annotator, str(beats)],
+                                      stdout=subprocess.PIPE, text=True) for annotator in annotators]
+        results = {}
+        for annotator, process in zip(annotators, processes):
+            output = process.communicate(timeout=60)[0].split()
+            results[annotator] = (output[-2] == "True", output[-1] == "True")
+        return results
+
+    def test_CaseLeaseContention(self):
+        """Workstations racing for an expired lease: one wins, keeps it, and a stalled owner finds out it lost it"""
+        self.delayDisplay("Starting case lease contention test")
+        main_folder = tempfile.mkdtemp(prefix="CardiacAnnotatorTest")
+        ttl = 1.0
+        stalled = CaseLeaseManager(main_folder, ttl=ttl, annotator="stalled")
+        try:
+            # An owner that stops renewing (hung station): its lease expires under it
+            self.assertTrue(stalled.acquire("TAVI_test"))
+            stalled.stop_event.set()
+            time.sleep(ttl * 1.5)
+
+            annotators = [f"station{i}" for i in range(4)]
+            results = self.runLeaseContenders(main_folder, ttl, annotators, beats=6)
+            winners = [annotator for annotator, (acquired, _) in results.items() if acquired]
+            self.assertEqual(len(winners), 1)
+            # Nobody broke or overwrote the winner's lease while it kept renewing it
+            self.assertTrue(results[winners[0]][1])
+
+            # The stalled owner notices, and the lease it lost is left alone
+            self.assertFalse(stalled.heartbeat("TAVI_test"))
+            self.assertFalse(stalled.holds("TAVI_test"))
+            self.assertEqual(stalled.take_lost(), {"TAVI_test"})
+            self.assertEqual(stalled.holder("TAVI_test")['annotator'], winners[0])
+            lease_files = os.listdir(stalled.lease_dir)
+            self.assertEqual(lease_files, ["TAVI_test.lock"])
+        finally:
+            stalled.release_all()
+            shutil.rmtree(main_folder, ignore_errors=True)
+        self.delayDisplay("Case lease contention test passed")
\ No newline at end of file
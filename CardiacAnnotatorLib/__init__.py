@@ -0,0 +1,18 @@
+"""Pure Python core of the CardiacAnnotator module (no Slicer or Qt imports).
+
+Dataset indexing, progress tracking, case leases, annotation logs and landmark markups I/O,
+usable from a plain interpreter, scripts and multiprocessing workers.
+"""
+from .analytics import compute_annotation_time_analytics
+from .crops import CropCache, landmark_roi, write_nrrd
+from .dataset import AnnotationDataset, CaseIndex, CasePrefetcher
+from .export import export_landmarks, load_landmark_store
+from .logs import LandmarkTimingEngine, LogManager, case_landmark_times
+from .markups import LANDMARK_TYPES, SPLINE_LANDMARK, LandmarkIndex, LandmarkJournal, MarkupsSerializer
+from .measurements import compute_measurements, measure_case, update_dataset_measurements
+from .nifti import read_nifti
+from .phases import BASE_PHASE, PhaseCache, case_phases
+from .progress import ACTIVITY_COLUMNS, MEASUREMENT_COLUMNS, CaseLeaseManager, ProgressStore
+from .pyramid import PyramidCache, build_dataset_pyramids
+from .stats import compute_dataset_stats, window_level
+from .volumes import VolumeCache, transcode_dataset
@@ -0,0 +1,68 @@
+"""Command line entry point, runs without Slicer:
+
+    python -m CardiacAnnotatorLib status <dataset folder>
+    python -m CardiacAnnotatorLib analytics <dataset folder> [--workers N] [--no-write-back]
+    python -m CardiacAnnotatorLib export <dataset folder> [--workers N]
+    python -m CardiacAnnotatorLib measure <dataset folder> [--workers N]
+    python -m CardiacAnnotatorLib transcode <dataset folder> [--workers N] [--cache-dir DIR] [--budget-gb N] [--verify]
+    python -m CardiacAnnotatorLib pyramid <dataset folder> [--workers N] [--cache-dir DIR] [--pyramid-budget-gb GB]
+    python -m CardiacAnnotatorLib stats <dataset folder> [--workers N] [--cache-dir DIR]
+"""
+import argparse
+import os
+
+from .analytics import compute_annotation_time_analytics
+from .dataset import AnnotationDataset
+from .export import export_landmarks
+from .measurements import update_dataset_measurements
+from .pyramid import PyramidCache, build_dataset_pyramids
+from .stats import compute_dataset_stats
+from .volumes import VolumeCache, default_cache_dir, transcode_dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m CardiacAnnotatorLib")
+    parser.add_argument("command", choices=["status", "analytics", "export", "measure", "transcode", "pyramid", "stats"])
+    parser.add_argument("main_folder")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-write-back", dest="write_back", action="store_false")
+    parser.add_argument("--cache-dir", default=None, help="volume cache directory (transcode, pyramid, stats)")
+    parser.add_argument("--budget-gb", type=float, default=20, help="volume cache size limit (transcode)")
+    parser.add_argument("--pyramid-budget-gb", type=float, default=2, help="pyramid cache size limit (pyramid)")
+    parser.add_argument("--verify", action="store_true", help="recheck cached volume checksums (transcode)")
+    parser.add_argument("--local-wal", action="store_true",
+                        help="WAL journal for a dataset on a local disk only (never on a network share)")
+    args = parser.parse_args(argv)
+
+    dataset = AnnotationDataset(args.main_folder, local_wal=args.local_wal)
+    try:
+        dataset.refresh()
+        if args.command == "status":
+            statuses = dataset.progress_store.statuses()
+            for status in ('in_progress', 'not_started', 'completed'):
+                print(f"{status}: {sum(1 for value in statuses.values() if value == status)}")
+            print(f"next: {', '.join(dataset.next_cases()[:10])}")
+        elif args.command == "analytics":
+            compute_annotation_time_analytics(dataset, workers=args.workers, write_back=args.write_back)
+        elif args.command == "export":
+            export_landmarks(dataset, workers=args.workers)
+        elif args.command == "measure":
+            update_dataset_measurements(dataset, workers=args.workers)
+        elif args.command == "transcode":
+            cache = VolumeCache(args.cache_dir, budget_gb=args.budget_gb)
+            transcode_dataset(dataset, cache, workers=args.workers, verify=args.verify)
+        elif args.command == "stats":
+            # Uncompressed cached copies are read when present
+            volume_cache = VolumeCache(args.cache_dir, budget_gb=args.budget_gb)
+            compute_dataset_stats(dataset, volume_cache=volume_cache, workers=args.workers)
+        else:
+            # Pyramids sit next to the volume cache, decoded from its uncompressed copies when present
+            volume_cache = VolumeCache(args.cache_dir, budget_gb=args.budget_gb)
+            cache = PyramidCache(os.path.join(args.cache_dir or default_cache_dir(), "pyramids"), budget_gb=args.pyramid_budget_gb)
+            build_dataset_pyramids(dataset, cache, volume_cache=volume_cache, workers=args.workers)
+    finally:
+        dataset.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Dataset-wide annotation time analytics, computed on a process pool"""
+import concurrent.futures
+import contextlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from .logs import LogManager, case_landmark_times
+from .progress import ACTIVITY_COLUMNS
+
+
+def compute_annotation_time_analytics(dataset, workers=None, write_back=True, executor=None):
+    """Landmark timing from every case log of an AnnotationDataset.
+
+    Writes analytics/landmark_times.csv (one row per case and landmark) and
+    analytics/landmark_time_summary.csv (median/p90 per landmark, per annotator and per week),
+    and, if write_back, stores Landmarks/Total_Time_minutes for all cases in one commit.
+    Runs on executor if given (Slicer passes its spawned pool), else on a new process pool.
+    Returns (per case table, summary table).
+    """
+    progress = dataset.progress_store.to_dataframe()
+
+    jobs = []
+    for case_name in progress['Case_ID']:
+        log_path = dataset.log_path(case_name)
+        events_path = LogManager.events_path_for(log_path)
+        if LogManager.segments(log_path) or LogManager.segments(events_path):
+            jobs.append((case_name, log_path))
+    with contextlib.nullcontext(executor) if executor else concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(case_landmark_times, jobs, chunksize=16))
+
+    # Long table: one row per case and landmark
+    records = [(case_name, landmark_name, seconds)
+               for case_name, landmark_times in results
+               for landmark_name, seconds in landmark_times.items()]
+    times = pd.DataFrame(records, columns=['Case_ID', 'Landmark', 'Seconds'])
+    info = progress[['Case_ID', 'Annotator', 'Date_Started', 'Date_Completed']].copy()
+    dates = pd.to_datetime(info['Date_Completed'].where(info['Date_Completed'] != '', info['Date_Started']),
+                           errors='coerce')
+    info['Week'] = dates.dt.strftime('%G-W%V')
+    times = times.merge(info, on='Case_ID', how='left')
+
+    def summarize(group_columns):
+        grouped = times.groupby(group_columns)['Seconds']
+        summary = grouped.agg(Cases='count', Median_seconds='median',
+                              P90_seconds=lambda seconds: seconds.quantile(0.9)).reset_index()
+        summary.insert(0, 'Grouping', "+".join(group_columns))
+        return summary
+
+    summary = pd.concat([summarize(['Landmark']), summarize(['Annotator', 'Landmark']),
+                         summarize(['Week', 'Landmark'])], ignore_index=True)
+
+    output_dir = os.path.join(dataset.main_folder, "analytics")
+    os.makedirs(output_dir, exist_ok=True)
+    times.to_csv(os.path.join(output_dir, "landmark_times.csv"), index=False, sep=";")
+    summary.to_csv(os.path.join(output_dir, "landmark_time_summary.csv"), index=False, sep=";")
+
+    if write_back and results:
+        per_case = times.groupby('Case_ID')['Seconds'].sum()
+        landmark_minutes = np.ceil(per_case / 60).astype(int)
+        updated = progress.set_index('Case_ID').loc[landmark_minutes.index, ACTIVITY_COLUMNS].fillna(0).astype(int)
+        updated['Landmarks'] = landmark_minutes
+        totals = updated[ACTIVITY_COLUMNS].sum(axis=1)
+        dataset.progress_store.update_many([
+            {'Case_ID': case_name, 'Landmarks': int(landmark_minutes[case_name]), 'Total_Time_minutes': int(totals[case_name])}
+            for case_name in landmark_minutes.index
+        ])
+        dataset.progress_store.export_csv(dataset.csv_path)
+    print(f"Annotation time analytics: {len(results)} case logs, {len(times)} landmark timings")
+    return times, summary
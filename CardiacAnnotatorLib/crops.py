@@ -0,0 +1,164 @@
+"""Cropped aortic root sub-volumes, so later opens of a case load a few MB instead of the chest CT.
+
+The region of interest is the bounding box of the placed landmarks (RAS) grown by a margin,
+snapped to the voxel grid of the full volume. Crops are written as raw NRRD files that Slicer
+loads directly, with the geometry of the full volume so markups stay where they are.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_PADDING_MM = 40.0
+
+NRRD_TYPES = {
+    np.dtype('int8'): 'int8', np.dtype('uint8'): 'uint8',
+    np.dtype('int16'): 'int16', np.dtype('uint16'): 'uint16',
+    np.dtype('int32'): 'int32', np.dtype('uint32'): 'uint32',
+    np.dtype('float32'): 'float', np.dtype('float64'): 'double',
+}
+
+
+def write_nrrd(path, array, ijk_to_ras):
+    """Write a (k, j, i) ordered array as a raw little endian NRRD in LPS space, atomically"""
+    array = np.ascontiguousarray(array)
+    dtype = array.dtype.newbyteorder('<') if array.dtype.byteorder == '>' else array.dtype
+    if dtype not in NRRD_TYPES:
+        raise ValueError(f"Unsupported voxel type {array.dtype}")
+    # RAS -> LPS flips the first two axes
+    ijk_to_lps = np.diag([-1.0, -1.0, 1.0, 1.0]) @ np.asarray(ijk_to_ras, dtype=float)
+    directions = " ".join("(" + ",".join(repr(float(v)) for v in ijk_to_lps[:3, axis]) + ")" for axis in range(3))
+    origin = "(" + ",".join(repr(float(v)) for v in ijk_to_lps[:3, 3]) + ")"
+    header = (
+        "NRRD0004\n"
+        f"type: {NRRD_TYPES[dtype]}\n"
+        "dimension: 3\n"
+        "space: left-posterior-superior\n"
+        f"sizes: {array.shape[2]} {array.shape[1]} {array.shape[0]}\n"
+        f"space directions: {directions}\n"
+        "kinds: domain domain domain\n"
+        "endian: little\n"
+        "encoding: raw\n"
+        f"space origin: {origin}\n"
+        "\n"
+    )
+    fd, temp_path = tempfile.mkstemp(prefix=".crop_", suffix=".part", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.encode('ascii'))
+            f.write(array.astype(dtype, copy=False).tobytes())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def landmark_roi(points_ras, ras_to_ijk, shape, padding_mm=DEFAULT_PADDING_MM):
+    """Voxel bounds ((i0, i1), (j0, j1), (k0, k1)) around RAS points, None if there are none.
+
+    The padded box is grown in RAS first, so the margin is in millimetres whatever the spacing.
+    shape is the (k, j, i) shape of the volume array.
+    """
+    points = np.asarray(points_ras, dtype=float).reshape(-1, 3)
+    points = points[np.isfinite(points).all(axis=1)]
+    if not len(points):
+        return None
+    low = points.min(axis=0) - padding_mm
+    high = points.max(axis=0) + padding_mm
+    corners = np.array([[x, y, z, 1.0] for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])])
+    ijk = (np.asarray(ras_to_ijk, dtype=float) @ corners.T)[:3].T
+    sizes = shape[::-1]
+    bounds = []
+    for axis in range(3):
+        start = max(int(np.floor(ijk[:, axis].min())), 0)
+        stop = min(int(np.ceil(ijk[:, axis].max())) + 1, sizes[axis])
+        if stop <= start:
+            return None
+        bounds.append((start, stop))
+    return tuple(bounds)
+
+
+def crop_array(array, ijk_to_ras, bounds):
+    """Sub-array of a (k, j, i) volume and the IJK to RAS matrix of its first voxel"""
+    (i0, i1), (j0, j1), (k0, k1) = bounds
+    cropped = np.array(array[k0:k1, j0:j1, i0:i1])
+    matrix = np.array(ijk_to_ras, dtype=float)
+    matrix[:3, 3] = (matrix @ np.array([i0, j0, k0, 1.0]))[:3]
+    return cropped, matrix
+
+
+def bounds_contain(outer, inner):
+    return all(o0 <= i0 and i1 <= o1 for (o0, o1), (i0, i1) in zip(outer, inner))
+
+
+class CropCache:
+    """Directory of <case>.nrrd crops; index.json remembers the source file and voxel bounds of each"""
+
+    VERSION = 1
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def save(self):
+        with self.lock:
+            entries = self._read_index()
+            entries.update(self.entries)
+            self.entries = {case: entry for case, entry in entries.items() if os.path.exists(self.path_for(case))}
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+            os.replace(temp_path, self.index_path)
+
+    def path_for(self, case_name):
+        return os.path.join(self.cache_dir, f"{case_name}.nrrd")
+
+    def lookup(self, case_name, source_path):
+        """Crop path of the case if it was cut from the current source file, else None"""
+        with self.lock:
+            entry = self.entries.get(case_name)
+            if not entry:
+                return None
+            try:
+                stat = os.stat(source_path)
+            except OSError:
+                return None
+            if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                return None
+            path = self.path_for(case_name)
+            return path if os.path.exists(path) else None
+
+    def covers(self, case_name, source_path, bounds):
+        """True if the existing crop of the case already holds these voxel bounds"""
+        if not self.lookup(case_name, source_path):
+            return False
+        return bounds_contain(self.entries[case_name]['bounds'], bounds)
+
+    def store(self, case_name, source_path, cropped, ijk_to_ras, bounds):
+        """Write a crop (any thread) and record it; returns the crop path"""
+        stat = os.stat(source_path)
+        path = self.path_for(case_name)
+        write_nrrd(path, cropped, ijk_to_ras)
+        with self.lock:
+            self.entries[case_name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                                       'bounds': [list(axis) for axis in bounds],
+                                       'bytes': int(cropped.nbytes), 'created': time.time()}
+        self.save()
+        return path
@@ -0,0 +1,364 @@
+"""TAVI dataset folder: case index, volume prefetching and the headless dataset facade"""
+import concurrent.futures
+import gzip
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from .progress import ACTIVITY_COLUMNS, CaseLeaseManager, ProgressStore
+
+
+def case_folder(main_folder, case_name):
+    return os.path.join(main_folder, case_name, 'Platipy')
+
+
+def volume_path(main_folder, case_name):
+    return os.path.join(case_folder(main_folder, case_name), f'{case_name} 40pc.nii.gz')
+
+
+def landmarks_path(main_folder, case_name):
+    return os.path.join(case_folder(main_folder, case_name), f'landmarks_{case_name}.mrk.json')
+
+
+def log_path(main_folder, case_name):
+    return os.path.join(case_folder(main_folder, case_name), f"annotation log {case_name}.txt")
+
+
+class CaseIndex:
+    """Persistent index of the TAVI case folders, refreshed incrementally from directory mtimes"""
+
+    VERSION = 1
+
+    def __init__(self, main_folder, workers=16):
+        self.main_folder = main_folder
+        self.index_path = os.path.join(main_folder, "case_index.json")
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.cases = {}  # case -> {'case_mtime', 'platipy_mtime', 'volumes', 'stats'}
+        self.scanned = set()  # folders seen by our last refresh, whatever their entry became
+        self.load()
+
+    def load(self):
+        self.cases = self._read_index()
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable case index {self.index_path}: {e}")
+            return {}
+        if data.get('version') != self.VERSION:
+            return {}
+        return data.get('cases', {})
+
+    def save(self):
+        """Persist the index, merged with what other stations (or the stats CLI) wrote since we read it"""
+        with self.lock:
+            for name, entry in self._read_index().items():
+                ours = self.cases.get(name)
+                if ours is None:
+                    # Added elsewhere after our last scan, unless the folder is gone
+                    if name not in self.scanned and os.path.isdir(os.path.join(self.main_folder, name)):
+                        self.cases[name] = entry
+                    continue
+                # Stats measured elsewhere, or of a newer volume than the ones we have
+                theirs = entry.get('stats')
+                if theirs and theirs.get('mtime_ns', 0) > (ours.get('stats') or {}).get('mtime_ns', -1):
+                    ours['stats'] = theirs
+            # Own temp file per station: the index lives in the shared dataset folder
+            temp_path = f"{self.index_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'cases': self.cases}, f)
+            os.replace(temp_path, self.index_path)
+
+    def refresh(self):
+        """Re-examine only case folders whose mtimes changed, then persist. Returns the case list."""
+        with os.scandir(self.main_folder) as entries:
+            case_entries = [(entry.name, entry.path) for entry in entries
+                            if entry.name.startswith('TAVI') and entry.is_dir()]
+        self.scanned = {name for name, _ in case_entries}
+
+        # stat calls are latency bound on network storage, so run them in parallel
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda item: self._scan_case(*item), case_entries))
+
+        changed = 0
+        cases = {}
+        for name, entry, rescanned in results:
+            if entry is not None:
+                cases[name] = entry
+            changed += rescanned
+        removed = len(set(self.cases) - set(cases))
+        if changed or removed or not os.path.exists(self.index_path):
+            self.cases = cases
+            self.save()
+        print(f"Case index: {len(cases)} folders, {changed} rescanned, {removed} removed")
+        return self.case_list()
+
+    def _scan_case(self, name, case_path):
+        previous = self.cases.get(name)
+        platipy_dir = os.path.join(case_path, 'Platipy')
+        try:
+            case_mtime = os.stat(case_path).st_mtime
+            platipy_mtime = os.stat(platipy_dir).st_mtime
+        except OSError:
+            return name, None, previous is not None
+        if (previous and previous.get('case_mtime') == case_mtime and
+                previous.get('platipy_mtime') == platipy_mtime):
+            return name, previous, False
+        try:
+            with os.scandir(platipy_dir) as entries:
+                volumes = sorted(entry.name for entry in entries if entry.name.endswith('.nii.gz'))
+        except OSError as e:
+            # Deleted or unreadable since the stat (network share), it drops out like a missing folder
+            print(f"Skipping case {name}: {e}")
+            return name, None, previous is not None
+        entry = {'case_mtime': case_mtime, 'platipy_mtime': platipy_mtime, 'volumes': volumes}
+        # Volume stats carry their own mtime/size check, keep them across rescans
+        if previous and previous.get('stats'):
+            entry['stats'] = previous['stats']
+        return name, entry, True
+
+    def case_list(self):
+        """Cases with a 40pc volume, sorted"""
+        return sorted(name for name, entry in self.cases.items()
+                      if any(volume.endswith('40pc.nii.gz') for volume in entry['volumes']))
+
+
+class CasePrefetcher:
+    """Decompresses the next pending case volumes on worker threads so loadCase can hand them off"""
+
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_cases=2, memory_budget_mb=2048, workers=2):
+        self.cache_dir = cache_dir
+        self.max_cases = max_cases
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CardiacAnnotatorPrefetch")
+        self.lock = threading.Lock()
+        self.queue = []              # cases currently targeted, in priority order
+        self.jobs = {}               # case -> (future, cancel_event, reserved_bytes)
+        self.cancelled = {}          # cancel_event -> reserved_bytes, cancelled jobs whose thread is still writing
+        self.ready = OrderedDict()   # case -> (decoded_path, nbytes)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def used_bytes(self):
+        with self.lock:
+            return self._used_bytes()
+
+    def _used_bytes(self):
+        ready_bytes = sum(nbytes for _, nbytes in self.ready.values())
+        reserved_bytes = sum(reserved for _, _, reserved in self.jobs.values())
+        return ready_bytes + reserved_bytes + sum(self.cancelled.values())
+
+    def set_queue(self, source_paths):
+        """Retarget the prefetcher at an ordered list of (case_name, source_path).
+
+        Jobs and decoded volumes for cases that dropped out of the first max_cases
+        entries are cancelled/discarded, new ones are submitted in order.
+        """
+        targets = list(source_paths)[:self.max_cases]
+        target_names = [case for case, _ in targets]
+        with self.lock:
+            self.queue = target_names
+            for case in list(self.jobs):
+                if case not in target_names:
+                    future, cancel_event, reserved = self.jobs.pop(case)
+                    cancel_event.set()
+                    if not future.cancel():
+                        # Running: its bytes are on disk until the thread notices and cleans up
+                        self.cancelled[cancel_event] = reserved
+            for case in list(self.ready):
+                if case not in target_names:
+                    self._discard_locked(case)
+            for case, source_path in targets:
+                if case in self.jobs or case in self.ready:
+                    continue
+                expected = self._decoded_size(source_path)
+                if expected is None or self._used_bytes() + expected > self.memory_budget:
+                    print(f"Prefetch skipped for {case} (memory budget reached)")
+                    continue
+                cancel_event = threading.Event()
+                future = self.executor.submit(self._decode, case, source_path, cancel_event)
+                self.jobs[case] = (future, cancel_event, expected)
+
+    def take(self, case_name, wait=True):
+        """Return the decoded path for case_name if prefetched (waiting for an in-flight job), else None
+
+        With wait=False an in-flight job is left running and None is returned, see has_case().
+        """
+        with self.lock:
+            job = self.jobs.get(case_name)
+            if job and not wait and not job[0].done():
+                return None
+        if job:
+            try:
+                job[0].result()
+            except Exception as e:
+                print(f"Prefetch of {case_name} failed: {e}")
+        with self.lock:
+            entry = self.ready.get(case_name)
+            if entry:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def has_case(self, case_name):
+        """True if case_name is decoding or decoded (a later take() returns its path unless the job fails)"""
+        with self.lock:
+            return case_name in self.jobs or case_name in self.ready
+
+    def discard(self, case_name):
+        with self.lock:
+            self._discard_locked(case_name)
+
+    def _discard_locked(self, case_name):
+        entry = self.ready.pop(case_name, None)
+        if entry and os.path.exists(entry[0]):
+            os.remove(entry[0])
+
+    def counters_text(self):
+        with self.lock:
+            used_mb = self._used_bytes() / (1024 * 1024)
+            return f"Prefetch: {self.hits} hits / {self.misses} misses ({len(self.ready)} ready, {used_mb:.0f} MB)"
+
+    def shutdown(self):
+        with self.lock:
+            for future, cancel_event, _ in self.jobs.values():
+                cancel_event.set()
+                future.cancel()
+            self.jobs.clear()
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for case in list(self.ready):
+                self._discard_locked(case)
+
+    def _decoded_size(self, source_path):
+        # gzip stores the uncompressed size (mod 2**32) in its last four bytes
+        try:
+            with open(source_path, 'rb') as f:
+                f.seek(-4, os.SEEK_END)
+                return int.from_bytes(f.read(4), 'little')
+        except OSError:
+            return None
+
+    def _decode(self, case_name, source_path, cancel_event):
+        # Own file names per job: a cancelled job may still be writing when the case is queued again
+        decoded_stem = os.path.basename(source_path)[:-len('.nii.gz')]
+        partial_path = None
+        nbytes = 0
+        try:
+            fd, partial_path = tempfile.mkstemp(prefix=decoded_stem + ".", suffix=".nii.part", dir=self.cache_dir)
+            decoded_path = partial_path[:-len('.part')]
+            with gzip.open(source_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                while True:
+                    if cancel_event.is_set():
+                        raise concurrent.futures.CancelledError()
+                    chunk = src.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    nbytes += len(chunk)
+            os.replace(partial_path, decoded_path)
+        except BaseException:
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
+            with self.lock:
+                if self.jobs.get(case_name, (None, cancel_event))[1] is cancel_event:
+                    self.jobs.pop(case_name, None)
+                self.cancelled.pop(cancel_event, None)
+            raise
+        with self.lock:
+            current = self.jobs.get(case_name)
+            if current is None or current[1] is not cancel_event:
+                # Cancelled while finishing up
+                os.remove(decoded_path)
+                self.cancelled.pop(cancel_event, None)
+                return None
+            self.jobs.pop(case_name)
+            self.ready[case_name] = (decoded_path, nbytes)
+        print(f"Prefetched {case_name} ({nbytes / (1024 * 1024):.0f} MB)")
+        return decoded_path
+
+
+class AnnotationDataset:
+    """One dataset folder: case index, progress store and case leases, usable without Slicer"""
+
+    def __init__(self, main_folder, local_wal=False, lease_ttl=120, annotator=None):
+        self.main_folder = main_folder
+        self.csv_path = os.path.join(main_folder, "progress_tracking.csv")
+
+        # Open or create the progress store, seeding it from an existing CSV
+        self.progress_store = ProgressStore(os.path.join(main_folder, "progress_tracking.db"),
+                                            journal_mode="WAL" if local_wal else "DELETE")
+        if self.progress_store.is_new and os.path.exists(self.csv_path):
+            print(f"Importing progress from {self.csv_path}")
+            self.progress_store.import_csv(self.csv_path)
+
+        # Leases keep other workstations off the case being annotated here
+        self.lease_manager = CaseLeaseManager(main_folder, ttl=lease_ttl, annotator=annotator)
+        self.case_index = CaseIndex(main_folder)
+
+    def refresh(self):
+        """Pick up cases added to the dataset since the last run, returns the sorted case list"""
+        case_list = self.case_index.refresh()
+        added = self.progress_store.add_cases(case_list)
+        if added:
+            print(f"Added {added} new cases to progress tracking")
+        return case_list
+
+    def next_cases(self):
+        """in_progress cases first, then not_started, skipping cases reserved by other annotators"""
+        in_progress = self.progress_store.case_ids('in_progress')
+        not_started = self.progress_store.case_ids('not_started')
+        leased = self.lease_manager.leased_by_others()
+        return [case for case in in_progress + not_started if case not in leased]
+
+    def start_case(self, case_name):
+        """First time a case is opened: not_started -> in_progress with the annotator name"""
+        self.progress_store.update(case_name, expected_status='not_started', Status='in_progress',
+                                   Date_Started=time.strftime("%Y-%m-%d %H:%M:%S"),
+                                   Annotator=self.lease_manager.annotator)
+
+    def complete_case(self, case_name, landmark_minutes):
+        """Store the landmark time and completion, then hand the case back"""
+        row = self.progress_store.get(case_name)
+        if row:
+            row['Landmarks'] = landmark_minutes
+            total_time = sum(int(row[col] or 0) for col in ACTIVITY_COLUMNS)
+            self.progress_store.update(case_name,
+                                       Landmarks=landmark_minutes,
+                                       Status='completed',
+                                       Total_Time_minutes=total_time,
+                                       Date_Completed=time.strftime("%Y-%m-%d %H:%M:%S"))
+        # Completed cases are no longer reserved
+        self.lease_manager.release(case_name)
+
+    def volume_path(self, case_name):
+        return volume_path(self.main_folder, case_name)
+
+    def landmarks_path(self, case_name):
+        return landmarks_path(self.main_folder, case_name)
+
+    def log_path(self, case_name):
+        return log_path(self.main_folder, case_name)
+
+    def export_csv(self):
+        """Write progress_tracking.csv from the store. The store is the record, the CSV is only
+        exported on close (and by the batch jobs), not on every status change."""
+        self.progress_store.export_csv(self.csv_path)
+
+    def close(self):
+        self.lease_manager.release_all()
+        self.export_csv()
+        self.progress_store.close()
@@ -0,0 +1,141 @@
+"""Columnar landmark store of a dataset: one set of .npy arrays for all cases, np.load(mmap_mode='r') friendly.
+
+    case_ids.npy        (n,) case names
+    points.npy          (n, 8, 3) float32 LPS positions of the point landmarks, NaN when missing
+    point_locked.npy    (n, 8) bool
+    spline_offsets.npy  (n + 1,) int64, spline points of case i are spline_points[offsets[i]:offsets[i + 1]]
+    spline_points.npy   (m, 3) float32 LPS
+    spline_locked.npy   (n,) bool, all spline points locked
+    manifest.json       landmark names and the (mtime, size) of each source file, for incremental updates
+"""
+import concurrent.futures
+import contextlib
+import json
+import os
+
+import numpy as np
+
+from .dataset import landmarks_path
+from .markups import LANDMARK_TYPES, MarkupsSerializer
+
+POINT_LANDMARKS = LANDMARK_TYPES[:-1]
+ARRAY_NAMES = ['case_ids', 'points', 'point_locked', 'spline_offsets', 'spline_points', 'spline_locked']
+
+
+def _lps_positions(markup):
+    positions = np.array([point.get("position", [np.nan] * 3) for point in markup.get("controlPoints", [])],
+                         dtype=np.float64).reshape(-1, 3)
+    if markup.get("coordinateSystem", "LPS") == "RAS":
+        positions[:, :2] *= -1
+    return positions
+
+
+def parse_landmarks_file(path):
+    """Process pool worker: landmarks file -> (points (8, 3), point_locked (8,), spline_points (k, 3), spline_locked)"""
+    points = np.full((len(POINT_LANDMARKS), 3), np.nan, dtype=np.float32)
+    point_locked = np.zeros(len(POINT_LANDMARKS), dtype=bool)
+    spline_points = np.empty((0, 3), dtype=np.float32)
+    spline_locked = False
+    try:
+        document = MarkupsSerializer.read(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {path}: {e}")
+        return points, point_locked, spline_points, spline_locked
+
+    points_markup = MarkupsSerializer.find_markup(document, "Fiducial")
+    if points_markup:
+        positions = _lps_positions(points_markup)
+        for i, point in enumerate(points_markup.get("controlPoints", [])):
+            if point.get("positionStatus", "defined") != "defined":
+                continue
+            label = point.get("label", "")
+            for j, name in enumerate(POINT_LANDMARKS):
+                # Same label matching as the annotation panel, first point of a landmark wins
+                if name in label and np.isnan(points[j, 0]):
+                    points[j] = positions[i]
+                    point_locked[j] = point.get("locked", False)
+
+    spline_markup = MarkupsSerializer.find_markup(document, "ClosedCurve")
+    if spline_markup and spline_markup.get("controlPoints"):
+        spline_points = _lps_positions(spline_markup).astype(np.float32)
+        spline_locked = all(point.get("locked", False) for point in spline_markup["controlPoints"])
+    return points, point_locked, spline_points, spline_locked
+
+
+def store_dir(main_folder):
+    return os.path.join(main_folder, "analytics", "landmarks")
+
+
+def load_landmark_store(main_folder, mmap_mode='r'):
+    """Arrays of the store by name (memory mapped by default), or None if nothing was exported yet"""
+    directory = store_dir(main_folder)
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        return None
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+
+
+def _save_array(directory, name, array):
+    temp_path = os.path.join(directory, f".{name}.tmp.npy")
+    np.save(temp_path, array)
+    os.replace(temp_path, os.path.join(directory, f"{name}.npy"))
+
+
+def export_landmarks(dataset, statuses=('completed',), workers=None, executor=None):
+    """Write/update the columnar store for the cases of the given statuses, parsing only changed files.
+
+    Changed files are parsed on executor if given (Slicer passes its spawned pool), else on a
+    new process pool.
+
+    Returns (cases in the store, cases parsed this time).
+    """
+    directory = store_dir(dataset.main_folder)
+    os.makedirs(directory, exist_ok=True)
+
+    case_ids = [case for status in statuses for case in dataset.progress_store.case_ids(status)]
+    case_ids = sorted(case for case in case_ids if os.path.exists(landmarks_path(dataset.main_folder, case)))
+    stamps = {}
+    for case in case_ids:
+        stat = os.stat(landmarks_path(dataset.main_folder, case))
+        stamps[case] = [stat.st_mtime_ns, stat.st_size]
+
+    # Rows of the previous export that are still current
+    previous = {}
+    manifest_path = os.path.join(directory, "manifest.json")
+    store = load_landmark_store(dataset.main_folder, mmap_mode=None)
+    if store is not None:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("landmarks") == POINT_LANDMARKS:
+            offsets = store['spline_offsets']
+            for row, case in enumerate(store['case_ids'].tolist()):
+                if manifest['files'].get(case) == stamps.get(case):
+                    previous[case] = (store['points'][row], store['point_locked'][row],
+                                      store['spline_points'][offsets[row]:offsets[row + 1]], store['spline_locked'][row])
+
+    changed = [case for case in case_ids if case not in previous]
+    parsed = {}
+    if changed:
+        paths = [landmarks_path(dataset.main_folder, case) for case in changed]
+        with contextlib.nullcontext(executor) if executor else concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = dict(zip(changed, pool.map(parse_landmarks_file, paths, chunksize=32)))
+
+    rows = [previous[case] if case in previous else parsed[case] for case in case_ids]
+    spline_counts = [len(row[2]) for row in rows]
+    arrays = {
+        'case_ids': np.array(case_ids, dtype=str),
+        'points': np.stack([row[0] for row in rows]) if rows else np.empty((0, len(POINT_LANDMARKS), 3), dtype=np.float32),
+        'point_locked': np.stack([row[1] for row in rows]) if rows else np.empty((0, len(POINT_LANDMARKS)), dtype=bool),
+        'spline_offsets': np.concatenate([[0], np.cumsum(spline_counts)]).astype(np.int64),
+        'spline_points': np.concatenate([row[2] for row in rows]).astype(np.float32) if rows else np.empty((0, 3), dtype=np.float32),
+        'spline_locked': np.array([row[3] for row in rows], dtype=bool),
+    }
+    for name in ARRAY_NAMES:
+        _save_array(directory, name, arrays[name])
+
+    # Manifest last: a crash before this point just means a full re-parse next time
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({"landmarks": POINT_LANDMARKS, "files": stamps}, f)
+    os.replace(temp_path, manifest_path)
+    print(f"Landmark export: {len(case_ids)} cases, {len(changed)} parsed")
+    return len(case_ids), len(changed)
@@ -0,0 +1,508 @@
+"""Annotation logs: buffered text + JSON Lines writer and the landmark timing engine"""
+import atexit
+import concurrent.futures
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+
+class LogManager:
+    """Case annotation log; entries are queued and written in batches by a background thread.
+
+    Next to the human readable text log, every entry is also emitted as a typed record in a
+    JSON Lines event stream ("annotation events <case>.jsonl") for timing and analytics.
+    """
+
+    _instances = weakref.WeakSet()
+
+    # Text log line patterns -> (event type, field builder), used to backfill event streams
+    TEXT_EVENT_PATTERNS = [
+        (re.compile(r"^=== .* Annotation Log( \(continued\))? ===$"), "log_created", lambda m: {}),
+        (re.compile(r"^Case opened/loaded in Slicer$"), "case_opened", lambda m: {}),
+        (re.compile(r"^Case reopened \(previous session ended unexpectedly\)$"), "case_reopened", lambda m: {'clean': False}),
+        (re.compile(r"^Case reopened$"), "case_reopened", lambda m: {'clean': True}),
+        (re.compile(r"^Case completed and closed$"), "case_closed", lambda m: {'reason': "completed"}),
+        (re.compile(r"^Case closed \((.*)\)$"), "case_closed",
+         lambda m: {'reason': {"switched to another case": "switched", "session ended": "session_ended"}.get(m.group(1), m.group(1))}),
+        (re.compile(r"^Started (placing|editing) landmark: (.*)$"), "landmark_started",
+         lambda m: {'mode': m.group(1), 'landmark': m.group(2)}),
+        (re.compile(r"^Placed landmark: (.*)$"), "landmark_placed", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Auto-locked landmark: (.*)$"), "landmark_locked", lambda m: {'landmark': m.group(1), 'auto': True}),
+        (re.compile(r"^Locked landmark: (.*)$"), "landmark_locked", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Unlocked landmark: (.*)$"), "landmark_unlocked", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Auto-stopped \(selection changed\) landmark: (.*)$"), "landmark_stopped", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Reset landmark: (.*)$"), "landmark_reset", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Reset (Annulus Contour \(Spline\))$"), "landmark_reset", lambda m: {'landmark': m.group(1)}),
+        (re.compile(r"^Reset all landmarks system: all landmarks$"), "all_reset", lambda m: {}),
+        (re.compile(r"^Complete landmark: (.*) - Notes: (.*)$"), "landmark_completed",
+         lambda m: {'landmark': m.group(1), 'notes': m.group(2)}),
+        (re.compile(r"^Added spline point (\d+) at position \(([-\d.]+), ([-\d.]+), ([-\d.]+)\)$"), "spline_point_added",
+         lambda m: {'landmark': "Annulus Contour (Spline)", 'index': int(m.group(1)) - 1,
+                    'position': [float(m.group(2)), float(m.group(3)), float(m.group(4))]}),
+        (re.compile(r"^Started task: (.*)$"), "task_started", lambda m: {'task': m.group(1)}),
+        (re.compile(r"^Completed task: (.*) \((\d+) s\)$"), "task_completed",
+         lambda m: {'task': m.group(1), 'seconds': float(m.group(2))}),
+        (re.compile(r"^Warning: Incomplete work detected: (.*)$"), "incomplete_work",
+         lambda m: {'items': m.group(1).split(", ")}),
+    ]
+
+    def __init__(self, case_folder_path, case_name, flush_interval=2.0, flush_entries=50,
+                 fsync="close", max_queue=10000, max_log_bytes=1024 * 1024):
+        self.log_path = os.path.join(case_folder_path, f"annotation log {case_name}.txt")
+        self.events_path = self.events_path_for(self.log_path)
+        self.max_log_bytes = max_log_bytes
+        self.session_id = uuid.uuid4().hex[:12]
+        self.current_task = None
+        self.task_start_time = None
+        self.flush_interval = flush_interval
+        self.flush_entries = flush_entries
+        self.fsync = fsync  # "never", "close" or "flush"
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.files = {}  # stream path -> open file
+        self.writer_thread = None
+        self.writer_lock = threading.Lock()
+        self._instances.add(self)
+
+    @staticmethod
+    def events_path_for(log_path):
+        folder, name = os.path.split(log_path)
+        case_name = name[len("annotation log "):-len(".txt")]
+        return os.path.join(folder, f"annotation events {case_name}.jsonl")
+
+    def write_entry(self, message):
+        """Free text entry (recorded as a "note" event)"""
+        self.write_event("note", message)
+
+    def write_event(self, event_type, message, **fields):
+        """Write the human readable line and the matching typed event record"""
+        now = time.time()
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        log_line = f"{timestamp} - {message}\n"
+        record = {'t': round(now, 3), 'mono': round(time.monotonic(), 3), 'session': self.session_id,
+                  'type': event_type}
+        record.update(fields)
+        event_line = json.dumps(record, separators=(',', ':')) + "\n"
+
+        # Queued for the writer thread (blocks only if the queue is full)
+        self._ensure_writer()
+        self.queue.put((self.log_path, log_line))
+        self.queue.put((self.events_path, event_line))
+
+    @staticmethod
+    def read_last_line(path, block_size=4096):
+        """Last non-empty line of a file, reading backwards from the end"""
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            tail = b""
+            while position > 0:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                tail = f.read(read_size) + tail
+                stripped = tail.rstrip(b"\r\n")
+                if b"\n" in stripped:
+                    return stripped.rsplit(b"\n", 1)[1].decode('utf-8', 'replace').strip()
+            return tail.decode('utf-8', 'replace').strip()
+
+    @staticmethod
+    def archive_dir_for(path):
+        return os.path.join(os.path.dirname(path), "log_archive")
+
+    @classmethod
+    def archived_segments(cls, path):
+        """Gzipped archive segments of a log or event stream, oldest first"""
+        archive_dir = cls.archive_dir_for(path)
+        if not os.path.isdir(archive_dir):
+            return []
+        stem, ext = os.path.splitext(os.path.basename(path))
+        pattern = re.compile(re.escape(stem) + r"\.\d{4}" + re.escape(ext) + r"\.gz$")
+        return sorted(os.path.join(archive_dir, name) for name in os.listdir(archive_dir) if pattern.match(name))
+
+    @classmethod
+    def segments(cls, path):
+        """Archived segments followed by the live file (if present)"""
+        live = [path] if os.path.exists(path) else []
+        return cls.archived_segments(path) + live
+
+    @staticmethod
+    def open_segment(path):
+        return gzip.open(path, 'rt') if path.endswith('.gz') else open(path, 'r')
+
+    def rotate_if_needed(self):
+        """Move the text log and event stream into log_archive/ (gzipped) once the log exceeds max_log_bytes"""
+        if os.path.getsize(self.log_path) < self.max_log_bytes:
+            return False
+        self.flush()
+        archive_dir = self.archive_dir_for(self.log_path)
+        os.makedirs(archive_dir, exist_ok=True)
+        sequence = len(self.archived_segments(self.log_path)) + 1
+        for path in (self.log_path, self.events_path):
+            if not os.path.exists(path):
+                continue
+            stem, ext = os.path.splitext(os.path.basename(path))
+            archive_path = os.path.join(archive_dir, f"{stem}.{sequence:04d}{ext}.gz")
+            with open(path, 'rb') as src, gzip.open(archive_path + ".tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(archive_path + ".tmp", archive_path)
+            os.remove(path)
+        print(f"Archived annotation log segment {sequence} of {self.log_path}")
+        return True
+
+    @classmethod
+    def parse_text_line(cls, line):
+        """Typed event for one text log line, or None if it has no timestamp"""
+        if " - " not in line:
+            return None
+        timestamp_str, content = line.rstrip("\n").split(" - ", 1)
+        try:
+            t = time.mktime(time.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            return None
+        content = content.strip()
+        record = {'t': t, 'mono': None, 'session': None, 'type': "note"}
+        for pattern, event_type, build_fields in cls.TEXT_EVENT_PATTERNS:
+            match = pattern.match(content)
+            if match:
+                record['type'] = event_type
+                record.update(build_fields(match))
+                break
+        else:
+            record['message'] = content
+        return record
+
+    @classmethod
+    def backfill_events(cls, log_path, events_path=None):
+        """Convert an existing text log into a structured event stream. Returns the number of records."""
+        events_path = events_path or cls.events_path_for(log_path)
+        count = 0
+        temp_path = events_path + ".tmp"
+        with open(log_path, 'r') as src, open(temp_path, 'w') as dst:
+            for line in src:
+                record = cls.parse_text_line(line)
+                if record is None:
+                    continue
+                record['backfilled'] = True
+                dst.write(json.dumps(record, separators=(',', ':')) + "\n")
+                count += 1
+        os.replace(temp_path, events_path)
+        print(f"Backfilled {count} events from {log_path}")
+        return count
+
+    @classmethod
+    def read_events(cls, events_path):
+        """Typed records of an event stream, including its archived segments"""
+        for segment in cls.segments(events_path):
+            with cls.open_segment(segment) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue  # Torn last line after a crash
+
+    def flush(self):
+        """Block until every entry queued so far is on disk.
+
+        Raises the OSError of a failed write; the entries stay queued and are retried.
+        """
+        if not (self.writer_thread and self.writer_thread.is_alive()):
+            return
+        done = concurrent.futures.Future()
+        self.queue.put(done)
+        done.result()
+
+    def close(self):
+        """Flush, stop the writer thread and close the file (writing again restarts it)"""
+        with self.writer_lock:
+            thread = self.writer_thread
+            if not (thread and thread.is_alive()):
+                return
+            self.queue.put(None)
+        thread.join()
+
+    @classmethod
+    def close_all(cls):
+        for manager in list(cls._instances):
+            manager.close()
+
+    def _ensure_writer(self):
+        with self.writer_lock:
+            if self.writer_thread and self.writer_thread.is_alive():
+                return
+            self.writer_thread = threading.Thread(target=self._writer_loop, name="CardiacAnnotatorLog", daemon=True)
+            self.writer_thread.start()
+
+    def _writer_loop(self):
+        pending = OrderedDict()  # stream path -> lines
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            waiters = []
+            if pending:
+                # Entries waiting: wake up when they are due
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            else:
+                # Nothing to write, sleep until something is queued
+                timeout = None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ""
+            # Drain whatever else is already queued
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, concurrent.futures.Future):
+                    waiters.append(item)
+                elif item:
+                    pending.setdefault(item[0], []).append(item[1])
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            due = time.monotonic() - last_flush >= self.flush_interval
+            pending_count = sum(len(lines) for lines in pending.values())
+            errors = []
+            if pending_count and (waiters or stopping or due or pending_count >= self.flush_entries):
+                sync = self.fsync == "flush" or (stopping and self.fsync == "close")
+                for path in list(pending):
+                    error = self._write_pending(path, pending[path], sync=sync)
+                    if error is None:
+                        del pending[path]
+                    else:
+                        errors.append(error)
+                last_flush = time.monotonic()
+            # A flush only succeeds once its entries are written
+            for waiter in waiters:
+                if errors:
+                    waiter.set_exception(errors[0])
+                else:
+                    waiter.set_result(None)
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def _write_pending(self, path, lines, sync=False):
+        """Append lines to the stream, returns None on success or the OSError"""
+        try:
+            f = self.files.get(path)
+            if f is None:
+                # Create file if it doesn't exist, append if it does
+                f = self.files[path] = open(path, 'a')
+            f.write("".join(lines))
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+            return None
+        except OSError as e:
+            # Keep the entries and retry on the next flush
+            print(f"Could not write annotation log {path}: {e}")
+            f = self.files.pop(path, None)
+            if f:
+                f.close()
+            return e
+
+    def open_case(self, case_name):
+        if os.path.exists(self.log_path) and not os.path.exists(self.events_path):
+            # Log predates the structured stream - convert its history first
+            self.backfill_events(self.log_path, self.events_path)
+        if not os.path.exists(self.log_path):
+            # New log file
+            self.write_event("log_created", f"=== {case_name} Annotation Log ===")
+            self.write_event("case_opened", "Case opened/loaded in Slicer")
+        else:
+            # Existing log - check if previous session ended cleanly (only the tail is read)
+            last_line = self.read_last_line(self.log_path)
+
+            if last_line:
+                # Archive old sessions once the live log gets large
+                if self.rotate_if_needed():
+                    self.write_event("log_created", f"=== {case_name} Annotation Log (continued) ===")
+                if not ("case closed" in last_line.lower() or "session ended" in last_line.lower() or "completed and closed" in last_line.lower()):
+                    # Previous session ended abruptly
+                    self.write_event("case_reopened", "Case reopened (previous session ended unexpectedly)", clean=False)
+                else:
+                    # Previous session ended cleanly
+                    self.write_event("case_reopened", "Case reopened", clean=True)
+            else:
+                # Empty file
+                self.write_event("log_created", f"=== {case_name} Annotation Log ===")
+                self.write_event("case_opened", "Case opened/loaded in Slicer")
+
+    def close_case(self, reason="switched"):
+        if reason == "switched":
+            self.write_event("case_closed", f"Case closed (switched to another case)", reason=reason)
+        elif reason == "completed":
+            self.write_event("case_closed", "Case completed and closed", reason=reason)
+        elif reason == "session_ended":
+            self.write_event("case_closed", "Case closed (session ended)", reason=reason)
+        else:
+            self.write_event("case_closed", f"Case closed ({reason})", reason=reason)
+        self.close()
+
+    def start_task(self, task_name):
+        """Start timing a task and write its "Started task" entry"""
+        self.current_task = task_name
+        self.task_start_time = time.monotonic()
+        self.write_event("task_started", f"Started task: {task_name}", task=task_name)
+
+    def complete_task(self):
+        """Write the "Completed task" entry of the running task, returns its duration in seconds (None if none runs)"""
+        if self.current_task is None:
+            return None
+        seconds = time.monotonic() - self.task_start_time
+        self.write_event("task_completed", f"Completed task: {self.current_task} ({seconds:.0f} s)",
+                         task=self.current_task, seconds=round(seconds, 3))
+        self.current_task = None
+        self.task_start_time = None
+        return seconds
+
+
+class LandmarkTimingEngine:
+    """Streaming landmark timing over annotation logs.
+
+    Results are cached per stream keyed on (size, mtime, inode) and parsing resumes from the
+    last complete line, so a recompute after a few new entries only reads the new tail.
+    Immutable archived segments are parsed once.
+    """
+
+    TEXT_PATTERN = re.compile(
+        rb"^(\d{4}-\d{2}-\d{2} \d{2}):(\d{2}):(\d{2}) - (started (?:placing|editing) landmark|placed landmark): (.*?)\s*$",
+        re.IGNORECASE)
+
+    def __init__(self):
+        self.live_cache = {}     # stream path -> {'archive_key', 'signature', 'offset', 'state'}
+        self.archive_cache = {}  # archive key -> state after the archived segments
+        self.hour_cache = {}     # "YYYY-mm-dd HH" -> epoch seconds
+
+    def landmark_times(self, log_path):
+        """Seconds spent per landmark (start -> placement), over all segments of the case log"""
+        log_manager = LogManager
+        events_path = log_manager.events_path_for(log_path)
+        if log_manager.segments(events_path):
+            path, parse_line = events_path, self._parse_event_line
+        else:
+            path, parse_line = log_path, self._parse_text_line
+
+        archives = log_manager.archived_segments(path)
+        archive_key = tuple((archive, os.path.getsize(archive), os.path.getmtime(archive)) for archive in archives)
+        entry = self.live_cache.get(path)
+        if entry is None or entry['archive_key'] != archive_key:
+            entry = self._fresh_entry(archive_key, archives, parse_line)
+
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature = (stat.st_size, stat.st_mtime, stat.st_ino)
+            if entry['signature'] and (stat.st_ino != entry['signature'][2] or stat.st_size < entry['offset']):
+                # Replaced or truncated - start over from the archived state
+                entry = self._fresh_entry(archive_key, archives, parse_line)
+            if signature != entry['signature']:
+                entry['offset'] = self._parse_segment(path, entry['offset'], entry['state'], parse_line)
+                entry['signature'] = signature
+        self.live_cache[path] = entry
+        return dict(entry['state']['times'])
+
+    def _fresh_entry(self, archive_key, archives, parse_line):
+        state = self.archive_cache.get(archive_key)
+        if state is None:
+            state = self._new_state()
+            for archive in archives:
+                self._parse_segment(archive, 0, state, parse_line)
+            self.archive_cache[archive_key] = state
+        return {'archive_key': archive_key, 'signature': None, 'offset': 0, 'state': self._copy_state(state)}
+
+    @staticmethod
+    def _new_state():
+        return {'starts': {}, 'times': {}}
+
+    @staticmethod
+    def _copy_state(state):
+        return {'starts': dict(state['starts']), 'times': dict(state['times'])}
+
+    def _parse_segment(self, path, offset, state, parse_line):
+        """Parse complete lines from offset on; returns the offset after the last complete line"""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            if offset:
+                f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Still being written, picked up next time
+                offset += len(raw)
+                parse_line(raw, state)
+        return offset
+
+    def _apply(self, state, is_start, landmark_name, t, mono=None, session=None):
+        """t (wall clock) is the fallback; within one session the monotonic stamps give the duration,
+        so a clock adjustment during the session cannot make it negative or inflated"""
+        if is_start:
+            state['starts'][landmark_name] = (t, mono, session)
+        elif landmark_name in state['starts']:
+            start_t, start_mono, start_session = state['starts'][landmark_name]
+            if mono is not None and start_mono is not None and session == start_session:
+                duration = mono - start_mono
+            else:
+                # Text logs, backfilled records, or started in an earlier session (monotonic clocks differ)
+                duration = t - start_t
+            state['times'][landmark_name] = state['times'].get(landmark_name, 0) + duration
+
+    def _parse_event_line(self, raw, state):
+        # Cheap byte test before decoding JSON, most records are not landmark events
+        if b'"landmark_started"' not in raw and b'"landmark_placed"' not in raw:
+            return
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        event_type = event.get('type')
+        if event_type in ('landmark_started', 'landmark_placed') and event.get('landmark'):
+            self._apply(state, event_type == 'landmark_started', event['landmark'], event['t'],
+                        event.get('mono'), event.get('session'))
+
+    def _parse_text_line(self, raw, state):
+        match = self.TEXT_PATTERN.match(raw)
+        if not match:
+            return
+        hour_text, minutes, seconds, kind, landmark_name = match.groups()
+        self._apply(state, kind[0] in b"sS", landmark_name.decode('utf-8', 'replace'),
+                    self._hour_start(hour_text) + int(minutes) * 60 + int(seconds))
+
+    def _hour_start(self, hour_text):
+        # Fixed "YYYY-mm-dd HH" prefix; mktime once per hour keeps DST transitions exact
+        hour_start = self.hour_cache.get(hour_text)
+        if hour_start is None:
+            hour_start = time.mktime((int(hour_text[0:4]), int(hour_text[5:7]), int(hour_text[8:10]),
+                                      int(hour_text[11:13]), 0, 0, 0, 0, -1))
+            self.hour_cache[hour_text] = hour_start
+        return hour_start
+
+
+# Worker state for process pool jobs (one timing engine per worker process)
+_worker_timing_engine = None
+
+
+def case_landmark_times(job):
+    """Process pool worker: (case_name, log_path) -> (case_name, {landmark: seconds})"""
+    global _worker_timing_engine
+    if _worker_timing_engine is None:
+        _worker_timing_engine = LandmarkTimingEngine()
+    case_name, log_path = job
+    try:
+        return case_name, _worker_timing_engine.landmark_times(log_path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read annotation log of {case_name}: {e}")
+        return case_name, {}
+
+
+# Queued annotation log entries must reach disk on normal shutdown
+atexit.register(LogManager.close_all)
@@ -0,0 +1,332 @@
+"""Landmark markups: combined JSON I/O, point-level journal and label index (no Slicer needed)"""
+import bisect
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+SPLINE_LANDMARK = "Annulus Contour (Spline)"
+
+# vtk.VTK_INT, without importing VTK here
+VTK_INT = 6
+
+LANDMARK_TYPES = [
+    "Left Coronary Cusp Nadir",
+    "Right Coronary Cusp Nadir", 
+    "Non Coronary Cusp Nadir",
+    "Right-Left Commissure",
+    "Right-Non Commissure",
+    "Left-Non Commissure",
+    "Left Coronary Ostium Base",
+    "Right Coronary Ostium Base",
+    SPLINE_LANDMARK
+]
+
+
+class LandmarkIndex:
+    """Landmark name -> control point indices, lock and position status of the point markups node.
+
+    A modified control point (label, lock, position status) only updates the entries of that
+    point. Added or removed points shift the indices, those mark the index stale and the next
+    query rebuilds it in one pass.
+    """
+
+    OBSERVED_EVENTS = ['PointAddedEvent', 'PointRemovedEvent']
+    # These carry the index of the control point as call data
+    POINT_EVENTS = ['PointModifiedEvent', 'PointPositionDefinedEvent', 'PointPositionUndefinedEvent']
+
+    def __init__(self, landmark_names):
+        self.landmark_names = landmark_names
+        self.node = None
+        self.observer_tags = []
+        self.points = []           # per control point: (label, locked, defined)
+        self.landmark_points = {}  # landmark name -> sorted control point indices
+        self.defined_counts = {}   # landmark name -> number of its points with a defined position
+        self.label_counts = Counter()
+        self.indexed_points = 0
+        self.stale = True
+        self.rebuild_count = 0
+        self.update_count = 0
+
+    def attach(self, node):
+        if node is self.node:
+            return
+        self.detach()
+        self.node = node
+        self.stale = True
+        if node:
+            self.observer_tags = ([node.AddObserver(getattr(node, event), self.onNodeChanged) for event in self.OBSERVED_EVENTS] +
+                                  [node.AddObserver(getattr(node, event), self.onPointModified) for event in self.POINT_EVENTS])
+
+    def detach(self):
+        if self.node:
+            for tag in self.observer_tags:
+                self.node.RemoveObserver(tag)
+        self.node = None
+        self.observer_tags = []
+        self._clear()
+
+    def onNodeChanged(self, caller, event):
+        self.stale = True
+
+    def onPointModified(self, caller, event, index=None):
+        if self.stale or index is None or not 0 <= index < len(self.points) or len(self.points) != caller.GetNumberOfControlPoints():
+            self.stale = True
+            return
+        self._unindex(index)
+        self.points[index] = self._read_point(index)
+        self._index(index)
+        self.update_count += 1
+
+    # VTK passes the point index to observers that declare an int call data type (vtk.VTK_INT)
+    onPointModified.CallDataType = VTK_INT
+
+    def _clear(self):
+        self.points = []
+        self.landmark_points = {name: [] for name in self.landmark_names}
+        self.defined_counts = {name: 0 for name in self.landmark_names}
+        self.label_counts = Counter()
+
+    def _read_point(self, i):
+        return (self.node.GetNthControlPointLabel(i), bool(self.node.GetNthControlPointLocked(i)),
+                self.node.GetNthControlPointPositionStatus(i) == self.node.PositionDefined)
+
+    def _index(self, i):
+        label, _, defined = self.points[i]
+        self.label_counts[label] += 1
+        for name in self.landmark_names:
+            if name in label:
+                bisect.insort(self.landmark_points[name], i)
+                self.defined_counts[name] += defined
+
+    def _unindex(self, i):
+        label, _, defined = self.points[i]
+        self.label_counts[label] -= 1
+        for name in self.landmark_names:
+            if name in label:
+                self.landmark_points[name].remove(i)
+                self.defined_counts[name] -= defined
+
+    def _refresh(self):
+        # The point count check also catches bulk removals that were not reported point by point
+        if not self.node:
+            return
+        if not self.stale and self.indexed_points == self.node.GetNumberOfControlPoints():
+            return
+        self._clear()
+        num_points = self.node.GetNumberOfControlPoints()
+        self.points = [self._read_point(i) for i in range(num_points)]
+        for i in range(num_points):
+            self._index(i)
+        self.indexed_points = num_points
+        self.stale = False
+        self.rebuild_count += 1
+
+    def get(self, landmark_name):
+        self._refresh()
+        indices = self.landmark_points.get(landmark_name, [])
+        return {'indices': list(indices),
+                'locked': bool(indices) and self.points[indices[0]][1],
+                'defined': self.defined_counts.get(landmark_name, 0) > 0}
+
+    def has_label(self, label):
+        self._refresh()
+        return self.label_counts[label] > 0
+
+
+class MarkupsSerializer:
+    """Combined landmarks + annulus spline markups JSON, built from node snapshots and written atomically"""
+
+    SCHEMA = "https://raw.githubusercontent.com/slicer/slicer/master/Modules/Loadable/Markups/Resources/Schema/markups-schema-v1.0.3.json#"
+    POSITION_STATUS = {0: "undefined", 1: "preview", 2: "defined", 3: "missing"}
+
+    @classmethod
+    def snapshot_node(cls, node, markup_type):
+        """Plain dict copy of a markups node (positions converted from RAS to LPS)"""
+        control_points = []
+        for i in range(node.GetNumberOfControlPoints()):
+            r, a, s = node.GetNthControlPointPosition(i)
+            control_points.append({
+                "id": node.GetNthControlPointID(i),
+                "label": node.GetNthControlPointLabel(i),
+                "description": node.GetNthControlPointDescription(i),
+                "associatedNodeID": node.GetNthControlPointAssociatedNodeID(i),
+                "position": [-r, -a, s],
+                "selected": bool(node.GetNthControlPointSelected(i)),
+                "locked": bool(node.GetNthControlPointLocked(i)),
+                "visibility": bool(node.GetNthControlPointVisibility(i)),
+                "positionStatus": cls.POSITION_STATUS.get(node.GetNthControlPointPositionStatus(i), "defined"),
+            })
+        return {
+            "type": markup_type,
+            "name": node.GetName(),
+            "coordinateSystem": "LPS",
+            "coordinateUnits": "mm",
+            "locked": bool(node.GetLocked()),
+            "fixedNumberOfControlPoints": False,
+            "labelFormat": "%N-%d",
+            "controlPoints": control_points,
+            "measurements": [],
+        }
+
+    @classmethod
+    def snapshot(cls, markups_node, spline_node):
+        """Build the combined document on the main thread, before any file I/O"""
+        markups = []
+        if markups_node:
+            markups.append(cls.snapshot_node(markups_node, "Fiducial"))
+        if spline_node:
+            markups.append(cls.snapshot_node(spline_node, "ClosedCurve"))
+        return {"@schema": cls.SCHEMA, "markups": markups}
+
+    @staticmethod
+    def write(document, path):
+        """Single write to a temp file next to the target, then atomic rename"""
+        fd, temp_path = tempfile.mkstemp(prefix=".landmarks_", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(document, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def read(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def find_markup(document, markup_type):
+        for markup in document.get("markups", []):
+            if markup.get("type") == markup_type:
+                return markup
+        return None
+
+    @classmethod
+    def apply(cls, markup, node):
+        """Fill a markups node from one markup of the document"""
+        flip = markup.get("coordinateSystem", "LPS") == "LPS"
+        status_codes = {name: code for code, name in cls.POSITION_STATUS.items()}
+        was_modifying = node.StartModify()
+        node.RemoveAllControlPoints()
+        for point in markup.get("controlPoints", []):
+            x, y, z = point.get("position", [0.0, 0.0, 0.0])
+            i = node.AddControlPoint([-x, -y, z] if flip else [x, y, z], point.get("label", ""))
+            if point.get("description"):
+                node.SetNthControlPointDescription(i, point["description"])
+            node.SetNthControlPointLocked(i, point.get("locked", False))
+            node.SetNthControlPointVisibility(i, point.get("visibility", True))
+            if status_codes.get(point.get("positionStatus", "defined"), 2) != 2:
+                node.UnsetNthControlPointPosition(i)
+        node.SetLocked(markup.get("locked", False))
+        node.EndModify(was_modifying)
+
+
+class LandmarkJournal:
+    """Append-only point-level journal next to the landmarks file, replayed after a crash.
+
+    Each edit appends one small JSON line; a successful save drops the records it covers.
+    """
+
+    SPLINE_NAME = SPLINE_LANDMARK
+
+    def __init__(self, landmarks_path):
+        self.path = landmarks_path.replace('.mrk.json', '.journal.jsonl')
+        self.file = None
+        records = self.read()
+        self.count = len(records)
+        # Drop a torn last line so new records start on a clean line
+        if records and os.path.getsize(self.path) != sum(len(json.dumps(r)) + 1 for r in records):
+            self.rewrite(records)
+
+    def append(self, op, **fields):
+        record = {'op': op, 'time': time.time()}
+        record.update(fields)
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.count += 1
+
+    def read(self):
+        """Records in order; a torn last line from a crash is skipped"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def replay(self, markups_node, spline_node, create_spline_node):
+        """Apply the journal on top of the nodes loaded from the landmarks file"""
+        records = self.read()
+        for record in records:
+            op = record.get('op')
+            landmark = record.get('landmark')
+            if op == 'place':
+                markups_node.AddControlPoint(record['position'], record['label'])
+            elif op == 'spline_point':
+                if spline_node is None:
+                    spline_node = create_spline_node()
+                if record['index'] < spline_node.GetNumberOfControlPoints():
+                    spline_node.SetNthControlPointPosition(record['index'], *record['position'])
+                else:
+                    spline_node.AddControlPoint(record['position'])
+            elif op == 'lock' and landmark == self.SPLINE_NAME:
+                for i in range(spline_node.GetNumberOfControlPoints() if spline_node else 0):
+                    spline_node.SetNthControlPointLocked(i, record['locked'])
+            elif op == 'lock':
+                for i in range(markups_node.GetNumberOfControlPoints()):
+                    if landmark in markups_node.GetNthControlPointLabel(i):
+                        markups_node.SetNthControlPointLocked(i, record['locked'])
+            elif op == 'reset' and landmark == self.SPLINE_NAME:
+                if spline_node:
+                    spline_node.RemoveAllControlPoints()
+            elif op == 'reset':
+                for i in reversed(range(markups_node.GetNumberOfControlPoints())):
+                    if landmark in markups_node.GetNthControlPointLabel(i):
+                        markups_node.RemoveNthControlPoint(i)
+            elif op == 'reset_all':
+                markups_node.RemoveAllControlPoints()
+                if spline_node:
+                    spline_node.RemoveAllControlPoints()
+        return len(records), spline_node
+
+    def compact(self, upto):
+        """Drop the first `upto` records, they are in the landmarks file now"""
+        if upto <= 0:
+            return
+        self.rewrite(self.read()[upto:])
+
+    def rewrite(self, records):
+        self.close()
+        if records:
+            fd, temp_path = tempfile.mkstemp(prefix=".journal_", suffix=".tmp", dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+            os.replace(temp_path, self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self.count = len(records)
+
+    def discard(self):
+        """Changes were dropped on purpose, nothing to recover"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.count = 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,140 @@
+"""TAVI annulus and coronary height measurements, vectorized over cases.
+
+Inputs follow the columnar landmark store: points (n, 8, 3) in LANDMARK_TYPES order and the annulus
+spline as one ragged (m, 3) array with (n + 1) offsets. All lengths in mm, areas in mm2.
+"""
+import numpy as np
+
+from .export import export_landmarks, load_landmark_store
+from .markups import LANDMARK_TYPES
+from .progress import MEASUREMENT_COLUMNS
+
+LEFT_OSTIUM = LANDMARK_TYPES.index("Left Coronary Ostium Base")
+RIGHT_OSTIUM = LANDMARK_TYPES.index("Right Coronary Ostium Base")
+
+# Samples per spline segment (vtkCurveGenerator default) and caliper directions over 180 degrees
+SAMPLES_PER_SEGMENT = 10
+CALIPER_ANGLES = 180
+
+
+def densify_closed_cardinal_spline(control_points, samples=SAMPLES_PER_SEGMENT):
+    """(g, k, 3) closed curves -> (g, k * samples, 3) points on the periodic cubic spline Slicer draws
+
+    Same interpolation as vtkMRMLMarkupsClosedCurveNode with the cardinal spline curve type: a closed
+    vtkCardinalSpline per coordinate, parameterized by chord length and sampled uniformly along it.
+    """
+    g, k, _ = control_points.shape
+    chords = np.linalg.norm(np.roll(control_points, -1, axis=1) - control_points, axis=2)  # (g, k), h[i] = t[i+1] - t[i]
+    previous = np.roll(chords, 1, axis=1)
+
+    # Periodic second derivative system: h[i-1] M[i-1] + 2 (h[i-1] + h[i]) M[i] + h[i] M[i+1] = rhs[i]
+    rows = np.arange(k)
+    system = np.zeros((g, k, k))
+    system[:, rows, rows] = 2.0 * (previous + chords)
+    system[:, rows, (rows - 1) % k] += previous
+    system[:, rows, (rows + 1) % k] += chords
+    slopes = (np.roll(control_points, -1, axis=1) - control_points) / chords[:, :, None]
+    rhs = 6.0 * (slopes - np.roll(slopes, 1, axis=1))
+    second = np.linalg.solve(system, rhs)  # (g, k, 3)
+
+    # Uniform samples over the total length, located in their segments
+    knots = np.concatenate([np.zeros((g, 1)), np.cumsum(chords, axis=1)], axis=1)  # (g, k + 1)
+    t = knots[:, -1:] * np.arange(k * samples) / (k * samples)  # (g, s)
+    segment = np.clip((t[:, :, None] >= knots[:, None, :k]).sum(axis=2) - 1, 0, k - 1)
+    h = np.take_along_axis(chords, segment, axis=1)[:, :, None]
+    a = (np.take_along_axis(knots, segment + 1, axis=1) - t)[:, :, None]
+    b = h - a
+    take = lambda values, offset: np.take_along_axis(values, ((segment + offset) % k)[:, :, None], axis=1)
+    y0, y1, m0, m1 = take(control_points, 0), take(control_points, 1), take(second, 0), take(second, 1)
+    return (m0 * a ** 3 + m1 * b ** 3) / (6.0 * h) + (y0 / h - m0 * h / 6.0) * a + (y1 / h - m1 * h / 6.0) * b
+
+
+def fit_planes(points):
+    """Least squares planes of (g, k, 3) point sets -> centroids (g, 3), unit normals (g, 3)"""
+    centroids = points.mean(axis=1)
+    centered = points - centroids[:, None, :]
+    covariance = np.einsum('gki,gkj->gij', centered, centered)
+    _, vectors = np.linalg.eigh(covariance)
+    return centroids, vectors[:, :, 0]  # smallest eigenvalue
+
+
+def annulus_measurements(control_points):
+    """Perimeter, area and caliper diameters of (g, k, 3) closed annulus splines (same k per group)"""
+    dense = densify_closed_cardinal_spline(control_points)
+    centroids, normals = fit_planes(dense)
+
+    perimeter = np.linalg.norm(np.roll(dense, -1, axis=1) - dense, axis=2).sum(axis=1)
+
+    # In-plane basis and 2D coordinates of the dense curve
+    helper = np.where(np.abs(normals[:, :1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+    u = np.cross(normals, helper)
+    u /= np.linalg.norm(u, axis=1, keepdims=True)
+    v = np.cross(normals, u)
+    centered = dense - centroids[:, None, :]
+    x = np.einsum('gsc,gc->gs', centered, u)
+    y = np.einsum('gsc,gc->gs', centered, v)
+    area = 0.5 * np.abs((x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1))
+
+    # Caliper widths over all directions
+    angles = np.linspace(0.0, np.pi, CALIPER_ANGLES, endpoint=False)
+    projections = x[:, :, None] * np.cos(angles) + y[:, :, None] * np.sin(angles)  # (g, s, a)
+    widths = projections.max(axis=1) - projections.min(axis=1)
+    return {
+        'centroids': centroids,
+        'normals': normals,
+        'Annulus_perimeter_mm': perimeter,
+        'Annulus_area_mm2': area,
+        'Annulus_min_diameter_mm': widths.min(axis=1),
+        'Annulus_max_diameter_mm': widths.max(axis=1),
+    }
+
+
+def compute_measurements(points, spline_points, spline_offsets):
+    """Measurements of all cases -> {column: (n,) float64}, NaN where landmarks or the spline are missing"""
+    n = points.shape[0]
+    results = {name: np.full(n, np.nan) for name in MEASUREMENT_COLUMNS}
+    centroids = np.full((n, 3), np.nan)
+    normals = np.full((n, 3), np.nan)
+
+    # Cases with the same number of spline points are measured together
+    counts = np.diff(spline_offsets)
+    for count in np.unique(counts[counts >= 3]):
+        cases = np.flatnonzero(counts == count)
+        rows = spline_offsets[cases][:, None] + np.arange(count)
+        group = annulus_measurements(np.asarray(spline_points, dtype=np.float64)[rows])
+        centroids[cases] = group['centroids']
+        normals[cases] = group['normals']
+        for name in ('Annulus_perimeter_mm', 'Annulus_area_mm2', 'Annulus_min_diameter_mm', 'Annulus_max_diameter_mm'):
+            results[name][cases] = group[name]
+
+    results['Annulus_perimeter_diameter_mm'] = results['Annulus_perimeter_mm'] / np.pi
+    results['Annulus_area_diameter_mm'] = 2.0 * np.sqrt(results['Annulus_area_mm2'] / np.pi)
+
+    # Ostium base heights above the annulus plane
+    points = np.asarray(points, dtype=np.float64)
+    for name, index in (('LCA_height_mm', LEFT_OSTIUM), ('RCA_height_mm', RIGHT_OSTIUM)):
+        results[name] = np.abs(np.einsum('nc,nc->n', points[:, index] - centroids, normals))
+    return results
+
+
+def measure_case(points, spline_points):
+    """Single case: points (8, 3) with NaN rows for missing landmarks, spline (k, 3) -> {column: float}"""
+    spline_points = np.asarray(spline_points, dtype=np.float64).reshape(-1, 3)
+    results = compute_measurements(np.asarray(points, dtype=np.float64)[None],
+                                   spline_points, np.array([0, len(spline_points)]))
+    return {name: float(values[0]) for name, values in results.items()}
+
+
+def update_dataset_measurements(dataset, statuses=('completed',), workers=None, executor=None):
+    """Refresh the landmark store, measure every case in it and write the columns to the progress store"""
+    export_landmarks(dataset, statuses=statuses, workers=workers, executor=executor)
+    store = load_landmark_store(dataset.main_folder)
+    results = compute_measurements(store['points'], store['spline_points'], store['spline_offsets'])
+    dataset.progress_store.update_many([
+        dict({'Case_ID': case}, **{name: (None if np.isnan(results[name][row]) else round(float(results[name][row]), 2))
+                                   for name in MEASUREMENT_COLUMNS})
+        for row, case in enumerate(store['case_ids'].tolist())
+    ])
+    dataset.progress_store.export_csv(dataset.csv_path)
+    print(f"Measurements: {len(store['case_ids'])} cases")
+    return results
@@ -0,0 +1,98 @@
+"""Minimal NIfTI-1 reader (.nii and .nii.gz) for the background workers, no ITK needed.
+
+Returns voxels in (k, j, i) order like slicer.util.arrayFromVolume, with the IJK to RAS matrix
+Slicer would give the volume node.
+"""
+import gzip
+import struct
+
+import numpy as np
+
+HEADER_SIZE = 348
+
+DATATYPES = {
+    2: 'u1', 4: 'i2', 8: 'i4', 16: 'f4', 64: 'f8',
+    256: 'i1', 512: 'u2', 768: 'u4', 1024: 'i8', 1280: 'u8',
+}
+
+
+def _open(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def read_header(path):
+    """Parsed header dict of a NIfTI-1 file"""
+    with _open(path) as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path} is not a NIfTI file (truncated header)")
+    endian = '<' if struct.unpack('<i', raw[:4])[0] == HEADER_SIZE else '>'
+    if struct.unpack(endian + 'i', raw[:4])[0] != HEADER_SIZE:
+        raise ValueError(f"{path} is not a NIfTI-1 file")
+    dim = struct.unpack(endian + '8h', raw[40:56])
+    datatype = struct.unpack(endian + 'h', raw[70:72])[0]
+    if datatype not in DATATYPES:
+        raise ValueError(f"Unsupported NIfTI datatype {datatype} in {path}")
+    pixdim = struct.unpack(endian + '8f', raw[76:108])
+    return {
+        'endian': endian,
+        'shape': tuple(max(d, 1) for d in dim[1:4]),  # (i, j, k)
+        'dtype': np.dtype(endian + DATATYPES[datatype]),
+        'pixdim': pixdim,
+        'vox_offset': int(struct.unpack(endian + 'f', raw[108:112])[0]),
+        'scl_slope': struct.unpack(endian + 'f', raw[112:116])[0],
+        'scl_inter': struct.unpack(endian + 'f', raw[116:120])[0],
+        'qform_code': struct.unpack(endian + 'h', raw[252:254])[0],
+        'sform_code': struct.unpack(endian + 'h', raw[254:256])[0],
+        'quatern': struct.unpack(endian + '6f', raw[256:280]),
+        'srow': struct.unpack(endian + '12f', raw[280:328]),
+    }
+
+
+def ijk_to_ras(header):
+    """4x4 voxel to RAS matrix: sform if it is a proper rotation, else qform, else the spacing alone"""
+    pixdim = header['pixdim']
+    spacing = np.array([abs(v) or 1.0 for v in pixdim[1:4]])
+    if header['sform_code'] > 0:
+        matrix = np.eye(4)
+        matrix[:3] = np.array(header['srow']).reshape(3, 4)
+        # A sheared sform cannot be represented by a volume node, fall back to the qform like ITK
+        directions = matrix[:3, :3] / np.linalg.norm(matrix[:3, :3], axis=0)
+        if header['qform_code'] <= 0 or np.allclose(directions.T @ directions, np.eye(3), atol=1e-4):
+            return matrix
+    if header['qform_code'] > 0:
+        b, c, d, qx, qy, qz = header['quatern']
+        a = np.sqrt(max(0.0, 1.0 - (b * b + c * c + d * d)))
+        rotation = np.array([
+            [a * a + b * b - c * c - d * d, 2 * (b * c - a * d), 2 * (b * d + a * c)],
+            [2 * (b * c + a * d), a * a + c * c - b * b - d * d, 2 * (c * d - a * b)],
+            [2 * (b * d - a * c), 2 * (c * d + a * b), a * a + d * d - c * c - b * b],
+        ])
+        qfac = -1.0 if pixdim[0] < 0 else 1.0
+        matrix = np.eye(4)
+        matrix[:3, :3] = rotation * (spacing * np.array([1.0, 1.0, qfac]))
+        matrix[:3, 3] = (qx, qy, qz)
+        return matrix
+    return np.diag(list(spacing) + [1.0])
+
+
+def read_nifti(path):
+    """(array (k, j, i), ijk_to_ras 4x4) of a NIfTI-1 volume; scaled volumes come back as float32"""
+    header = read_header(path)
+    shape = header['shape']
+    count = shape[0] * shape[1] * shape[2]
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            f.seek(header['vox_offset'])
+            array = np.frombuffer(f.read(count * header['dtype'].itemsize), dtype=header['dtype'])
+    else:
+        array = np.fromfile(path, dtype=header['dtype'], count=count, offset=header['vox_offset'])
+    if array.size != count:
+        raise ValueError(f"{path} is truncated")
+    array = array.reshape(shape[::-1])
+    if header['dtype'].byteorder == '>':
+        array = array.astype(header['dtype'].newbyteorder('<'))
+    slope, inter = header['scl_slope'], header['scl_inter']
+    if slope and (slope != 1.0 or inter != 0.0):
+        array = array.astype(np.float32) * slope + inter
+    return array, ijk_to_ras(header)
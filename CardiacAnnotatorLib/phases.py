@@ -0,0 +1,112 @@
+"""Cardiac phases of a case (<case> <N>pc.nii.gz), decoded on demand into an LRU of voxel arrays.
+
+Only the annotated 40pc phase is opened with the case; the others are read on worker threads
+the first time they are shown and kept while they fit the memory budget.
+"""
+import concurrent.futures
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .dataset import case_folder
+from .nifti import read_nifti
+
+BASE_PHASE = 40
+
+
+def case_phases(case_name, volumes):
+    """{phase percent: file name} of the phase volumes in a case index volume list"""
+    pattern = re.compile(rf'^{re.escape(case_name)} (\d+)pc\.nii\.gz$')
+    phases = {}
+    for volume in volumes:
+        match = pattern.match(volume)
+        if match:
+            phases[int(match.group(1))] = volume
+    return dict(sorted(phases.items()))
+
+
+def phase_path(main_folder, case_name, phase):
+    return os.path.join(case_folder(main_folder, case_name), f'{case_name} {phase}pc.nii.gz')
+
+
+class PhaseCache:
+    """LRU of decoded phases keyed by (case, phase), bounded in bytes, filled by worker threads"""
+
+    def __init__(self, memory_budget_mb=3072, workers=2):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CardiacAnnotatorPhase")
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (array, ijk_to_ras)
+        self.jobs = {}                # key -> future
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def used_bytes(self):
+        with self.lock:
+            return sum(array.nbytes for array, _ in self.entries.values())
+
+    def get(self, key):
+        """(array, ijk_to_ras) if decoded, marking it most recently used, else None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, array, ijk_to_ras):
+        with self.lock:
+            self.entries[key] = (array, ijk_to_ras)
+            self.entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def request(self, key, path):
+        """Decode path in the background unless the phase is cached or already queued, returns the future or None"""
+        with self.lock:
+            if key in self.entries:
+                return None
+            future = self.jobs.get(key)
+            if future is None:
+                future = self.executor.submit(self._decode, key, path)
+                self.jobs[key] = future
+            return future
+
+    def counters_text(self):
+        with self.lock:
+            used_mb = sum(array.nbytes for array, _ in self.entries.values()) / (1024 * 1024)
+            return f"Phases: {self.hits} hits / {self.misses} misses ({len(self.entries)} decoded, {used_mb:.0f} MB)"
+
+    def shutdown(self):
+        with self.lock:
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs.clear()
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            self.entries.clear()
+
+    def _decode(self, key, path):
+        try:
+            array, ijk_to_ras = read_nifti(path)
+        finally:
+            with self.lock:
+                self.jobs.pop(key, None)
+        with self.lock:
+            self.entries[key] = (array, ijk_to_ras)
+            self._evict(keep=key)
+        return array, ijk_to_ras
+
+    def _evict(self, keep):
+        used = sum(array.nbytes for array, _ in self.entries.values())
+        for key in list(self.entries):
+            if used <= self.memory_budget:
+                break
+            if key != keep:
+                used -= self.entries.pop(key)[0].nbytes
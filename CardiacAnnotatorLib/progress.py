@@ -0,0 +1,361 @@
+"""Progress tracking store and case leases shared between workstations"""
+import getpass
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+MEASUREMENT_COLUMNS = [
+    'Annulus_perimeter_mm',
+    'Annulus_area_mm2',
+    'Annulus_min_diameter_mm',
+    'Annulus_max_diameter_mm',
+    'Annulus_perimeter_diameter_mm',
+    'Annulus_area_diameter_mm',
+    'LCA_height_mm',
+    'RCA_height_mm',
+]
+
+ACTIVITY_COLUMNS = ['Landmarks', 'Blood_pool', 'Left_coronary_ostium', 'Right_coronary_ostium',
+                    'Left_coronary_leaflet', 'Right_coronary_leaflet', 'Non_coronary_leaflet', 'Calcifications']
+
+
+class CaseLeaseManager:
+    """Lock-file leases reserving a case to one annotator, kept alive by a heartbeat thread
+
+    A lease file is only ever created (O_EXCL) and removed, never rewritten: the heartbeat is
+    its modification time. Breaking an expired lease or releasing one goes through a short lived
+    <case>.lock.break file, so a lease is never removed on the strength of an outdated read.
+    """
+
+    def __init__(self, main_folder, ttl=120, annotator=None):
+        self.lease_dir = os.path.join(main_folder, ".case_leases")
+        self.ttl = ttl
+        self.annotator = annotator or getpass.getuser()
+        self.owner = f"{self.annotator}@{socket.gethostname()}:{os.getpid()}"
+        self.held = set()
+        self.lost = set()  # cases taken over since the last take_lost()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = None
+        os.makedirs(self.lease_dir, exist_ok=True)
+
+    def _lease_path(self, case_name):
+        return os.path.join(self.lease_dir, f"{case_name}.lock")
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                lease = json.load(f)
+                # Last heartbeat is the file time, set by the owner from its own clock
+                lease['heartbeat'] = os.fstat(f.fileno()).st_mtime
+                return lease
+        except (OSError, ValueError):
+            # Missing, or caught between create and write - treat as not readable yet
+            return None
+
+    def _is_expired(self, lease):
+        return time.time() - lease.get('heartbeat', 0) > self.ttl
+
+    def _write_new(self, path):
+        """Create the lease file only if it does not exist (atomic on local and NFSv3+ filesystems)"""
+        now = time.time()
+        lease = {'owner': self.owner, 'annotator': self.annotator, 'acquired': now}
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(lease, f)
+        os.utime(path, (now, now))
+
+    def _lock_break(self, path):
+        """Take the <lease>.break mutex, False if someone else is breaking or releasing this lease"""
+        break_path = path + ".break"
+        try:
+            self._write_new(break_path)
+            return True
+        except FileExistsError:
+            pass
+        # A contender that died holding it; it is only ever held for a few file operations
+        try:
+            if time.time() - os.stat(break_path).st_mtime > self.ttl:
+                os.remove(break_path)
+        except OSError:
+            pass
+        return False
+
+    def _unlock_break(self, path):
+        try:
+            os.remove(path + ".break")
+        except OSError:
+            pass
+
+    def _remove_if(self, path, condition):
+        """Remove the lease file if condition(lease) holds on a fresh read, under the break mutex"""
+        if not self._lock_break(path):
+            return False
+        try:
+            lease = self._read(path)
+            if not lease or not condition(lease):
+                return False
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+        finally:
+            self._unlock_break(path)
+
+    def acquire(self, case_name):
+        """Reserve case_name for this annotator. Returns True if the lease is ours."""
+        path = self._lease_path(case_name)
+        for _ in range(2):
+            try:
+                self._write_new(path)
+                break
+            except FileExistsError:
+                pass
+            lease = self._read(path)
+            if lease is None:
+                return False
+            if lease.get('owner') == self.owner:
+                break
+            if not self._is_expired(lease):
+                return False
+            # Stale lease: remove it if it is still the same expired lease, then race for a new one
+            if not self._remove_if(path, lambda current: current.get('owner') == lease.get('owner')
+                                   and current.get('acquired') == lease.get('acquired')
+                                   and self._is_expired(current)):
+                return False
+        else:
+            return False
+        with self.lock:
+            self.held.add(case_name)
+            self.lost.discard(case_name)
+        self.heartbeat(case_name)
+        self._ensure_heartbeat_thread()
+        return True
+
+    def holds(self, case_name):
+        with self.lock:
+            return case_name in self.held
+
+    def take_lost(self):
+        """Cases whose lease was lost since the last call"""
+        with self.lock:
+            lost, self.lost = self.lost, set()
+        return lost
+
+    def release(self, case_name):
+        with self.lock:
+            self.held.discard(case_name)
+        self._remove_if(self._lease_path(case_name), lambda lease: lease.get('owner') == self.owner)
+
+    def release_all(self):
+        self.stop_event.set()
+        with self.lock:
+            held = list(self.held)
+        for case_name in held:
+            self.release(case_name)
+
+    def heartbeat(self, case_name):
+        """Refresh our lease timestamp; drops the case if another annotator took it over"""
+        path = self._lease_path(case_name)
+        lease = self._read(path)
+        if lease and lease.get('owner') == self.owner:
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                pass
+            # Touching a lease that changed hands in between only delays its expiry, check again
+            lease = self._read(path)
+        if lease and lease.get('owner') == self.owner:
+            return True
+        print(f"Lease on {case_name} lost")
+        with self.lock:
+            if case_name in self.held:
+                self.held.discard(case_name)
+                self.lost.add(case_name)
+        return False
+
+    def holder(self, case_name):
+        """Active lease info for case_name, or None if free/expired"""
+        lease = self._read(self._lease_path(case_name))
+        if lease and not self._is_expired(lease):
+            return lease
+        return None
+
+    def leased_by_others(self):
+        leased = set()
+        with os.scandir(self.lease_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.lock'):
+                    continue
+                lease = self._read(entry.path)
+                if lease and lease.get('owner') != self.owner and not self._is_expired(lease):
+                    leased.add(entry.name[:-len('.lock')])
+        return leased
+
+    def _ensure_heartbeat_thread(self):
+        if self.heartbeat_thread and self.heartbeat_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="CardiacAnnotatorLeases", daemon=True)
+        self.heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(self.ttl / 3):
+            with self.lock:
+                held = list(self.held)
+            for case_name in held:
+                try:
+                    self.heartbeat(case_name)
+                except OSError as e:
+                    print(f"Lease heartbeat for {case_name} failed: {e}")
+
+
+class ProgressStore:
+    """SQLite backed progress tracking, indexed on Case_ID; the CSV is an export of it"""
+
+    # Column name -> (SQL type, default for new cases), in CSV order
+    COLUMNS = OrderedDict([
+        ('Case_ID', ('TEXT PRIMARY KEY', None)),
+        ('Status', ('TEXT', 'not_started')),
+        ('Date_Started', ('TEXT', '')),
+        ('Date_Completed', ('TEXT', '')),
+        ('Annotator', ('TEXT', '')),
+        ('Verified', ('TEXT', 'No')),
+        ('Landmarks', ('INTEGER', 0)),
+        ('Blood_pool', ('INTEGER', 0)),
+        ('Left_coronary_ostium', ('INTEGER', 0)),
+        ('Right_coronary_ostium', ('INTEGER', 0)),
+        ('Left_coronary_leaflet', ('INTEGER', 0)),
+        ('Right_coronary_leaflet', ('INTEGER', 0)),
+        ('Non_coronary_leaflet', ('INTEGER', 0)),
+        ('Calcifications', ('INTEGER', 0)),
+        ('Total_Time_minutes', ('INTEGER', 0)),
+    ] + [(name, ('REAL', None)) for name in MEASUREMENT_COLUMNS])
+
+    def __init__(self, db_path, journal_mode="DELETE", timeout=30):
+        # WAL needs shared memory between the writers, which stations sharing the database over
+        # a network folder do not have, and the mode sticks to the database file for everyone.
+        # The rollback journal is the default; WAL is only for a dataset on a local disk.
+        self.db_path = db_path
+        self.is_new = not os.path.exists(db_path)
+        self.connection = sqlite3.connect(db_path, isolation_level=None, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        columns_sql = ", ".join(f'"{name}" {sql_type}' + ("" if default is None else f" DEFAULT {default!r}")
+                                for name, (sql_type, default) in self.COLUMNS.items())
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS progress ({columns_sql})")
+        # Stores created before a column was added get it appended
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(progress)")}
+        for name, (sql_type, default) in self.COLUMNS.items():
+            if name not in existing:
+                self.connection.execute(f'ALTER TABLE progress ADD COLUMN "{name}" {sql_type}'
+                                        + ("" if default is None else f" DEFAULT {default!r}"))
+        self.connection.execute("CREATE INDEX IF NOT EXISTS progress_status ON progress (Status)")
+
+    def close(self):
+        self.connection.close()
+
+    def transaction(self):
+        """Context manager running the enclosed statements as one atomic commit"""
+        return self._Transaction(self.connection)
+
+    class _Transaction:
+        def __init__(self, connection):
+            self.connection = connection
+
+        def __enter__(self):
+            self.connection.execute("BEGIN IMMEDIATE")
+            return self.connection
+
+        def __exit__(self, exc_type, exc, tb):
+            self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+            return False
+
+    def add_cases(self, case_list):
+        """Insert not_started rows for cases that are not tracked yet. Returns how many were added."""
+        names = [name for name in self.COLUMNS if name != 'Case_ID']
+        defaults = [self.COLUMNS[name][1] for name in names]
+        placeholders = ", ".join("?" * (len(names) + 1))
+        columns_sql = ", ".join(f'"{name}"' for name in ['Case_ID'] + names)
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(f"INSERT OR IGNORE INTO progress ({columns_sql}) VALUES ({placeholders})",
+                                   [[case] + defaults for case in case_list])
+            return connection.total_changes - before
+
+    def import_csv(self, csv_path):
+        """Seed the store from an existing progress_tracking.csv"""
+        df = pd.read_csv(csv_path, sep=";", keep_default_na=False)
+        columns = [name for name in df.columns if name in self.COLUMNS]
+        # Empty measurement cells are NULL, not text
+        for name in columns:
+            if self.COLUMNS[name][0] == 'REAL':
+                values = pd.to_numeric(df[name], errors='coerce')
+                df[name] = values.astype(object).where(values.notna(), None)
+        columns_sql = ", ".join(f'"{name}"' for name in columns)
+        placeholders = ", ".join("?" * len(columns))
+        with self.transaction() as connection:
+            connection.executemany(f"INSERT OR REPLACE INTO progress ({columns_sql}) VALUES ({placeholders})",
+                                   df[columns].itertuples(index=False, name=None))
+
+    def get(self, case_id):
+        row = self.connection.execute("SELECT * FROM progress WHERE Case_ID = ?", (case_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, case_id, expected_status=None, **fields):
+        """Update a single case row in one atomic commit, optionally only if it still has expected_status.
+
+        Only the given columns are written, so concurrent stations updating other columns or
+        other cases merge instead of overwriting each other. Returns True if the row changed.
+        """
+        assignments = ", ".join(f'"{name}" = ?' for name in fields)
+        query = f"UPDATE progress SET {assignments} WHERE Case_ID = ?"
+        parameters = list(fields.values()) + [case_id]
+        if expected_status is not None:
+            query += " AND Status = ?"
+            parameters.append(expected_status)
+        with self.transaction() as connection:
+            return connection.execute(query, parameters).rowcount > 0
+
+    def update_many(self, rows):
+        """Apply {Case_ID, column: value, ...} dicts (same columns each) in a single commit"""
+        if not rows:
+            return
+        fields = [name for name in rows[0] if name != 'Case_ID']
+        assignments = ", ".join(f'"{name}" = ?' for name in fields)
+        with self.transaction() as connection:
+            connection.executemany(f"UPDATE progress SET {assignments} WHERE Case_ID = ?",
+                                   [[row[name] for name in fields] + [row['Case_ID']] for row in rows])
+
+    def case_ids(self, status=None):
+        if status is None:
+            rows = self.connection.execute("SELECT Case_ID FROM progress ORDER BY rowid")
+        else:
+            rows = self.connection.execute("SELECT Case_ID FROM progress WHERE Status = ? ORDER BY rowid", (status,))
+        return [row[0] for row in rows]
+
+    def statuses(self):
+        return dict(self.connection.execute("SELECT Case_ID, Status FROM progress").fetchall())
+
+    def to_dataframe(self):
+        return pd.read_sql_query("SELECT * FROM progress ORDER BY rowid", self.connection)
+
+    def export_csv(self, csv_path):
+        """Write the CSV view atomically (temp file + rename)"""
+        # Stations closing at the same time each write their own temp file
+        temp_path = f"{csv_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        try:
+            self.to_dataframe().to_csv(temp_path, index=False, sep=";")
+            os.replace(temp_path, csv_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
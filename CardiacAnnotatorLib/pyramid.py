@@ -0,0 +1,216 @@
+"""Downsampled copies (pyramid levels) of the case volumes, built in the background.
+
+A case opens on its coarsest level in a fraction of a second while the full resolution volume
+is read; levels are raw NRRD files (<case>_x4.nrrd, <case>_x2.nrrd) covering the same physical
+extent as the full volume. The directory is an LRU bounded in bytes like the volume cache.
+"""
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .crops import write_nrrd
+from .nifti import read_nifti
+
+DEFAULT_FACTORS = (2, 4)
+
+
+def downsample(array, factor):
+    """Mean of factor**3 voxel blocks of a (k, j, i) array (trailing partial blocks are dropped)"""
+    if min(array.shape) < factor:
+        # Thinner than one block, plain subsampling
+        return np.ascontiguousarray(array[::factor, ::factor, ::factor])
+    k, j, i = (size // factor for size in array.shape)
+    trimmed = array[:k * factor, :j * factor, :i * factor]
+    blocks = trimmed.reshape(k, factor, j, factor, i, factor).astype(np.float32)
+    mean = blocks.mean(axis=(1, 3, 5))
+    if np.issubdtype(array.dtype, np.integer):
+        mean = np.rint(mean).astype(array.dtype)
+    return mean.astype(array.dtype, copy=False)
+
+
+def level_matrix(ijk_to_ras, factor):
+    """IJK to RAS of a level: voxels factor times larger, centred on the blocks they average"""
+    matrix = np.array(ijk_to_ras, dtype=float)
+    offset = (factor - 1) / 2.0
+    matrix[:3, 3] = (matrix @ np.array([offset, offset, offset, 1.0]))[:3]
+    matrix[:3, :3] *= factor
+    return matrix
+
+
+def build_pyramid(job):
+    """Pool worker: (case_name, source_path, read_path, cache_dir, factors) -> entry dict or None.
+
+    read_path is what gets decoded (an uncompressed cached copy when there is one), source_path
+    is the dataset file the entry is tied to.
+    """
+    case_name, source_path, read_path, cache_dir, factors = job
+    try:
+        stat = os.stat(source_path)
+        array, matrix = read_nifti(read_path)
+        levels = {}
+        level, done = array, 1
+        for factor in sorted(factors):
+            # Each level is built from the previous one, the full volume is walked once
+            level = downsample(level, factor // done)
+            done = factor
+            path = os.path.join(cache_dir, f"{case_name}_x{factor}.nrrd")
+            write_nrrd(path, level, level_matrix(matrix, factor))
+            levels[str(factor)] = int(level.nbytes)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"Could not build pyramid of {case_name}: {e}")
+        return None
+    now = time.time()
+    return {'case': case_name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'levels': levels, 'created': now, 'last_used': now}
+
+
+class PyramidCache:
+    """Directory of pyramid levels with an LRU byte budget, index.json ties each case to the source file it was built from"""
+
+    VERSION = 1
+
+    def __init__(self, cache_dir, factors=DEFAULT_FACTORS, workers=1, budget_gb=2):
+        self.cache_dir = cache_dir
+        self.factors = tuple(factors)
+        self.budget = int(budget_gb * 1024 ** 3)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.executor = None
+        self.jobs = {}  # case -> future
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def save(self):
+        with self.lock:
+            entries = self._read_index()
+            for case, entry in entries.items():
+                if case in self.entries and self.entries[case]['created'] == entry['created']:
+                    self.entries[case]['last_used'] = max(self._last_used(self.entries[case]), self._last_used(entry))
+                elif case not in self.entries:
+                    self.entries[case] = entry
+            self.entries = {case: entry for case, entry in self.entries.items()
+                            if all(os.path.exists(self.path_for(case, factor)) for factor in entry['levels'])}
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+            os.replace(temp_path, self.index_path)
+
+    def path_for(self, case_name, factor):
+        return os.path.join(self.cache_dir, f"{case_name}_x{factor}.nrrd")
+
+    def _last_used(self, entry):
+        return entry.get('last_used', entry['created'])
+
+    def used_bytes(self):
+        return sum(sum(entry['levels'].values()) for entry in self.entries.values())
+
+    def is_current(self, case_name, source_path):
+        entry = self.entries.get(case_name)
+        if not entry:
+            return False
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+        return entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    def lookup(self, case_name, source_path, factor=None):
+        """Path of a level (the coarsest by default) built from the current source, else None"""
+        with self.lock:
+            if not self.is_current(case_name, source_path):
+                return None
+            entry = self.entries[case_name]
+            levels = entry['levels']
+            factor = str(factor or max(int(level) for level in levels))
+            path = self.path_for(case_name, factor)
+            if factor not in levels or not os.path.exists(path):
+                return None
+            entry['last_used'] = time.time()
+            return path
+
+    def add(self, result):
+        with self.lock:
+            self.entries[result['case']] = {key: result[key] for key in ('mtime_ns', 'size', 'levels', 'created', 'last_used')}
+
+    def evict(self, keep=()):
+        """Remove least recently used pyramids until the byte budget is respected (cases in keep stay)"""
+        with self.lock:
+            for case in sorted(self.entries, key=lambda case: self._last_used(self.entries[case])):
+                if self.used_bytes() <= self.budget:
+                    break
+                if case not in keep:
+                    print(f"Evicting {case} from pyramid cache ({sum(self.entries[case]['levels'].values()) / (1024 * 1024):.0f} MB)")
+                    self._drop(case)
+
+    def _drop(self, case_name):
+        entry = self.entries.pop(case_name, None)
+        for factor in (entry or {}).get('levels', {}):
+            path = self.path_for(case_name, factor)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def submit(self, cases):
+        """Queue pyramid builds for [(case_name, source_path, read_path)] not built yet (worker thread)"""
+        if self.executor is None:
+            # Threads rather than processes: started from the GUI, and numpy/zlib release the GIL
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="CardiacAnnotatorPyramid")
+        with self.lock:
+            self.jobs = {case: future for case, future in self.jobs.items() if not future.done()}
+            pending = [job for job in cases if job[0] not in self.jobs and not self.is_current(job[0], job[1])]
+            for case_name, source_path, read_path in pending:
+                future = self.executor.submit(build_pyramid, (case_name, source_path, read_path, self.cache_dir, self.factors))
+                future.add_done_callback(self._job_done)
+                self.jobs[case_name] = future
+        return len(pending)
+
+    def _job_done(self, future):
+        if future.cancelled() or future.exception() or not future.result():
+            return
+        self.add(future.result())
+        self.evict(keep=(future.result()['case'],))
+        self.save()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.save()
+
+
+def build_dataset_pyramids(dataset, cache, volume_cache=None, workers=None):
+    """Build the missing pyramids of the whole dataset (pending cases first), returns (built, already current)"""
+    pending = dataset.next_cases()
+    cases = pending + [case for case in dataset.case_index.case_list() if case not in set(pending)]
+    jobs, current = [], 0
+    for case in cases:
+        source = dataset.volume_path(case)
+        if not os.path.exists(source):
+            continue
+        if cache.is_current(case, source):
+            current += 1
+            continue
+        read_path = (volume_cache.lookup(source) if volume_cache else None) or source
+        jobs.append((case, source, read_path, cache.cache_dir, cache.factors))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [result for result in executor.map(build_pyramid, jobs) if result]
+    for result in results:
+        cache.add(result)
+    cache.evict()
+    cache.save()
+    print(f"Pyramids: {len(results)} built, {current} already current")
+    return len(results), current
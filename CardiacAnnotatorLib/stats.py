@@ -0,0 +1,138 @@
+"""Per-case scan metadata (geometry, file size, intensity percentiles, contrast) kept in the case index.
+
+Computed on a process pool, one volume per worker; results are tied to the volume mtime/size so
+a replaced scan is measured again.
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+
+from .nifti import read_nifti
+
+# Percentiles are taken over soft tissue and denser voxels: air, lungs and out of FOV padding
+# would otherwise dominate a chest CT
+BODY_THRESHOLD_HU = -200
+PERCENTILES = (1, 5, 50, 95, 99.5)
+# Contrast filled blood pool dominates this range in a CTA
+CONTRAST_RANGE_HU = (150, 1000)
+
+DEFAULT_WINDOW_LEVEL = (2000, 500)
+
+
+def percentile_key(percentile):
+    return f"p{percentile:g}".replace('.', '_')
+
+
+def volume_stats(job):
+    """Process pool worker: (case_name, source_path, read_path) -> stats dict, or None on error"""
+    case_name, source_path, read_path = job
+    try:
+        stat = os.stat(source_path)
+        array, ijk_to_ras = read_nifti(read_path)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"Could not read {read_path} for stats: {e}")
+        return None
+    # Every other voxel along each axis is plenty for percentiles and 8x cheaper
+    sample = array[::2, ::2, ::2].ravel()
+    body = sample[sample > BODY_THRESHOLD_HU]
+    values = np.percentile(body, PERCENTILES) if body.size else [None] * len(PERCENTILES)
+    enhanced = body[(body >= CONTRAST_RANGE_HU[0]) & (body <= CONTRAST_RANGE_HU[1])]
+    spacing = np.linalg.norm(np.asarray(ijk_to_ras)[:3, :3], axis=0)
+    return {
+        'case': case_name,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'dims': [int(size) for size in array.shape[::-1]],
+        'spacing': [round(float(value), 4) for value in spacing],
+        'slices': int(array.shape[0]),
+        'file_bytes': stat.st_size,
+        'percentiles': {percentile_key(p): None if v is None else round(float(v), 1) for p, v in zip(PERCENTILES, values)},
+        'contrast_hu': round(float(np.median(enhanced)), 1) if enhanced.size else None,
+    }
+
+
+def is_current(stats, source_path):
+    if not stats:
+        return False
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+    return stats['mtime_ns'] == stat.st_mtime_ns and stats['size'] == stat.st_size
+
+
+def stats_jobs(dataset, volume_cache=None):
+    """[(case, source, read_path)] for the cases whose stats are missing or stale, pending cases first"""
+    pending = dataset.next_cases()
+    cases = pending + [case for case in dataset.case_index.case_list() if case not in set(pending)]
+    jobs = []
+    for case in cases:
+        source = dataset.volume_path(case)
+        if not os.path.exists(source) or is_current(dataset.case_index.cases[case].get('stats'), source):
+            continue
+        read_path = (volume_cache.lookup(source) if volume_cache else None) or source
+        jobs.append((case, source, read_path))
+    return jobs
+
+
+def store_stats(case_index, results):
+    """Put results into the case index entries and persist it"""
+    stored = 0
+    for result in results:
+        entry = case_index.cases.get(result['case'])
+        if entry is not None:
+            entry['stats'] = {key: value for key, value in result.items() if key != 'case'}
+            stored += 1
+    if stored:
+        case_index.save()
+    return stored
+
+
+def compute_dataset_stats(dataset, volume_cache=None, workers=None, save_every=20):
+    """Fill in the missing stats of the whole dataset, returns (computed, already current)
+
+    Results are stored as they complete (the index is saved every save_every cases), so an
+    interrupted run keeps what it measured.
+    """
+    jobs = stats_jobs(dataset, volume_cache)
+    current = sum(1 for case in dataset.case_index.case_list()
+                  if is_current(dataset.case_index.cases[case].get('stats'), dataset.volume_path(case)))
+    computed = 0
+    unsaved = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for future in concurrent.futures.as_completed([executor.submit(volume_stats, job) for job in jobs]):
+            if future.result():
+                unsaved.append(future.result())
+            if len(unsaved) >= save_every:
+                computed += store_stats(dataset.case_index, unsaved)
+                unsaved = []
+    computed += store_stats(dataset.case_index, unsaved)
+    print(f"Volume stats: {computed} computed, {current} already current")
+    return computed, current
+
+
+def window_level(stats):
+    """(window, level) spanning the soft tissue to contrast/bone percentiles, default preset without stats"""
+    percentiles = (stats or {}).get('percentiles') or {}
+    low, high = percentiles.get(percentile_key(1)), percentiles.get(percentile_key(99.5))
+    if low is None or high is None:
+        return DEFAULT_WINDOW_LEVEL
+    window = max(high - low, 400.0)
+    return round(window), round((high + low) / 2.0)
+
+
+def case_list_fields(case_index):
+    """{case: {'Slices', 'Spacing_mm', 'Contrast_HU', 'Size_MB'}} for the case navigator columns"""
+    fields = {}
+    for case, entry in case_index.cases.items():
+        stats = entry.get('stats')
+        if not stats:
+            continue
+        fields[case] = {
+            'Slices': stats['slices'],
+            'Spacing_mm': stats['spacing'][2],
+            'Contrast_HU': stats['contrast_hu'],
+            'Size_MB': round(stats['file_bytes'] / (1024 * 1024), 1),
+        }
+    return fields
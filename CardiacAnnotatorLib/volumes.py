@@ -0,0 +1,243 @@
+"""Local cache of uncompressed (raw .nii) copies of the case volumes, keyed by content hash.
+
+Opening a cached volume skips gzip decompression entirely; the OS page cache does the rest.
+"""
+import concurrent.futures
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def default_cache_dir():
+    return os.path.join(tempfile.gettempdir(), "CardiacAnnotatorVolumes")
+
+
+def gzip_decoded_size(source_path):
+    # gzip stores the uncompressed size (mod 2**32) in its last four bytes
+    try:
+        with open(source_path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), 'little')
+    except OSError:
+        return None
+
+
+class _HashingReader:
+    """File wrapper hashing the compressed bytes as gzip reads them"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.blake2b(digest_size=16)
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def transcode_volume(job):
+    """Process pool worker: (source_path, cache_dir) -> cache entry dict, or None on error.
+
+    One pass over the source: the compressed bytes are hashed (cache key) while they are
+    decompressed into a temp file whose own checksum is computed on the way.
+    """
+    source_path, cache_dir = job
+    try:
+        stat = os.stat(source_path)
+        fd, partial_path = tempfile.mkstemp(prefix=".transcode_", suffix=".part", dir=cache_dir)
+        checksum = hashlib.blake2b(digest_size=16)
+        nbytes = 0
+        try:
+            with open(source_path, 'rb') as raw, os.fdopen(fd, 'wb') as dst:
+                reader = _HashingReader(raw)
+                with gzip.GzipFile(fileobj=reader, mode='rb') as src:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        checksum.update(chunk)
+                        nbytes += len(chunk)
+                # Trailing bytes gzip did not need still belong to the content hash
+                while reader.read(CHUNK_SIZE):
+                    pass
+            key = reader.digest.hexdigest()
+            os.replace(partial_path, os.path.join(cache_dir, f"{key}.nii"))
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+    except (OSError, EOFError, gzip.BadGzipFile) as e:
+        print(f"Could not transcode {source_path}: {e}")
+        return None
+    return {'source': source_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'key': key, 'checksum': checksum.hexdigest(), 'bytes': nbytes}
+
+
+def file_checksum(path):
+    """Process pool worker: blake2b of a cached file, None if unreadable"""
+    checksum = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                checksum.update(chunk)
+    except OSError:
+        return None
+    return checksum.hexdigest()
+
+
+class VolumeCache:
+    """Content addressed cache directory with an LRU byte budget.
+
+    index.json maps source paths (with their mtime/size) to content keys, and keys to the
+    size, checksum and last use of <key>.nii.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir=None, budget_gb=20):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.budget = int(budget_gb * 1024 ** 3)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.sources = {}  # source path -> {'mtime_ns', 'size', 'key'}
+        self.entries = {}  # key -> {'bytes', 'checksum', 'last_used'}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.sources, self.entries = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        if data.get('version') != self.VERSION:
+            return {}, {}
+        return data.get('sources', {}), data.get('entries', {})
+
+    def save(self):
+        """Persist the index, merged with what other processes wrote since we read it"""
+        with self.lock:
+            sources, entries = self._read_index()
+            for key, entry in entries.items():
+                if key not in self.entries and os.path.exists(self.path_for(key)):
+                    self.entries[key] = entry
+                elif key in self.entries:
+                    self.entries[key]['last_used'] = max(self.entries[key]['last_used'], entry['last_used'])
+            for source, entry in sources.items():
+                if source not in self.sources and entry['key'] in self.entries:
+                    self.sources[source] = entry
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'sources': self.sources, 'entries': self.entries}, f)
+            os.replace(temp_path, self.index_path)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.nii")
+
+    def used_bytes(self):
+        return sum(entry['bytes'] for entry in self.entries.values())
+
+    def is_current(self, source_path):
+        """True if the source has a cache entry and did not change since it was transcoded"""
+        source = self.sources.get(source_path)
+        if not source or source['key'] not in self.entries:
+            return False
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+        return source['mtime_ns'] == stat.st_mtime_ns and source['size'] == stat.st_size
+
+    def lookup(self, source_path):
+        """Cached uncompressed path for source_path, or None. Cheap checks only (stat + size)."""
+        with self.lock:
+            if not self.is_current(source_path):
+                return None
+            key = self.sources[source_path]['key']
+            entry = self.entries[key]
+            path = self.path_for(key)
+            try:
+                if os.path.getsize(path) != entry['bytes']:
+                    raise OSError("size mismatch")
+            except OSError:
+                self._drop(key)
+                return None
+            entry['last_used'] = time.time()
+            return path
+
+    def add(self, result):
+        """Register a transcode_volume result"""
+        with self.lock:
+            self.sources[result['source']] = {'mtime_ns': result['mtime_ns'], 'size': result['size'], 'key': result['key']}
+            self.entries[result['key']] = {'bytes': result['bytes'], 'checksum': result['checksum'], 'last_used': time.time()}
+
+    def evict(self, keep=()):
+        """Remove least recently used files until the byte budget is respected (keys in keep stay)"""
+        with self.lock:
+            for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+                if self.used_bytes() <= self.budget:
+                    break
+                if key not in keep:
+                    print(f"Evicting {key} from volume cache ({self.entries[key]['bytes'] / (1024 * 1024):.0f} MB)")
+                    self._drop(key)
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        for source in [source for source, entry in self.sources.items() if entry['key'] == key]:
+            del self.sources[source]
+        if os.path.exists(self.path_for(key)):
+            os.remove(self.path_for(key))
+
+
+def transcode_dataset(dataset, cache, workers=None, verify=False, executor=None):
+    """Transcode the 40pc volumes of the dataset into the cache on a process pool.
+
+    Pending cases go first and the run stops adding volumes once the byte budget is full.
+    With verify, the checksums of the existing entries are recomputed and bad files dropped.
+    Runs on executor if given (Slicer passes its spawned pool), else on a new process pool.
+    Returns (transcoded, already cached, dropped by verification).
+    """
+    pending = dataset.next_cases()
+    others = [case for case in dataset.case_index.case_list() if case not in set(pending)]
+    sources = [dataset.volume_path(case) for case in pending + others]
+    sources = [source for source in sources if os.path.exists(source)]
+
+    with contextlib.nullcontext(executor) if executor else concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        dropped = 0
+        if verify:
+            keys = sorted({cache.sources[source]['key'] for source in sources if cache.is_current(source)})
+            for key, checksum in zip(keys, pool.map(file_checksum, [cache.path_for(key) for key in keys])):
+                if checksum != cache.entries[key]['checksum']:
+                    print(f"Volume cache entry {key} failed verification, dropping it")
+                    with cache.lock:
+                        cache._drop(key)
+                    dropped += 1
+
+        cached = {source for source in sources if cache.is_current(source)}
+        used = sum(cache.entries[cache.sources[source]['key']]['bytes'] for source in cached)
+        jobs = []
+        for source in sources:
+            if source in cached:
+                continue
+            expected = gzip_decoded_size(source) or 0
+            if used + expected > cache.budget:
+                print(f"Volume cache budget reached, {len(sources) - len(cached) - len(jobs)} volumes left compressed")
+                break
+            used += expected
+            jobs.append((source, cache.cache_dir))
+        results = [result for result in pool.map(transcode_volume, jobs) if result]
+    for result in results:
+        cache.add(result)
+    cache.evict(keep={result['key'] for result in results})
+    cache.save()
+    print(f"Volume cache: {len(results)} transcoded, {len(cached)} already cached, {dropped} dropped, "
+          f"{cache.used_bytes() / 1024 ** 3:.1f} GB used")
+    return len(results), len(cached), dropped